@@ -0,0 +1,201 @@
+import os
+import re
+import time
+import zlib
+
+import numpy as np
+
+from gazetteer import APARTMENT_TYPES, DEVELOPERS, DISTRICTS
+from intent_router import NUMBER_WORDS, normalize_text
+
+
+NGRAM_SIZES = (2, 3, 4)
+NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+
+# ✅ آستانه شباهت هر نوع سوال؛ سوال‌های بازار به منطقه و نوع ملک حساس‌ترند
+NAMESPACE_THRESHOLDS = {"market": 0.9}
+
+# ✅ نام‌های فارسی رایج مناطق و نوع ملک ← همان نام انگلیسی جدول‌ها (سوال‌ها بیشتر فارسی هستند)
+DISTRICT_ALIASES = {
+    "جمیرا": "jumeirah", "پالم جمیرا": "palm jumeirah", "پالم": "palm jumeirah",
+    "دبی مارینا": "dubai marina", "مارینا": "dubai marina", "marina": "dubai marina",
+    "داون تاون": "dubai downtown", "داونتاون": "dubai downtown", "downtown": "dubai downtown",
+    "بیزینس بی": "business bay", "بیزنس بی": "business bay", "دبی هیلز": "dubai hills",
+    "جی وی سی": "jvc", "جمیرا ویلج": "jvc", "دبی کریک": "dubai creek harbour", "کریک هاربر": "dubai creek harbour",
+    "سیتی واک": "city walk", "ارجان": "arjan", "دبی ساوث": "dubai south", "دبی لند": "dubailand",
+    "اسپورتس سیتی": "sports city", "موتور سیتی": "motor city", "تاون اسکوئر": "town square dubai",
+    "المرجان": "al marjan island", "جی ال تی": "jlt", "جی بی آر": "jumeirah beach residence",
+    "دیره": "deira", "دیرا": "deira", "البرشا": "al barsha", "دبی ایلند": "dubai islands",
+}
+TYPE_ALIASES = {
+    "ویلا": "villa", "آپارتمان": "apartment", "اپارتمان": "apartment", "تاون هاوس": "townhouse",
+    "تاونهاوس": "townhouse", "پنت هاوس": "penthouse", "پنتهاوس": "penthouse", "دوبلکس": "duplex",
+    "هتل آپارتمان": "hotel apartment", "زمین": "land / plot", "دفتر": "office", "آفیس": "office",
+    "مغازه": "shop", "استودیو": "studio", "studio": "studio",
+}
+ENGLISH_NUMBERS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+BEDROOM_NUMBER = {**NUMBER_WORDS, **ENGLISH_NUMBERS}
+BEDROOM_PATTERN = re.compile(
+    r"(?<!\w)(\d+(?:\.\d+)?|" + "|".join(sorted(BEDROOM_NUMBER, key=len, reverse=True)) + r")"
+    r" ?-?(?:خوابه|خواب|bedrooms?|beds?|br|bhk)(?!\w)"
+)
+
+
+def _names_pattern(names):
+    # نام‌های بلندتر اول تا «پالم جمیرا» به جای «جمیرا» گرفته شود
+    alternatives = sorted({re.escape(name) for name in names if len(name) > 2}, key=len, reverse=True)
+    return re.compile(r"(?<!\w)(" + "|".join(alternatives) + r")(?!\w)")
+
+
+ENTITY_TABLES = {
+    "district": {**{name.lower(): name.lower() for name in DISTRICTS.names}, **DISTRICT_ALIASES},
+    "developer": {name.lower(): name.lower() for name in DEVELOPERS.names},
+    "type": {**{name.lower(): name.lower() for name in APARTMENT_TYPES.names}, **TYPE_ALIASES},
+}
+ENTITY_PATTERNS = {kind: _names_pattern(table) for kind, table in ENTITY_TABLES.items()}
+
+# ✅ تعداد سوال فرضی (بدون هیچ n-gram) در محاسبه idf تا وقتی کش تازه و کم‌جمعیت است وزن‌ها افراطی نشوند
+IDF_PRIOR_DOCUMENTS = 50
+
+
+def numbers_in(text):
+    """ عددهای متن؛ دو سوال با عدد متفاوت (مثلاً ۱ میلیون و ۲ میلیون) هیچ‌وقت یکی حساب نمی‌شوند """
+    return tuple(sorted(NUMBER.findall(text)))
+
+
+def entities_in(text):
+    """ تعداد اتاق‌خواب، منطقه، سازنده و نوع ملک نام‌برده در متن نرمال‌شده؛ فقط سوال‌های با همین موجودیت‌ها یکی حساب می‌شوند """
+    entities = {f"bedrooms:{BEDROOM_NUMBER.get(value, value)}" for value in BEDROOM_PATTERN.findall(text)}
+    for kind, pattern in ENTITY_PATTERNS.items():
+        entities.update(f"{kind}:{ENTITY_TABLES[kind][name]}" for name in pattern.findall(text))
+    return tuple(sorted(entities))
+
+
+class HashedNgramVectorizer:
+    """ بردار TF از n-gram های حرفی و کلمات که با هش به تعداد ثابتی ستون می‌روند (بدون واژه‌نامه) """
+
+    def __init__(self, dim=4096):
+        self.dim = dim
+
+    def features(self, text):
+        padded = f" {text} "
+        grams = [padded[i:i + n] for n in NGRAM_SIZES for i in range(len(padded) - n + 1)]
+        # کلمات کامل هم ویژگی جدا هستند تا تفاوت یک کلمه (مثل نام منطقه) وزن بیشتری داشته باشد
+        grams += [f"w:{word}" for word in text.split()]
+        return grams
+
+    def transform(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for gram in self.features(text):
+            vector[zlib.crc32(gram.encode()) % self.dim] += 1.0
+        # tf زیرخطی: تکرار یک n-gram اثر کمتری از حضورش دارد
+        np.log1p(vector, out=vector)
+        return vector
+
+
+class SemanticAnswerCache:
+    """ کش پاسخ سوال‌های بازار و راهنمای خرید؛ سوال‌های تقریباً یکسان (شباهت کسینوسی TF-IDF) پاسخ قبلی را می‌گیرند """
+
+    def __init__(self, max_entries=1000, ttl=21600, threshold=0.85, dim=4096, namespace_thresholds=NAMESPACE_THRESHOLDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.namespace_thresholds = dict(namespace_thresholds)
+        self.vectorizer = HashedNgramVectorizer(dim)
+
+        self._vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        # مربع وزن‌ها برای محاسبه نرم هر ردیف با idf فعلی (یک ضرب ماتریس در بردار)
+        self._squared = np.zeros((max_entries, dim), dtype=np.float32)
+        # تعداد سوال‌های ذخیره‌شده‌ای که هر ستون را دارند (به‌روزرسانی تدریجی با هر ذخیره)
+        self._document_frequency = np.zeros(dim, dtype=np.int32)
+        self._created = np.full(max_entries, -np.inf)
+        # گروه هر ردیف: نوع سوال + عددها و موجودیت‌های داخلش (به صورت کد عددی برای مقایسه برداری)
+        self._groups = np.full(max_entries, -1, dtype=np.int64)
+        self._questions = [None] * max_entries
+        self._answers = [None] * max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @staticmethod
+    def _group(namespace, text):
+        return zlib.crc32(repr((namespace, numbers_in(text), entities_in(text))).encode())
+
+    def _live(self, group):
+        """ ردیف‌های تازه همین نوع سوال با همان عددها و موجودیت‌ها """
+        return (self._groups == group) & (self._created >= time.monotonic() - self.ttl)
+
+    def _idf(self):
+        # n-gram های رایج (مثل «در دبی») وزن کمتری می‌گیرند
+        documents = int(np.isfinite(self._created).sum()) + IDF_PRIOR_DOCUMENTS
+        return np.log((1 + documents) / (1 + self._document_frequency)).astype(np.float32) + 1.0
+
+    def get(self, namespace, question):
+        """ (پاسخ، شباهت) نزدیک‌ترین سوال قبلی بالای آستانه، یا (None, بیشترین شباهت) """
+        text = normalize_text(question)
+        rows = np.flatnonzero(self._live(self._group(namespace, text)))
+        if not len(rows):
+            self.misses += 1
+            return None, 0.0
+
+        idf = self._idf()
+        query = self.vectorizer.transform(text)
+        # ضرب داخلی فقط روی ستون‌هایی که در سوال فعلی هستند
+        columns = np.flatnonzero(query)
+        dot = self._vectors[np.ix_(rows, columns)] @ (query[columns] * idf[columns] ** 2)
+        # ضرب روی کل ماتریس (بدون کپی ردیف‌ها) و بعد انتخاب ردیف‌ها
+        norms = np.sqrt((self._squared @ idf ** 2)[rows]) * (np.linalg.norm(query * idf) or 1.0)
+        similarity = dot / np.where(norms > 0, norms, 1.0)
+
+        best = int(np.argmax(similarity))
+        score = float(similarity[best])
+        if score < self.namespace_thresholds.get(namespace, self.threshold):
+            self.misses += 1
+            return None, score
+
+        self.hits += 1
+        row = rows[best]
+        print(f"⚡ پاسخ از کش معنایی ({score:.2f}): «{question}» ≈ «{self._questions[row]}»")
+        return self._answers[row], score
+
+    def put(self, namespace, question, answer):
+        if not answer:
+            return
+        text = normalize_text(question)
+        # جای خالی یا قدیمی‌ترین ردیف
+        row = int(np.argmin(self._created))
+        vector = self.vectorizer.transform(text)
+        self._document_frequency -= self._vectors[row] > 0
+        self._document_frequency += vector > 0
+        self._vectors[row] = vector
+        self._squared[row] = vector ** 2
+        self._created[row] = time.monotonic()
+        self._groups[row] = self._group(namespace, text)
+        self._questions[row] = question
+        self._answers[row] = answer
+        self.stores += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": int(np.isfinite(self._created).sum()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+        }
+
+
+def answer_cache_from_env():
+    """ ساخت SemanticAnswerCache با تنظیمات متغیرهای محیطی (ANSWER_CACHE_SIZE=0 یعنی بدون کش) """
+    max_entries = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+    if max_entries <= 0:
+        return None
+    return SemanticAnswerCache(
+        max_entries=max_entries,
+        ttl=int(os.getenv("ANSWER_CACHE_TTL", "21600")),
+        threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.85")),
+    )
@@ -0,0 +1,289 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from district_aggregates import DistrictAggregates
+from price_stats import PriceStatistics
+from property_index import PropertyIndex
+
+
+# ✅ فیلتر پایه‌ای که نسخه محلی با آن از Estaty گرفته می‌شود (املاک Off Plan قابل فروش)
+BASE_FILTERS = {"property_status": "Off Plan", "sales_status": [1]}
+
+# ✅ فیلترهای API که به صورت محلی قابل اجرا هستند: کلید فیلتر ← فیلد ملک در لیست
+ID_FILTERS = {
+    "developer_company_id": "developer_company",
+    "apartments": "apartments",
+    "apartmentType": "apartmentType",
+    "facilities": "facilities",
+    "city_id": "city",
+    "property_type": "property_type",
+    "bathrooms": "bathrooms",
+}
+FLAG_FILTERS = ("payment_plan", "post_delivery", "guarantee_rental_guarantee")
+
+# فیلترهایی که ستون مستقیم در PropertyIndex دارند؛ بقیه روی نتیجه ماسک بررسی می‌شوند
+COLUMN_FILTERS = ("developer_company_id", "apartments")
+
+# کلیدهایی که فقط API می‌تواند جواب بدهد (مثل جستجوی متنی نام پروژه)
+REMOTE_ONLY_FILTERS = ("property_name",)
+
+# ✅ فیلترهایی که با بیش از یک مقدار به API می‌روند: معلوم نیست /filter برای چند امکانات
+# (مثلاً استخر + باشگاه) «هر کدام» را می‌خواهد یا «همه» را، پس نسخه محلی حدس نمی‌زند
+MULTI_VALUE_REMOTE_FILTERS = ("facilities",)
+
+
+def _ids(value):
+    """ استخراج شناسه‌ها از یک فیلد (دیکشنری، لیست دیکشنری‌ها یا مقدار ساده) به صورت رشته """
+    if value is None:
+        return set()
+    if not isinstance(value, list):
+        value = [value]
+
+    ids = set()
+    for item in value:
+        if isinstance(item, dict):
+            item = item.get("id")
+        if item is not None:
+            ids.add(str(item))
+    return ids
+
+
+def _fingerprint(prop):
+    return hashlib.blake2b(json.dumps(prop, sort_keys=True, default=str).encode(), digest_size=16).digest()
+
+
+class InventoryMirror:
+    """ نسخه محلی لیست املاک Estaty که در پس‌زمینه به‌روز می‌شود و جستجو را بدون تماس شبکه جواب می‌دهد """
+
+    def __init__(self, estaty, sync_interval=300, max_staleness=1800, sync_timeout=60.0, developer_rank=None):
+        self.estaty = estaty
+        self.developer_rank = developer_rank or {}
+        self.sync_interval = sync_interval
+        self.max_staleness = max_staleness
+        self.sync_timeout = sync_timeout
+
+        self.properties = {}
+        self._fingerprints = {}
+        self._fields = set()
+        self.index = PropertyIndex([])
+        self.districts = DistrictAggregates(self.index)
+        self.prices = PriceStatistics(self.index)
+        self.synced_at = None
+        self._synced_monotonic = None
+        self.version = 0
+
+        self.syncs = 0
+        self.sync_errors = 0
+        self.changes = {"added": 0, "updated": 0, "removed": 0}
+        self.local_queries = 0
+        self.remote_queries = 0
+        self.aggregate_queries = 0
+        self.price_queries = 0
+
+    async def sync(self):
+        """ دریافت لیست فعلی و اعمال فقط تغییرات (اضافه، ویرایش، حذف) روی نسخه محلی """
+        listing = await self.estaty.filter(dict(BASE_FILTERS), timeout=self.sync_timeout, use_cache=False)
+
+        properties = {}
+        fingerprints = {}
+        fields = set()
+        added = updated = 0
+        for prop in listing:
+            property_id = prop.get("id")
+            if property_id is None:
+                continue
+            fingerprint = _fingerprint(prop)
+            previous = self._fingerprints.get(property_id)
+            if previous is None:
+                added += 1
+            elif previous != fingerprint:
+                updated += 1
+                # جزئیات ذخیره‌شده این ملک دیگر معتبر نیست
+                self.estaty.invalidate_property(property_id)
+            properties[property_id] = prop
+            fingerprints[property_id] = fingerprint
+            fields.update(prop.keys())
+
+        removed = [property_id for property_id in self.properties if property_id not in properties]
+        for property_id in removed:
+            self.estaty.invalidate_property(property_id)
+
+        self.properties = properties
+        self._fingerprints = fingerprints
+        self._fields = fields
+        self.synced_at = datetime.now(timezone.utc)
+        self._synced_monotonic = time.monotonic()
+        self.syncs += 1
+        if added or updated or removed or self.version == 0:
+            self.version += 1
+            # ✅ ستون‌های NumPy فقط وقتی لیست تغییر کرده دوباره ساخته می‌شوند
+            self.index = PropertyIndex(properties.values(), self.developer_rank)
+            # ✅ جدول تجمیعی مناطق هم همراه ستون‌ها دوباره ساخته می‌شود
+            self.districts = DistrictAggregates(self.index)
+            self.prices = PriceStatistics(self.index)
+        self.changes["added"] += added
+        self.changes["updated"] += updated
+        self.changes["removed"] += len(removed)
+
+        print(f"🔄 همگام‌سازی املاک: {len(properties)} ملک (جدید {added}، تغییر {updated}، حذف {len(removed)})")
+
+    async def run(self):
+        """ حلقه همگام‌سازی دوره‌ای (به عنوان تسک پس‌زمینه) """
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:  # تسک پس‌زمینه نباید با یک خطا متوقف شود
+                self.sync_errors += 1
+                print(f"❌ خطا در همگام‌سازی املاک: {e}")
+            await asyncio.sleep(self.sync_interval)
+
+    def is_fresh(self):
+        if self._synced_monotonic is None:
+            return False
+        return time.monotonic() - self._synced_monotonic <= self.max_staleness
+
+    def can_answer(self, filters):
+        """ آیا این فیلترها بدون تماس با API و فقط از نسخه محلی قابل پاسخ هستند؟ """
+        if not self.is_fresh():
+            return False
+        for key, value in BASE_FILTERS.items():
+            if filters.get(key) != value:
+                return False
+        for key in REMOTE_ONLY_FILTERS:
+            if filters.get(key) is not None:
+                return False
+        for key in MULTI_VALUE_REMOTE_FILTERS:
+            if len(_ids(filters.get(key))) > 1:
+                return False
+        for key, field in ID_FILTERS.items():
+            if filters.get(key) is not None and field not in self._fields:
+                return False
+        for key in FLAG_FILTERS:
+            if filters.get(key) is not None and key not in self._fields:
+                return False
+        return True
+
+    def query(self, filters, delivery_year=None, min_area=None, max_area=None, available_only=False, ranked=False):
+        """ اجرای فیلترهای API (و فیلتر سال تحویل و مساحت) روی نسخه محلی؛ اگر ممکن نباشد None برمی‌گرداند
+
+        با ranked=True نتیجه به ترتیب محبوبیت توسعه‌دهنده و به صورت تنبل (RankedResults) برگردانده می‌شود.
+        """
+        if not self.can_answer(filters):
+            self.remote_queries += 1
+            return None
+
+        self.local_queries += 1
+        index = self.index
+
+        apartment_ids = filters.get("apartments")
+        if apartment_ids is not None and not isinstance(apartment_ids, list):
+            apartment_ids = [apartment_ids]
+        developer_ids = filters.get("developer_company_id")
+        if developer_ids is not None and not isinstance(developer_ids, list):
+            developer_ids = [developer_ids]
+
+        # ✅ مقدار فیلتر هم مثل فیلد ملک با _ids خوانده می‌شود (مثلاً property_type به صورت {"id": 20, ...})
+        residual = {
+            field: _ids(filters[key])
+            for key, field in ID_FILTERS.items()
+            if filters.get(key) is not None and key not in COLUMN_FILTERS
+        }
+        # بیت‌ماسک فقط شناسه‌های زیر ۶۴ را پوشش می‌دهد
+        if apartment_ids and not all(str(a).isdigit() and int(a) < 64 for a in apartment_ids):
+            residual["apartments"] = _ids(apartment_ids)
+            apartment_ids = None
+
+        mask = index.mask(
+            district=filters.get("district"),
+            min_price=filters.get("min_price"),
+            max_price=filters.get("max_price"),
+            available_only=available_only,
+            delivery_year=delivery_year,
+            min_area=min_area,
+            max_area=max_area,
+            developer_ids=developer_ids,
+            apartment_ids=apartment_ids,
+            flags={key: int(filters[key]) for key in FLAG_FILTERS if filters.get(key) is not None},
+        )
+
+        positions = np.flatnonzero(mask)
+        if residual:
+            positions = [
+                i for i in positions
+                if all(_ids(index.properties[i].get(field)) & ids for field, ids in residual.items())
+            ]
+        if ranked:
+            return index.ranked(positions, copy=True)
+        return [dict(index.properties[i]) for i in positions]
+
+    def district_counts(self, filters, delivery_year=None, min_area=None, max_area=None):
+        """ تعداد املاک هر منطقه از جدول تجمیعی (بدون فیلتر کردن املاک)؛ اگر این فیلترها بُعد تجمیعی نداشته باشند None """
+        if not self.can_answer(filters):
+            return None
+        filters = {key: value for key, value in filters.items() if key not in BASE_FILTERS}
+        if not self.districts.supports(filters, min_area=min_area, max_area=max_area):
+            return None
+        self.aggregate_queries += 1
+        return self.districts.district_counts(filters, delivery_year=delivery_year)
+
+    def price_summary(self, filters, delivery_year=None, min_area=None, max_area=None):
+        """ (True, خلاصه قیمت یا None) از آرایه‌های مرتب قیمت؛ (False, None) اگر این فیلترها بخش‌بندی ندارند """
+        if not self.can_answer(filters):
+            return False, None
+        filters = {key: value for key, value in filters.items() if key not in BASE_FILTERS}
+        if not self.prices.supports(filters, delivery_year=delivery_year, min_area=min_area, max_area=max_area):
+            return False, None
+        self.price_queries += 1
+        return True, self.prices.summary(filters)
+
+    def lookup(self, property_ids):
+        """ کپی املاک با این شناسه‌ها از نسخه محلی، هم‌ترتیب ورودی (None برای ملکی که اینجا نیست) """
+        found = []
+        for property_id in property_ids:
+            prop = self.properties.get(property_id)
+            found.append(dict(prop) if prop is not None else None)
+        return found
+
+    async def get_detail(self, property_id):
+        """ جزئیات کامل یک ملک (/getProperty)؛ کش و به‌روزرسانی پس‌زمینه در EstatyClient انجام می‌شود """
+        return await self.estaty.get_property(property_id)
+
+    def freshness(self):
+        return {
+            "synced_at": self.synced_at.isoformat() if self.synced_at else None,
+            "age_seconds": round(time.monotonic() - self._synced_monotonic, 1) if self._synced_monotonic else None,
+            "fresh": self.is_fresh(),
+            "version": self.version,
+        }
+
+    def stats(self):
+        return {
+            **self.freshness(),
+            "properties": len(self.properties),
+            "syncs": self.syncs,
+            "sync_errors": self.sync_errors,
+            "changes": dict(self.changes),
+            "local_queries": self.local_queries,
+            "remote_queries": self.remote_queries,
+            "aggregate_queries": self.aggregate_queries,
+            "district_aggregates": self.districts.stats(),
+            "price_queries": self.price_queries,
+            "price_statistics": self.prices.stats(),
+        }
+
+
+def inventory_mirror_from_env(estaty, developer_rank=None):
+    """ ساخت InventoryMirror با تنظیمات متغیرهای محیطی """
+    return InventoryMirror(
+        estaty,
+        sync_interval=int(os.getenv("INVENTORY_SYNC_INTERVAL", "300")),
+        max_staleness=int(os.getenv("INVENTORY_MAX_STALENESS", "1800")),
+        sync_timeout=float(os.getenv("INVENTORY_SYNC_TIMEOUT", "60")),
+        developer_rank=developer_rank,
+    )
@@ -0,0 +1 @@
+# ✅ وجود این فایل باعث می‌شود pytest ریشه پروژه را به sys.path اضافه کند (import catalog و ...)
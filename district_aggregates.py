@@ -0,0 +1,153 @@
+from datetime import datetime
+
+import numpy as np
+
+from property_index import FLAG_COLUMNS, _ref_id
+
+
+# ✅ مرزهای قیمت (درهم): هر ۱۰۰ هزار تا ۱۰ میلیون و بعد هر یک میلیون تا ۵۰ میلیون (بودجه کاربرها معمولاً عدد رُند است)
+PRICE_EDGES = np.concatenate([np.arange(0, 10_000_001, 100_000), np.arange(11_000_000, 50_000_001, 1_000_000)]).astype(np.float64)
+
+# سطر «همه» در بُعد اتاق‌خواب و نوع واحد (برای جستجوی بدون این فیلتر، هر ملک فقط یک بار شمرده می‌شود)
+ANY = -1
+UNKNOWN_YEAR = 0
+# خانه قیمت املاک بدون قیمت (فقط وقتی فیلتر قیمت نداریم شمرده می‌شوند)
+NO_PRICE = 2 * len(PRICE_EDGES) + 1
+
+# فیلترهایی که بُعد تجمیعی دارند؛ با هر فیلتر دیگر (امکانات، توسعه‌دهنده، مساحت و ...) سراغ جستجوی عادی می‌رویم
+AGGREGATE_FILTERS = ("min_price", "max_price", "apartments", "apartmentType", *FLAG_COLUMNS)
+
+
+def price_bucket(prices):
+    """ خانه هر قیمت: 2i یعنی بین دو مرز (e[i-1], e[i]) و 2i+1 یعنی دقیقاً روی مرز e[i]
+
+    با این تقسیم‌بندی هر دو شرط «<= مرز» و «>= مرز» دقیق (بدون تقریب) جواب داده می‌شوند.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    position = np.searchsorted(PRICE_EDGES, prices, side="left")
+    on_edge = position < len(PRICE_EDGES)
+    on_edge[on_edge] = PRICE_EDGES[position[on_edge]] == prices[on_edge]
+    buckets = 2 * position + on_edge
+    buckets[np.isnan(prices)] = NO_PRICE
+    return buckets.astype(np.int16)
+
+
+def _edge(value):
+    """ شماره مرز برای یک قیمت، یا None اگر روی هیچ مرزی نیست """
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        return None
+    position = int(np.searchsorted(PRICE_EDGES, value, side="left"))
+    if position < len(PRICE_EDGES) and PRICE_EDGES[position] == value:
+        return position
+    return None
+
+
+def _type_ids(value):
+    if not isinstance(value, list):
+        value = [value] if value is not None else []
+    return {_ref_id(item) for item in value} - {-1}
+
+
+def _year(epoch):
+    # همان ساعت محلی سرور که year_bounds برای فیلتر سال تحویل استفاده می‌کند
+    return datetime.fromtimestamp(epoch).year if epoch >= 0 else UNKNOWN_YEAR
+
+
+class DistrictAggregates:
+    """ تعداد املاک هر منطقه به تفکیک اتاق‌خواب، نوع واحد، سال تحویل، پرچم‌های پرداخت و خانه قیمت
+
+    یک بار بعد از هر همگام‌سازی از روی ستون‌های PropertyIndex ساخته می‌شود؛ هر ردیف یک گروه یکتاست و
+    جستجوی منطقه فقط یک ماسک روی چند هزار گروه و یک bincount است.
+    """
+
+    def __init__(self, index):
+        self.names = {}
+        for prop, code in zip(index.properties, index.district):
+            if code >= 0 and code not in self.names:
+                self.names[int(code)] = str(prop["district"]["name"])
+
+        rows = []
+        positions = []
+        buckets = price_bucket(index.price)
+        for i, prop in enumerate(index.properties):
+            district = int(index.district[i])
+            if district < 0:
+                continue
+            mask = int(index.bedrooms[i])
+            bedrooms = [bit for bit in range(64) if mask >> bit & 1] + [ANY]
+            types = sorted(_type_ids(prop.get("apartmentType"))) + [ANY]
+            year = _year(int(index.delivery[i]))
+            flags = [int(index.flags[key][i]) for key in FLAG_COLUMNS]
+            for bedroom in bedrooms:
+                for apartment_type in types:
+                    rows.append((district, bedroom, apartment_type, year, *flags, int(buckets[i])))
+                    positions.append(i)
+
+        columns = ("district", "bedroom", "apartment_type", "year", *FLAG_COLUMNS, "bucket")
+        facts = np.array(rows, dtype=np.int64).reshape(-1, len(columns))
+        groups, inverse, counts = np.unique(facts, axis=0, return_inverse=True, return_counts=True)
+        self.columns = {name: groups[:, j] for j, name in enumerate(columns)}
+        self.counts = counts
+        # اولین ملک هر گروه در لیست؛ مناطق هم‌تعداد مثل قبل به ترتیب اولین ملکشان می‌آیند
+        self.first = np.full(len(groups), len(index), dtype=np.int64)
+        np.minimum.at(self.first, inverse.reshape(-1), np.asarray(positions, dtype=np.int64))
+        self.properties = len(index)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def supports(self, filters, min_area=None, max_area=None):
+        """ آیا این فیلترها فقط با ابعاد تجمیعی (و مرزهای قیمت) قابل پاسخ هستند؟ """
+        if min_area is not None or max_area is not None:
+            return False
+        if any(value is not None for key, value in filters.items() if key not in AGGREGATE_FILTERS):
+            return False
+        for key in ("min_price", "max_price"):
+            if filters.get(key) is not None and _edge(filters[key]) is None:
+                return False
+        for key in ("apartments", "apartmentType"):
+            values = filters.get(key)
+            if values is not None and (not isinstance(values, list) or len(values) != 1 or _ref_id(values[0]) < 0):
+                return False
+        if filters.get("apartments") is not None and _ref_id(filters["apartments"][0]) >= 64:
+            return False
+        return True
+
+    def _mask(self, filters, delivery_year=None):
+        columns = self.columns
+        apartments = filters.get("apartments")
+        apartment_type = filters.get("apartmentType")
+        mask = columns["bedroom"] == (_ref_id(apartments[0]) if apartments else ANY)
+        mask &= columns["apartment_type"] == (_ref_id(apartment_type[0]) if apartment_type else ANY)
+
+        if delivery_year is not None:
+            mask &= columns["year"] == delivery_year
+        for key in FLAG_COLUMNS:
+            if filters.get(key) is not None:
+                mask &= columns[key] == int(filters[key])
+
+        # مقایسه با مرزها دقیق است چون فقط قیمت‌های روی مرز پذیرفته شده‌اند
+        if filters.get("max_price") is not None:
+            mask &= columns["bucket"] <= 2 * _edge(filters["max_price"]) + 1
+        if filters.get("min_price") is not None:
+            mask &= columns["bucket"] >= 2 * _edge(filters["min_price"]) + 1
+        if filters.get("max_price") is not None or filters.get("min_price") is not None:
+            mask &= columns["bucket"] != NO_PRICE
+        return mask
+
+    def district_counts(self, filters, delivery_year=None):
+        """ لیست (نام منطقه، تعداد ملک) به ترتیب نزولی تعداد """
+        mask = self._mask(filters, delivery_year)
+        districts = self.columns["district"][mask]
+        totals = np.bincount(districts, weights=self.counts[mask], minlength=len(self.names))
+        first = np.full(len(self.names), self.properties, dtype=np.int64)
+        np.minimum.at(first, districts, self.first[mask])
+        order = np.lexsort((first, -totals))
+        return [(self.names[int(code)], int(totals[code])) for code in order if totals[code] > 0]
+
+    def stats(self):
+        return {
+            "districts": len(self.names),
+            "groups": len(self),
+            "properties": self.properties,
+        }
@@ -0,0 +1,263 @@
+import asyncio
+import json
+import os
+import time
+
+import httpx
+from cachetools import LRUCache, TTLCache
+
+
+class EstatyAPIError(Exception):
+    """ خطا در ارتباط با Estaty API (وضعیت غیر 200، تایم‌اوت یا قطع ارتباط) """
+
+
+def canonical_filters(filters):
+    """ شکل یکتای فیلترها برای کلید کش: کلیدهای مرتب، لیست‌های مرتب و بدون تکرار، بدون مقدارهای null """
+    normalized = {}
+    for key, value in filters.items():
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            value = sorted(set(value), key=lambda v: (type(v).__name__, str(v)))
+        elif isinstance(value, str):
+            value = value.strip()
+        normalized[key] = value
+    return json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class _CachedListing:
+    __slots__ = ("properties", "size")
+
+    def __init__(self, properties, size):
+        self.properties = properties
+        self.size = size
+
+
+class _CachedDetail:
+    __slots__ = ("detail", "fetched_at")
+
+    def __init__(self, detail):
+        self.detail = detail
+        self.fetched_at = time.monotonic()
+
+
+class EstatyClient:
+    """ کلاینت async برای Estaty با اتصال‌های keep-alive مشترک، تایم‌اوت و محدودیت همزمانی """
+
+    def __init__(self, base_url, api_key, max_concurrency=10, filter_timeout=15.0, property_timeout=8.0,
+                 filter_cache_ttl=600, filter_cache_bytes=64 * 1024 * 1024,
+                 detail_fresh_ttl=600, detail_stale_ttl=3600, detail_cache_size=2000):
+        self.base_url = base_url
+        self.headers = {
+            "App-Key": api_key or "",
+            "Content-Type": "application/json"
+        }
+        self.max_concurrency = max_concurrency
+        self.filter_timeout = filter_timeout
+        self.property_timeout = property_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._http = None
+
+        # ✅ کش نتیجه /filter (سقف بر اساس حجم پاسخ) و درخواست‌های در حال اجرا برای ادغام درخواست‌های یکسان
+        self._filter_cache = TTLCache(maxsize=filter_cache_bytes, ttl=filter_cache_ttl, getsizeof=lambda entry: entry.size)
+        self._inflight = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.coalesced = 0
+
+        # ✅ کش جزئیات ملک: تا detail_fresh_ttl تازه، تا detail_stale_ttl کهنه ولی قابل استفاده (با به‌روزرسانی پس‌زمینه)
+        self.detail_fresh_ttl = detail_fresh_ttl
+        self.detail_stale_ttl = detail_stale_ttl
+        self._details = LRUCache(maxsize=detail_cache_size)
+        self._detail_inflight = {}
+        self._background = set()
+        self.detail_hits = 0
+        self.detail_stale_hits = 0
+        self.detail_misses = 0
+        self.prefetched = 0
+
+    def _client(self):
+        # ✅ ساخت تنبل کلاینت تا داخل event loop ساخته شود
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                timeout=httpx.Timeout(self.filter_timeout, connect=5.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                    keepalive_expiry=60.0,
+                ),
+            )
+        return self._http
+
+    async def _post(self, path, payload, timeout):
+        data, _ = await self._post_sized(path, payload, timeout)
+        return data
+
+    async def _post_sized(self, path, payload, timeout):
+        """ مثل _post ولی حجم پاسخ (بایت) را هم برمی‌گرداند """
+        async with self._semaphore:
+            try:
+                response = await self._client().post(path, json=payload, timeout=timeout)
+            except httpx.HTTPError as e:
+                raise EstatyAPIError(f"{path}: {type(e).__name__} {e}") from e
+
+        if response.status_code != 200:
+            raise EstatyAPIError(f"{path}: HTTP {response.status_code}")
+
+        try:
+            return response.json(), len(response.content)
+        except ValueError as e:
+            raise EstatyAPIError(f"{path}: invalid JSON") from e
+
+    async def filter(self, filters, timeout=None, use_cache=True):
+        """ فراخوانی /filter و برگرداندن لیست املاک (با کش و ادغام درخواست‌های همزمان یکسان) """
+        if not use_cache:
+            data, _ = await self._post_sized("/filter", filters, timeout or self.filter_timeout)
+            return data.get("properties", []) or []
+
+        key = canonical_filters(filters)
+        entry = self._filter_cache.get(key)
+        if entry is not None:
+            self.cache_hits += 1
+            return self._copy(entry.properties)
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.cache_misses += 1
+            task = asyncio.create_task(self._fetch_listing(key, dict(filters), timeout))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+
+        # shield: لغو شدن یک درخواست، درخواست مشترک بقیه را لغو نمی‌کند
+        properties = await asyncio.shield(task)
+        return self._copy(properties)
+
+    async def _fetch_listing(self, key, filters, timeout):
+        data, size = await self._post_sized("/filter", filters, timeout or self.filter_timeout)
+        properties = data.get("properties", []) or []
+        try:
+            self._filter_cache[key] = _CachedListing(properties, size)
+        except ValueError:
+            # پاسخ از کل ظرفیت کش بزرگ‌تر است
+            pass
+        return properties
+
+    def _forget(self, key, task):
+        self._inflight.pop(key, None)
+        # خطا به همه منتظرها رسیده؛ اینجا فقط خوانده می‌شود تا هشدار asyncio چاپ نشود
+        if not task.cancelled():
+            task.exception()
+
+    @staticmethod
+    def _copy(properties):
+        # بعضی توابع (مثل generate_ai_summary) فیلدهای ملک را در جا تغییر می‌دهند
+        return [dict(prop) for prop in properties]
+
+    async def get_property(self, property_id, timeout=None):
+        """ اطلاعات کامل یک ملک (/getProperty) با کش stale-while-revalidate """
+        entry = self._details.get(property_id)
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            if age <= self.detail_fresh_ttl:
+                self.detail_hits += 1
+                return dict(entry.detail)
+            if age <= self.detail_stale_ttl:
+                # ✅ جواب کهنه فوراً برگردانده می‌شود و نسخه جدید در پس‌زمینه گرفته می‌شود
+                self.detail_stale_hits += 1
+                self._background_fetch(property_id)
+                return dict(entry.detail)
+
+        self.detail_misses += 1
+        detail = await asyncio.shield(self._detail_task(property_id, timeout))
+        return dict(detail)
+
+    def _detail_task(self, property_id, timeout=None):
+        # درخواست‌های همزمان برای یک ملک، یک فراخوانی مشترک دارند
+        task = self._detail_inflight.get(property_id)
+        if task is None:
+            task = asyncio.create_task(self._fetch_detail(property_id, timeout))
+            self._detail_inflight[property_id] = task
+            task.add_done_callback(lambda done: self._forget_detail(property_id, done))
+        return task
+
+    async def _fetch_detail(self, property_id, timeout):
+        data = await self._post("/getProperty", {"id": property_id}, timeout or self.property_timeout)
+        detail = data.get("property", {}) or {}
+        if detail:
+            self._details[property_id] = _CachedDetail(detail)
+        return detail
+
+    def _forget_detail(self, property_id, task):
+        self._detail_inflight.pop(property_id, None)
+        # خطا به منتظرها رسیده؛ اینجا فقط خوانده می‌شود تا هشدار asyncio چاپ نشود
+        if not task.cancelled():
+            task.exception()
+
+    def _background_fetch(self, property_id):
+        if property_id in self._detail_inflight:
+            return
+        task = self._detail_task(property_id)
+        # نگه داشتن ارجاع تا تسک قبل از اتمام جمع‌آوری نشود
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        task.add_done_callback(lambda done: self._log_background_error(property_id, done))
+
+    @staticmethod
+    def _log_background_error(property_id, task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️ خطا در دریافت پس‌زمینه جزئیات ملک {property_id}: {task.exception()}")
+
+    def prefetch_properties(self, property_ids):
+        """ دریافت پس‌زمینه جزئیات املاکی که تازه به کاربر نمایش داده شده‌اند """
+        for property_id in property_ids:
+            if property_id is None:
+                continue
+            entry = self._details.get(property_id)
+            if entry is not None and time.monotonic() - entry.fetched_at <= self.detail_fresh_ttl:
+                continue
+            self.prefetched += 1
+            self._background_fetch(property_id)
+
+    def invalidate_property(self, property_id):
+        """ حذف جزئیات ذخیره‌شده یک ملک (مثلاً وقتی همگام‌سازی تغییرش را دیده) """
+        self._details.pop(property_id, None)
+
+    def stats(self):
+        return {
+            "filter_cache_entries": len(self._filter_cache),
+            "filter_cache_bytes": self._filter_cache.currsize,
+            "filter_cache_hits": self.cache_hits,
+            "filter_cache_misses": self.cache_misses,
+            "filter_coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "detail_cache_entries": len(self._details),
+            "detail_hits": self.detail_hits,
+            "detail_stale_hits": self.detail_stale_hits,
+            "detail_misses": self.detail_misses,
+            "detail_prefetched": self.prefetched,
+        }
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+def estaty_client_from_env(base_url, api_key):
+    """ ساخت EstatyClient با تنظیمات متغیرهای محیطی """
+    return EstatyClient(
+        base_url,
+        api_key,
+        max_concurrency=int(os.getenv("ESTATY_MAX_CONCURRENCY", "10")),
+        filter_timeout=float(os.getenv("ESTATY_FILTER_TIMEOUT", "15")),
+        property_timeout=float(os.getenv("ESTATY_PROPERTY_TIMEOUT", "8")),
+        filter_cache_ttl=int(os.getenv("ESTATY_FILTER_CACHE_TTL", "600")),
+        filter_cache_bytes=int(os.getenv("ESTATY_FILTER_CACHE_MB", "64")) * 1024 * 1024,
+        detail_fresh_ttl=int(os.getenv("ESTATY_DETAIL_FRESH_TTL", "600")),
+        detail_stale_ttl=int(os.getenv("ESTATY_DETAIL_STALE_TTL", "3600")),
+        detail_cache_size=int(os.getenv("ESTATY_DETAIL_CACHE_SIZE", "2000")),
+    )
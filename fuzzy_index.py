@@ -0,0 +1,167 @@
+from collections import Counter, OrderedDict
+
+from fuzzywuzzy import fuzz, utils
+
+
+NGRAM = 2
+
+# پرس‌وجوهای کوتاه‌تر از این با همه گزینه‌ها مقایسه می‌شوند (هرس n-gram برایشان قابل اعتماد نیست)
+MIN_PRUNED_QUERY = 6
+
+# ✅ وقتی بهترین امتیاز نامزدها به آستانه پذیرش صدا زننده‌ها (۷۰) برسد همه گزینه‌ها بررسی می‌شوند؛
+# گزینه‌های هرس‌شده ممکن است همین امتیاز را بگیرند و extractOne در تساوی گزینه جلوتر لیست را برمی‌گرداند
+FULL_SCAN_SCORE = 70
+
+
+def normalize_query(text):
+    """ همان پیش‌پردازش پرس‌وجو در fuzzywuzzy.process.extractOne """
+    return utils.full_process(utils.full_process(str(text)), force_ascii=True)
+
+
+def normalize_choice(text):
+    """ همان پیش‌پردازش هر گزینه در fuzzywuzzy.process.extractOne """
+    return utils.full_process(str(text), force_ascii=True)
+
+
+def ngrams(text):
+    padded = f" {text} "
+    return {padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)}
+
+
+class FuzzyIndex:
+    """ جایگزین process.extractOne با کلیدهای از پیش نرمال‌شده، هرس نامزدها با n-gram و کش نتایج """
+
+    def __init__(self, choices, max_candidates=32, cache_size=4096, full_scan_score=FULL_SCAN_SCORE):
+        self.choices = tuple(choices)
+        self.max_candidates = max_candidates
+        self.cache_size = cache_size
+        self.full_scan_score = full_scan_score
+        self._processed = [normalize_choice(choice) for choice in self.choices]
+
+        postings = {}
+        token_postings = {}
+        self._gram_counts = []
+        for i, processed in enumerate(self._processed):
+            grams = ngrams(processed)
+            self._gram_counts.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+            for token in set(processed.split()):
+                token_postings.setdefault(token, []).append(i)
+        self._postings = postings
+        # گزینه‌هایی که یک کلمه کامل مشترک با پرس‌وجو دارند در token_set_ratio امتیاز بالا می‌گیرند
+        self._token_postings = token_postings
+
+        # ✅ گزینه‌هایی با کلمه کوتاه (مثل "H&H" یا "API") در WRatio با هر متنی که آن حروف را دارد امتیاز بالا می‌گیرند
+        # ولی n-gram مشترک زیادی ندارند، پس همیشه بررسی می‌شوند
+        self._always = [
+            i for i, processed in enumerate(self._processed)
+            if not processed or any(len(token) <= NGRAM + 1 for token in processed.split())
+        ]
+
+        self._cache = OrderedDict()
+        self.lookups = 0
+        self.cache_hits = 0
+        self.scored = 0
+        self.full_scans = 0
+
+    def extract_one(self, query):
+        """ (بهترین گزینه، امتیاز WRatio) مثل process.extractOne؛ برای لیست خالی (None, 0) """
+        self.lookups += 1
+        if not self.choices:
+            return None, 0
+
+        processed_query = normalize_query(query)
+        cached = self._cache.get(processed_query)
+        if cached is not None:
+            self._cache.move_to_end(processed_query)
+            self.cache_hits += 1
+            return cached
+
+        result = self._best(processed_query)
+        self._cache[processed_query] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def _candidates(self, processed_query):
+        """ شماره گزینه‌هایی که بیشترین همپوشانی n-gram را با پرس‌وجو دارند، به ترتیب اصلی لیست """
+        if len(self.choices) <= self.max_candidates or len(processed_query) < MIN_PRUNED_QUERY:
+            return range(len(self.choices))
+
+        query_grams = ngrams(processed_query)
+        overlap = Counter()
+        for gram in query_grams:
+            for i in self._postings.get(gram, ()):
+                overlap[i] += 1
+        if not overlap:
+            return range(len(self.choices))
+
+        # همپوشانی نسبت به رشته کوتاه‌تر (مثل partial_ratio که رشته کوتاه را داخل بلندتر می‌گردد)
+        containment = {
+            i: count / min(len(query_grams), self._gram_counts[i])
+            for i, count in overlap.items()
+        }
+        ranked = sorted(containment.values(), reverse=True)
+        # گزینه‌های هم‌امتیاز با آخرین نامزد هم بررسی می‌شوند تا هرس به ترتیب لیست وابسته نباشد
+        floor = ranked[min(self.max_candidates, len(ranked)) - 1]
+        selected = {i for i, value in containment.items() if value >= floor}
+        selected.update(self._always)
+        for token in set(processed_query.split()):
+            selected.update(self._token_postings.get(token, ()))
+        return sorted(selected)
+
+    def _best(self, processed_query):
+        if not processed_query:
+            # fuzzywuzzy در این حالت به همه امتیاز صفر می‌دهد و اولین گزینه را برمی‌گرداند
+            return self.choices[0], 0
+
+        candidates = self._candidates(processed_query)
+        best, best_score = self._scan(processed_query, candidates)
+        if best_score >= self.full_scan_score and len(candidates) < len(self.choices):
+            self.full_scans += 1
+            selected = set(candidates)
+            other, other_score = self._scan(processed_query, [i for i in range(len(self.choices)) if i not in selected])
+            # در تساوی، گزینه جلوتر در لیست (همان رفتار extractOne)
+            if other_score > best_score or (other_score == best_score and other < best):
+                best, best_score = other, other_score
+        return self.choices[best], best_score
+
+    def _scan(self, processed_query, candidates):
+        """ (شماره بهترین گزینه، امتیاز) بین این نامزدها """
+        best, best_score = None, -1
+        for i in candidates:
+            self.scored += 1
+            score = fuzz.WRatio(processed_query, self._processed[i], full_process=False)
+            # مثل max در extractOne: در امتیاز برابر، گزینه جلوتر در لیست
+            if score > best_score:
+                best, best_score = i, score
+        return best, best_score
+
+    def stats(self):
+        misses = self.lookups - self.cache_hits
+        return {
+            "choices": len(self.choices),
+            "lookups": self.lookups,
+            "cache_hits": self.cache_hits,
+            "avg_scored_per_miss": round(self.scored / misses, 1) if misses else 0.0,
+            "full_scans": self.full_scans,
+        }
+
+
+# ✅ ایندکس‌های لیست‌های پویا (مثل نام املاک معرفی‌شده در هر مکالمه) بر اساس محتوای لیست نگه داشته می‌شوند
+_dynamic_indexes = OrderedDict()
+DYNAMIC_INDEX_LIMIT = 512
+
+
+def extract_one(query, choices):
+    """ معادل process.extractOne(query, choices) برای لیست‌هایی که در طول مکالمه تغییر می‌کنند """
+    key = tuple(choices)
+    index = _dynamic_indexes.get(key)
+    if index is None:
+        index = _dynamic_indexes[key] = FuzzyIndex(key, cache_size=64)
+        if len(_dynamic_indexes) > DYNAMIC_INDEX_LIMIT:
+            _dynamic_indexes.popitem(last=False)
+    else:
+        _dynamic_indexes.move_to_end(key)
+    return index.extract_one(query)
@@ -0,0 +1,338 @@
+from types import MappingProxyType
+
+from fuzzy_index import FuzzyIndex
+
+
+class Lookup:
+    """ جدول نگاشت فقط‌خواندنی نام ← شناسه با ایندکس معکوس شناسه ← نام """
+
+    def __init__(self, mapping):
+        self.by_name = MappingProxyType(dict(mapping))
+        self.names = tuple(self.by_name)
+        reverse = {}
+        for name, value in self.by_name.items():
+            # اگر چند نام یک شناسه داشته باشند، اولین نام ملاک است
+            reverse.setdefault(_id_key(value), name)
+        self.by_id = MappingProxyType(reverse)
+        self._matcher = None
+
+    def extract_one(self, query):
+        """ نزدیک‌ترین نام به متن کاربر و امتیاز آن (مثل process.extractOne روی نام‌ها) """
+        if self._matcher is None:
+            self._matcher = FuzzyIndex(self.names)
+        return self._matcher.extract_one(query)
+
+    def match_stats(self):
+        return self._matcher.stats() if self._matcher is not None else None
+
+    def get(self, name, default=None):
+        return self.by_name.get(name, default)
+
+    def name_for(self, value, default=None):
+        """ نام متناظر یک شناسه (عدد، رشته یا دیکشنری {"id": ...}) """
+        return self.by_id.get(_id_key(value), default)
+
+    def keys(self):
+        return self.by_name.keys()
+
+    def __getitem__(self, name):
+        return self.by_name[name]
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+
+def _id_key(value):
+    if isinstance(value, dict):
+        value = value.get("id")
+    return str(value)
+
+
+# ✅ جدول‌های نگاشت فیلترها؛ فقط یک بار هنگام import ساخته می‌شوند
+
+# مناطق ← شناسه Estaty (فیلتر district با نام منطقه انجام می‌شود)
+DISTRICTS = Lookup({
+    "Masdar City": 340, "Meydan": 133, "Wadi AlSafa 2": 146, "Wadi AlSafa 5": 246, "Alamerah": 279, "JVC": 243,
+    "Remraam": 284, "Aljadaf": 122, "Liwan": 294, "Arjan": 201, "Dubai Creek Harbour": 152,
+    "Damac Lagoons": 259, "Dubai Downtown": 143, "Muwaileh": 304, "Palm Jumeirah": 134, "Business Bay": 252,
+    "City Walk": 228, "Emaar South": 354, "Dubai Production City": 217, "Nadd Al Shiba": 355,
+    "Dubai Hills": 241, "Jabal Ali Industrial Second": 131, "AlYelayiss 2": 162, "Town Square Dubai": 275,
+    "Majan": 231, "Ramhan Island": 315, "AlKifaf": 167, "Alyasmeen": 310, "Sports City": 203,
+    "Mbr District One": 319, "Alraha": 352, "Damac Hills 2": 213, "Wadi AlSafa 4": 189, "Expo City": 292,
+    "Almarjan Island": 297, "Zaabeel Second": 120, "Yas Island": 303, "Zayed City": 295, "Port Rashid": 378,
+    "Alhamra Island": 278, "Jabal Ali First": 130, "Dubai Land Residence Complex": 307, "Reem Island": 298,
+    "Dubai Investment Park": 156, "The Oasis": 363, "Alheliow1": 311, "Dubai South": 328, "The Valley": 361,
+    "JVT": 244, "Rashid Yachts and Marina": 383, "Golf City": 266, "Jebel Ali Village": 345,
+    "Alhudayriyat Island": 365, "Damac Hills": 210, "Alzorah": 364, "Alfurjan": 346, "Discovery Gardens": 235,
+    "Dubai Islands": 233, "Alsatwa": 273, "Dubai Motor City": 124, "Palm Jabal Ali": 161,
+    "Saadiyat Island": 296, "Dubai Marina": 239, "Dubai Industrial City": 308, "Mina Alarab": 293,
+    "Sobha Hartland": 332, "Alwasl": 141, "Bluewaters Bay": 286, "JLT": 212, "World Islands": 247,
+    "Mirdif": 163, "Jumeirah Island One": 150, "City Of Arabia": 236, "Alreem Island": 264, "Almaryah": 337,
+    "Albarsha South": 341, "Aljada": 327, "International City Phase (2)": 309, "Alshamkha": 362,
+    "Ghaf Woods": 389, "Hamriya West": 353, "Al Yelayiss 1": 397, "Al Tay": 343, "Studio City": 316,
+    "Maryam Island": 314, "Rukan Community": 414, "Madinat Jumeirah Living": 285, "Dubai Maritime City": 216,
+    "Wadi Al Safa 7": 261, "Alzahya": 312, "Jumeirah Park": 317, "Bukadra": 349, "Alsafouh Second": 407,
+    "Dubai Sports City": 342, "Al Barsha South Second": 409, "Mohammed Bin Rashid City": 318, "Jumeirah 2": 334,
+    "Uptown, AlThanyah Fifth": 220, "Wadi AlSafa 3": 187, "Jumeirah Heights": 402, "Dubai Silicon Oasis": 245,
+    "Dubai Design District": 230, "Tilal AlGhaf": 199, "Albelaida": 280, "Jumeirah Beach Residence": 375,
+    "Dubai International Financial Centre (DIFC)": 333, "Dubai Water Canal": 387, "Al Barsha 1": 400,
+    "Alwadi Desert": 406, "Jumeirah Golf Estates": 291, "Warsan Fourth": 249, "Meydan D11": 404,
+    "Nad Alsheba 1": 413, "Aljurf": 359, "MBR City D11": 368, "International City": 248, "Alrashidiya 1": 386,
+    "Free Zone": 367, "Dubai Internet City": 398, "Khalifa City": 357, "Ghantoot": 358, "Alnuaimia 1": 392,
+    "Alhamriyah": 415, "Barsha Heights": 385, "Ajmal Makan City": 276, "Motor City": 326, "Legends": 412,
+    "Sharm": 374, "AlSafouh First": 125, "Barashi": 305, "Al Maryah Island": 399, "Jumeirah Garden City": 356,
+    "Dubai Investment Park 2": 366, "Sheikh Zayed Road, Alsafa": 263, "Dubai Land": 417,
+    "Madinat Almataar": 250, "Emaar Beachfront": 391, "Dubai Harbour": 242, "Alheliow2": 313,
+    "Alsuyoh Suburb": 324, "Tilal": 325, "Almuntazah": 339, "Alrashidiya 3": 321, "Alsafa": 268,
+    "Almamzar": 306, "Sobha Hartland 2": 408, "Siniya Island": 360, "Ras AlKhor Ind. First": 257,
+    "Albarari": 418, "Alwaha": 416, "Dubai Science Park": 351, "Ain Al Fayda": 369, "Marina": 336,
+    "Dubai Healthcare City": 238, "Trade Center First": 148, "Damac Islands": 394,
+    "The Heights Country Club": 396, "Al Yelayiss 5": 411, "Hayat Islands": 283,
+    "Mina AlArab, Hayat Islands": 282, "Dubai Media City": 258, "Al Khalidiya": 382,
+    "AlBarsha South Fourth": 301, "Alrahmaniya": 390, "AlBarsha South Fifth": 123, "AlFaqa'": 329,
+    "Raha Island": 347,
+})
+
+# شرکت‌های سازنده ← شناسه Estaty
+DEVELOPERS = Lookup({
+    "Burtville Developments": 330, "Sobha": 3, "Tiger Properties": 103, "Azizi": 37, "Meraas": 70,
+    "Dubai Properties": 258, "Confident Group": 308, "Iman Developers": 61, "EMAAR": 2,
+    "Shapoorji Pallonji": 91, "Arada Properties": 35, "Ellington Properties": 50, "Select Group": 85,
+    "Nshama": 76, "Arenco Real Estate": 398, "Rijas Aces Property": 233, "Wasl": 109, "London Gate": 264,
+    "Nakheel": 74, "GFH": 60, "Expo City": 54, "AYS Developments": 36, "Imtiaz": 87, "Park Group": 366,
+    "Prestige One": 80, "Almazaya Holding": 68, "Samana Developers": 83, "Aldar": 32, "Bloom Holding": 270,
+    "AG Properties": 317, "Swank Development": 393, "Binghatti": 38, "Divine One Group": 311,
+    "Emirates properties": 267, "Dubai South": 323, "Pearlshire Developments": 329, "Gulf Land": 239,
+    "Radiant": 269, "Modon Properties": 394, "Oro24": 241, "Alzorah Development": 383,
+    "Algouta Properties": 380, "Naseeb Group": 265, "GJ Properties": 326, "Amwaj Development": 348,
+    "Grid properties": 296, "Aqua Properties": 34, "SRG Holding": 95, "Roya Lifestyle Developments": 338,
+    "Omniyat": 77, "Aqasa Developers": 333, "Zimaya Properties": 392, "Amali Properties": 341, "Credo": 324,
+    "AAF Development": 409, "Dalands Developer": 427, "The Heart of Europe": 101, "HRE Development": 399,
+    "Lootah": 65, "AJ Gargash Real Estate": 465, "Damac": 318, "Townx Real Estate": 105, "Symbolic": 97,
+    "Nabni developments": 294, "Deyaar": 45, "Citi Developers": 283, "Mashriq Elite": 332,
+    "IFA Hotels & Resorts": 486, "Q Properties": 408, "ARAS Real Estate": 293, "East & West Properties": 49,
+    "H&H": 315, "Laya": 238, "Leos": 240, "Reportage": 232, "Empire Development": 52, "Object 1": 237,
+    "KASCO Development": 433, "Esnad Management": 421, "Majid Al Futtaim Group": 111, "Signature D T": 203,
+    "Sol Properties": 94, "Luxe Developer": 327, "Dugasta": 276, "Avelon Developments": 287, "Rokane": 417,
+    "LMD Real Estate": 227, "Source of Fate": 434, "Vision developments": 390, "Peace Homes Development": 250,
+    "JRP Development": 410, "MAG": 242, "Riviera Group": 298, "Durar": 320, "Meraki Developers": 71,
+    "Uniestate Properties": 107, "Eagle Hills": 299, "IRTH": 372, "Amaya Properties LLC": 413,
+    "Ajmal Makan": 260, "Siroya Ventures Realty L.L.C": 445, "HMB": 247, "Enso Development": 403,
+    "Marquis Point": 274, "Meteora": 278, "Vincitore": 108, "Taraf": 100, "ADE Properties": 446,
+    "Baccarat": 370, "Condor Group": 41, "Rabdan": 289, "Pure Gold": 256, "Saas Properties": 300,
+    "Dubai Invesment": 254, "Swiss Properties": 96, "Beyond": 443, "Green Group": 346, "Mubadala": 468,
+    "Main Realty": 334, "Danube Properties": 42, "Ambs Real Estate": 360, "MeDoRe": 255,
+    "Heilbronn Properties": 339, "Maaia Developments": 517, "Ginco Properties": 374, "Qube Development": 354,
+    "Orange": 303, "Alseeb Real Estate Development": 442, "Peak Summit Real Estate Development": 350,
+    "Regent Developers": 501, "Mr. Eight Development": 430, "BnW Developments": 382,
+    "Tuscany Real Estate Development": 396, "RAK Properties": 245, "Siadah International Real Estate": 406,
+    "One Development": 425, "AHS Properties": 319, "ARIB Developments": 389, "Segrex": 284, "DIFC": 502,
+    "DarGlobal": 44, "Fortune 5": 58, "Green Yard Properties": 412, "Ahmadyar Developments": 375,
+    "Sankari Properties": 310, "Alta Real Estate Development": 491, "Sama Ezdan": 205, "Stamn Development": 440,
+    "Kamdar developments": 470, "BT Properties": 507, "IGO": 259, "Orra Real Estate": 204, "Five Holdings": 56,
+    "Karma": 62, "Almarwan Developments": 458, "Khamas Group Of Investment Co's": 363, "Imkan": 371,
+    "LAPIS Properties": 419, "Liv Developers": 64, "S&S Real Estate": 499, "Fakhruddin Properties": 55,
+    "Saba Property Developers": 416, "Majid Developments": 401, "HVM Living": 484, "Golden Wood": 407,
+    "EL Prime Properties": 431, "Wellcube.life": 395, "Mubarak Al Beshara Real Estate Development": 420,
+    "Dar Alkarama": 43, "Palma Holding": 340, "Vantage Properties": 469, "Shurooq Development": 435,
+    "Vakson Real Estate": 358, "Tasmeer Indigo Properties": 352, "Acube Developments": 309, "Mada'in": 154,
+    "Anax Developments": 301, "API": 455, "Alhamra": 351, "AB Developers": 367, "Tarrad Real Estate": 451,
+    "Esnaad": 302, "4 Direction Developers": 508, "Alzarooni Development": 444, "Alma Developments": 500,
+    "Reef Luxury Development": 424, "Blanco Thornton Properties": 402, "Amaal": 498, "Wahat Al Zaweya": 397,
+    "Alef Group": 273, "One Yard": 200, "AAA Development": 441, "Ohana Developments": 369,
+    "Forum Real Estate": 387, "Nine Development": 411, "Nine Yards Development": 494, "Mira Developments": 282,
+    "MAK Developers": 415, "MS Homes": 376, "Crystal Bay Development": 377, "Galaxy": 379,
+    "Advanced Properties": 268, "City View Developments": 391, "Svarn": 368, "Centurion Developers": 464,
+    "Union Properties": 364, "Wellington Developments": 497, "Seven Mayfair Real Estate": 515,
+    "DV8 Developers": 423, "Zenith Group": 513, "AlMadar Investment L.L.C": 428, "Abou Eid Real Estate": 252,
+    "Asak Real Estate": 485, "Alhabtoor Group": 28, "Mill Hill Developer": 488, "Alaia Developments": 505,
+    "True Future Development": 495, "ARTE Development": 432, "Time Properties": 104,
+    "GFS Builders & Developers": 471, "Zoya Developments": 386, "Evera Real Estate Development": 467,
+    "77 Shades of Green": 448, "BNH Real Estate Developer": 429, "Oksa Developer": 475,
+    "Alhelal Al zahaby": 452, "Kingdom Properties": 456, "Aark Developers": 26, "Januss Developers": 447,
+    "Grovy Real Estate": 210, "Range Developments": 479, "Matrix developments": 483, "Shoumous": 261,
+    "Lucky Aeon": 66, "Meydan": 422, "Pantheon Development": 78, "DMCC": 388, "Arista Properties": 321,
+    "DHG Properties": 295, "World Of Wonders": 291, "PMR Property": 450, "Major Development’s": 292,
+    "Takmeel Real Estate": 314, "Urban Properties": 385, "Emerald Palace Group": 51,
+    "Metac Properties L.L.C": 23, "Skyline Builders": 285, "Prescott": 357, "Vantage Ventures": 490,
+    "Zane Development": 481, "Yas Developers": 463, "Amirah Developments": 482, "Elysian Properties": 454,
+    "Nexus Developer": 449, "Hayaat Developments": 512, "Lincoln Star Real Estate": 466, "Arsenal East": 473,
+    "Laraix Developers": 511, "Aqaar": 305, "Baraka Development": 304, "Keymavens development": 345,
+    "The 100": 359, "Manam Real Estate Development": 438, "Almarina Holding": 474, "Dia Properties": 518,
+    "Iraz Developments": 335, "Seven Tides": 89, "Albait Alduwaliy Real Estate": 355,
+    "Palladium Development": 356, "Tabeer Developments": 98, "Lacasa Living": 477, "Wow Resorts": 405,
+    "Revolution": 342, "ABA Group": 336, "Cirrera Development": 516, "SOHO Development": 344,
+    "Signature Developers": 426, "Pinnacle Developers": 437, "BAMX Development": 519, "Mered": 288,
+    "AiZN Development": 404, "Octa Properties": 277, "Premier Choice": 520,
+})
+
+# امکانات ← شناسه Estaty (به صورت رشته، مثل فیلتر API)
+FACILITIES = Lookup({
+    "24 hour security": "408",
+    "24/7 Security and Maintenance Services": "399",
+    "Access Control System": "314",
+    "Air Fitness zones": "570",
+    "Art Garden": "510",
+    "BBQ Area": "21",
+    "Baby Care Centre": "163",
+    "Badminton Court": "100",
+    "Balcony": "76",
+    "Basketball Court": "427",
+    "Basketball Playground": "10",
+    "Beach": "387",
+    "Beach Club": "595",
+    "Beauty Saloon": "106",
+    "Bicycle parking": "348",
+    "Bike Paths": "52",
+    "Bike tracks": "458",
+    "Bocce Play Area": "525",
+    "Broadband Internet": "46",
+    "Building Management System": "325",
+    "Business Centre": "175",
+    "CCTV Surveillance": "313",
+    "Cabana Seating": "88",
+    "Cafe": "184",
+    "Central A/C & Heating": "47",
+    "Changing Room and Locker": "533",
+    "Chess Board": "97",
+    "Children's Play Area": "6",
+    "Children's Swimming Pool": "7",
+    "Cinema": "19",
+    "Clinic": "279",
+    "Close Circuit TV System": "323",
+    "Club House": "226",
+    "Co-Working Spaces": "221",
+    "Community hubs": "460",
+    "Concierge Service": "37",
+    "Covered Parking": "31",
+    "Cricket Pitch": "95",
+    "Cycling Track": "276",
+    "Direct Beach Access": "96",
+    "Dog Park": "363",
+    "Electric Vehicle Charging Stations": "229",
+    "Fitness Area": "424",
+    "Fitness Club": "50",
+    "Fitness studio": "397",
+    "Football Playground": "9",
+    "Games Lounge Room": "269",
+    "Garden": "11",
+    "Gym": "334",
+    "Gymnasium": "454",
+    "Health Club": "102",
+    "Hospital": "368",
+    "Jogging Track": "105",
+    "Kids Pool": "381",
+    "Kids Swimming Pool": "452",
+    "Laundry Room": "107",
+    "Library": "87",
+    "Mall": "111",
+    "Meeting Rooms": "369",
+    "Mini Golf": "96",
+    "Mosque": "204",
+    "Music Room": "268",
+    "Nursery": "217",
+    "Outdoor Gym": "26",
+    "Padel Tennis": "467",
+    "Park": "54",
+    "Parking": "405",
+    "Pet Shop": "281",
+    "Pharmacy": "57",
+    "Play Area": "425",
+    "Playground": "319",
+    "Pool Deck": "415",
+    "Private Cinema For Each Unit": "364",
+    "Private Parking for Each unit": "484",
+    "Security": "40",
+    "SPA": "43",
+    "Sauna": "13",
+    "Sauna & Steam Room": "144",
+    "School": "49",
+    "Shared Outdoor Swimming Pool": "20",
+    "Skate Park": "428",
+    "Smart Homes": "378",
+    "Squash Courts": "209",
+    "Supermarket": "56",
+    "Swimming Pool": "74",
+    "Tennis Playground": "8",
+    "Theater": "19",
+    "VR Game Room": "382",
+    "Water Fountain": "356",
+    "Veterinary Clinic": "280",
+    "Yoga": "167",
+    "Zen Garden": "511",
+    "Kids Club": "331",
+    "Safe & Secure": "529",
+})
+
+# تعداد اتاق خواب / نوع واحد ← شناسه apartments
+BEDROOMS = Lookup({
+    "1": 10,
+    "1.5": 23,
+    "2": 11,
+    "2.5": 24,
+    "3": 12,
+    "3.5": 25,
+    "4": 13,
+    "4.5": 26,
+    "5": 14,
+    "5.5": 27,
+    "6": 15,
+    "6.5": 28,
+    "7": 16,
+    "7.5": 29,
+    "8": 17,
+    "9": 18,
+    "10": 19,
+    "11": 22,
+    "Studio": 9,
+    "Penthouse": 34,
+    "Retail": 31,
+    "Office": 20,
+    "Showroom": 35,
+    "Store": 30,
+    "Suite": 32,
+    "Hotel Room": 33,
+    "Full Floor": 36,
+    "Land / Plot": 21,
+})
+
+# نوع واحد ← شناسه apartmentType
+APARTMENT_TYPES = Lookup({
+    "Apartment": 1,
+    "Building": 31,
+    "Duplex": 27,
+    "Full Floor": 4,
+    "Hotel": 32,
+    "Hotel Apartment": 8,
+    "Land / Plot": 6,
+    "Loft": 34,
+    "Office": 7,
+    "Penthouse": 10,
+    "Retail": 33,
+    "Shop": 29,
+    "Show Room": 30,
+    "Store": 25,
+    "Suite": 35,
+    "Townhouse": 9,
+    "Triplex": 28,
+    "Villa": 3,
+    "Warehouse": 26,
+})
+
+# شهر ← شناسه city_id
+CITIES = Lookup({
+    "Dubai": 6,
+    "Abu Dhabi": 9,
+})
+
+# نوع ملک ← مقدار فیلتر property_type
+PROPERTY_TYPES = Lookup({
+    "Residential": {"id": 20, "name": "Residential"},
+    "Commercial": {"id": 3, "name": "Commercial"},
+})
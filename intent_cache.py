@@ -0,0 +1,78 @@
+import os
+
+from cachetools import TTLCache
+
+from intent_router import normalize_text
+
+
+# ✅ فیلدهای حافظه که در تصمیم classifier اثر دارند؛ فقط پر بودن یا نبودنشان در کلید کش می‌آید
+CONTEXT_SLOTS = (
+    "bedrooms", "min_price", "max_price", "district", "city", "property_type",
+    "apartmentType", "payment_plan", "post_delivery", "developer_company",
+    "delivery_date", "guarantee_rental_guarantee", "facilities_name",
+    "sales_status", "min_area", "max_area", "pending_message",
+)
+
+# هر چند پرس‌وجو یک بار نرخ برخورد در لاگ چاپ می‌شود
+LOG_EVERY = 100
+
+
+def context_fingerprint(memory_state):
+    """ بیت‌ماسک فیلدهای پرشده حافظه (ترتیب بیت‌ها همان ترتیب CONTEXT_SLOTS) """
+    mask = 0
+    for bit, key in enumerate(CONTEXT_SLOTS):
+        if memory_state.get(key) is not None:
+            mask |= 1 << bit
+    return mask
+
+
+class IntentCache:
+    """ کش تصمیم‌های classifier بر اساس متن نرمال‌شده پیام، نوع پیام قبلی و فیلدهای پرشده حافظه """
+
+    def __init__(self, maxsize=5000, ttl=3600):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @staticmethod
+    def key(user_message, memory_state):
+        return normalize_text(user_message), memory_state.get("previous_type"), context_fingerprint(memory_state)
+
+    def get(self, user_message, memory_state):
+        """ همان خروجی classifier (type, detail_requested, reset) برای پیام تکراری در همین وضعیت، یا None """
+        decision = self._cache.get(self.key(user_message, memory_state))
+        if decision is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        if (self.hits + self.misses) % LOG_EVERY == 0:
+            print(f"📊 کش تشخیص نوع پیام: نرخ برخورد {self.hit_rate():.1%} از {self.hits + self.misses} پیام")
+        return dict(decision) if decision is not None else None
+
+    def put(self, user_message, memory_state, decision):
+        if not decision:
+            return
+        self._cache[self.key(user_message, memory_state)] = dict(decision)
+        self.stores += 1
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate(), 3),
+            "stores": self.stores,
+        }
+
+
+def intent_cache_from_env():
+    """ ساخت IntentCache با تنظیمات متغیرهای محیطی (INTENT_CACHE_SIZE=0 یعنی بدون کش) """
+    maxsize = int(os.getenv("INTENT_CACHE_SIZE", "5000"))
+    if maxsize <= 0:
+        return None
+    return IntentCache(maxsize=maxsize, ttl=int(os.getenv("INTENT_CACHE_TTL", "3600")))
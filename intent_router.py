@@ -0,0 +1,148 @@
+import re
+
+
+# ✅ تبدیل ارقام فارسی و عربی به انگلیسی
+DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
+
+# ✅ عددهای نوشتاری رایج برای جواب سوال تعداد اتاق خواب ("نه" عمداً حذف شده چون معنی منفی هم دارد)
+NUMBER_WORDS = {
+    "یک": 1, "یه": 1, "دو": 2, "سه": 3, "چهار": 4, "پنج": 5,
+    "شش": 6, "شیش": 6, "هفت": 7, "هشت": 8, "ده": 10,
+}
+
+GREETINGS = ["سلام", "سلام خوبی؟", "سلام چطوری؟", "سلام وقت بخیر", "سلام روزت بخیر"]
+
+RESET_PHRASES = ["ریست", "ریست کن", "ریستش کن", "از اول", "از اول شروع کن", "از اول جستجو کن", "ریست کن از اول"]
+CONTINUE_PHRASES = ["ادامه", "ادامه بده", "با همین ادامه بده", "با همین فیلترها ادامه بده"]
+POST_DELIVERY_ANSWERS = ["قبل از تحویل", "قبل تحویل", "بعد از تحویل", "بعد تحویل", "پس از تحویل", "فرقی نداره", "فرقی نمیکنه"]
+
+# نوع پیام‌هایی که جواب کوتاه کاربر (عدد یا زمان پرداخت) ادامه‌ی آن‌ها حساب می‌شود
+CONTINUABLE_TYPES = ("search", "availability_check")
+
+# نوع پیام‌هایی که فیلتر جستجو دارند
+FILTER_INTENTS = ("search", "search_no_bedroom", "availability_check", "district_search", "property_price")
+
+# ✅ نشانه‌های پیام جستجو؛ فقط برای این پیام‌ها (یا ادامه یک جستجو) قوانین استخراج فیلتر همراه تشخیص نوع فرستاده می‌شود
+SEARCH_HINTS = re.compile(
+    r"\d|خواب|اتاق|آپارتمان|اپارتمان|ویلا|تاون|پنت|خونه|خانه|واحد|ملک|املاک|پروژه|منطقه|محله|قیمت|بودجه|"
+    r"میلیون|هزار|درهم|متر|فوت|تحویل|قسط|اقساط|پرداخت|سازنده|استودیو|موجود|کجا|دبی|ابوظبی|شارجه|"
+    r"studio|villa|apartment|bed|aed"
+)
+
+MORE_PATTERN = re.compile(
+    r"^(لطفا )?(باز هم |بازم )?"
+    r"((املاک|ملک|موارد|مورد|گزینه)( های| ها| هایی)? )?"
+    r"(بیشتر|بیشتری|دیگه|دیگر|دیگری|بعدی)"
+    r"( هم)?( رو| را)?"
+    r"( (نشان|نشون|نمایش|معرفی|پیشنهاد))?"
+    r"( (بده|بدید|بدین|بدی|کن|کنید|کنین))?$"
+)
+BUDGET_PATTERN = re.compile(r"^(تا |حداکثر |زیر )?\d+([.,]\d+)?( (میلیون|هزار|درهم))*$")
+COMPARE_KEYWORD = "مقایسه"
+# ✅ دو شماره کارت (مثل "ملک ۲ و ۳"، "پروژه ۱ با پروژه ۴" یا "۲ و ۳")؛ "۲ خوابه با ۳ خوابه" شماره کارت نیست
+CARD_WORD = r"(?:ملک|پروژه|شماره|مورد|گزینه|کارت)"
+CARD_PAIR_PATTERN = re.compile(
+    rf"(?:{CARD_WORD}( های| ها)? |^|(?<= ))(\d+) (?:و|با) (?:{CARD_WORD} )?(\d+)(?! ?(?:\d|خواب|bed|br|میلیون|هزار|متر|فوت))"
+)
+
+
+def normalize_text(text):
+    """ یکسان‌سازی متن فارسی: ارقام، حروف عربی، نیم‌فاصله، علائم و فاصله‌های اضافه """
+    text = text.translate(DIGITS)
+    text = text.replace("ي", "ی").replace("ك", "ک").replace("‌", " ")
+    text = re.sub(r"[؟?!.،,:;]+$", "", text.strip())
+    text = re.sub(r"\s+", " ", text)
+    return text.strip().lower()
+
+
+class IntentRouter:
+    """ تشخیص سریع نوع پیام‌های ساده با قواعد و الگوها؛ فقط وقتی مطمئن نیست سراغ مدل می‌رود """
+
+    def __init__(self):
+        self._greetings = {normalize_text(g) for g in GREETINGS}
+        self._reset = {normalize_text(p) for p in RESET_PHRASES}
+        self._continue = {normalize_text(p) for p in CONTINUE_PHRASES}
+        self._post_delivery = {normalize_text(p) for p in POST_DELIVERY_ANSWERS}
+        self.total = 0
+        self.hits = {}
+        self.filter_hints = {"likely": 0, "unlikely": 0}
+
+    def _hit(self, rule):
+        self.hits[rule] = self.hits.get(rule, 0) + 1
+
+    def is_greeting(self, user_message):
+        # پیام‌های غیر سلام در route شمرده می‌شوند
+        if normalize_text(user_message) in self._greetings:
+            self.total += 1
+            self._hit("greeting")
+            return True
+        return False
+
+    def route(self, user_message, memory_state, listed=None):
+        """ برگرداندن همان خروجی classifier (type, detail_requested, reset) یا None اگر مطمئن نیست
+
+        listed: شماره کارت‌های معرفی‌شده در این مکالمه (برای تشخیص مقایسه)
+        """
+        self.total += 1
+        text = normalize_text(user_message)
+        previous_type = memory_state.get("previous_type")
+
+        rule, message_type, reset = None, None, False
+
+        if text in self._reset:
+            rule, message_type, reset = "reset", "reset", True
+        elif text in self._continue and memory_state.get("pending_message"):
+            # ادامه همان درخواستی که منتظر تایید ادامه/ریست بود
+            rule, message_type = "continue", previous_type
+        elif MORE_PATTERN.match(text):
+            rule, message_type = "more", "more"
+        elif COMPARE_KEYWORD in text and self._card_pair(text, listed):
+            rule, message_type = "compare", "compare"
+        elif previous_type in CONTINUABLE_TYPES and self._is_short_answer(text):
+            rule, message_type = "short_answer", previous_type
+
+        if rule is None or message_type is None:
+            return None
+
+        self._hit(rule)
+        return {"type": message_type, "detail_requested": None, "reset": reset}
+
+    def filter_intent_likely(self, user_message, memory_state):
+        """ آیا پیام احتمالاً جستجو با فیلتر است؟ (پیام قبلی جستجو بوده یا نشانه جستجو دارد) """
+        text = normalize_text(user_message)
+        likely = (
+            memory_state.get("previous_type") in FILTER_INTENTS
+            or bool(SEARCH_HINTS.search(text))
+            or any(word in NUMBER_WORDS for word in text.split())
+        )
+        self.filter_hints["likely" if likely else "unlikely"] += 1
+        return likely
+
+    def _card_pair(self, text, listed):
+        """ فقط پیام با دقیقاً دو عدد که شماره کارت‌های معرفی‌شده هستند؛ بقیه به classifier می‌روند """
+        if len(re.findall(r"\d+", text)) != 2:
+            return False
+        match = CARD_PAIR_PATTERN.search(text)
+        if match is None:
+            return False
+        return listed is None or all(int(n) in listed for n in match.group(2, 3))
+
+    def _is_short_answer(self, text):
+        """ جواب کوتاه به سوال‌های جستجو: تعداد اتاق، بودجه یا زمان پرداخت """
+        if text.isdigit() and len(text) == 1:
+            return True
+        if text in NUMBER_WORDS or text in ("استودیو", "studio"):
+            return True
+        if text in self._post_delivery:
+            return True
+        return bool(BUDGET_PATTERN.match(text))
+
+    def stats(self):
+        routed = sum(self.hits.values())
+        return {
+            "messages": self.total,
+            "routed": routed,
+            "hit_rate": round(routed / self.total, 3) if self.total else 0.0,
+            "hits": dict(self.hits),
+            "filter_hints": dict(self.filter_hints),
+        }
@@ -0,0 +1,208 @@
+import argparse
+import json
+import math
+import os
+import re
+from collections import Counter, namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from intent_router import normalize_text
+
+
+INDEX_VERSION = 1
+META_FILE = "meta.json"
+PASSAGES_FILE = "postings_passages.npy"
+WEIGHTS_FILE = "postings_weights.npy"
+
+TOKEN = re.compile(r"[\w]+")
+
+# ✅ کلمات پرتکرار فارسی که در امتیاز BM25 اثری جز نویز ندارند
+STOP_WORDS = {
+    "و", "در", "به", "از", "که", "این", "آن", "را", "رو", "با", "برای", "است", "هست", "هستند", "بود", "شود", "می",
+    "یا", "تا", "هم", "اگر", "چه", "چی", "چیه", "چیست", "چطور", "چطوری", "چگونه", "آیا", "کنم", "کنیم", "کرد",
+    "باید", "دارد", "داره", "دارم", "ها", "های", "ای", "یک", "یه", "من", "ما", "شما", "تو", "اون", "اینکه",
+    "میشه", "میخوام", "میخواهم", "بگو", "لطفا", "توضیح", "بده", "بدید", "درباره", "مورد", "the", "a", "of", "in",
+}
+
+PLURAL_SUFFIXES = ("های", "ها")
+
+# score: امتیاز BM25 | coverage: سهم وزن idf کلمات سوال که در همین قطعه آمده‌اند (کلمه ناشناخته = بیشترین idf)
+Hit = namedtuple("Hit", ["score", "coverage", "passage"])
+
+
+def stem(token):
+    """ ریشه‌یابی سبک (فقط حذف «ها/های» و «ی» انتهایی) تا «ویزای» و «ویزا» یکی شوند """
+    for suffix in PLURAL_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 2:
+            token = token[:-len(suffix)]
+            break
+    if token.endswith("ی") and len(token) > 3:
+        token = token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [stem(token) for token in TOKEN.findall(normalize_text(text)) if token not in STOP_WORDS]
+
+
+def read_passages(docs_dir):
+    """ هر فایل markdown یک سند است: خط اول «# عنوان» و هر پاراگراف یک قطعه قابل بازیابی """
+    passages = []
+    for path in sorted(Path(docs_dir).glob("*.md")):
+        lines = path.read_text(encoding="utf-8").strip().splitlines()
+        title = lines[0].lstrip("#").strip() if lines and lines[0].startswith("#") else path.stem
+        body = "\n".join(lines[1:] if lines and lines[0].startswith("#") else lines)
+        for paragraph in re.split(r"\n\s*\n", body):
+            paragraph = " ".join(paragraph.split())
+            if paragraph:
+                passages.append({"title": title, "source": path.name, "text": paragraph})
+    return passages
+
+
+def build_index(docs_dir, index_dir, k1=1.5, b=0.75):
+    """ ساخت آفلاین ایندکس معکوس: وزن BM25 هر (کلمه، قطعه) از قبل حساب و در فایل‌های .npy ذخیره می‌شود """
+    passages = read_passages(docs_dir)
+    # عنوان سند هم جزو متن هر قطعه حساب می‌شود تا قطعه‌های کوتاه موضوعشان را داشته باشند
+    term_counts = [Counter(tokenize(f"{p['title']} {p['text']}")) for p in passages]
+    lengths = np.array([sum(counts.values()) for counts in term_counts], dtype=np.float64)
+    avg_length = float(lengths.mean()) if len(lengths) else 0.0
+
+    postings = {}
+    for passage_id, counts in enumerate(term_counts):
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((passage_id, tf))
+
+    n = len(passages)
+    terms = {}
+    passage_ids, weights = [], []
+    for term in sorted(postings):
+        entries = postings[term]
+        idf = math.log(1 + (n - len(entries) + 0.5) / (len(entries) + 0.5))
+        terms[term] = [len(passage_ids), len(entries), round(idf, 4)]
+        for passage_id, tf in entries:
+            norm = k1 * (1 - b + b * lengths[passage_id] / avg_length)
+            passage_ids.append(passage_id)
+            weights.append(idf * tf * (k1 + 1) / (tf + norm))
+
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    np.save(index_dir / PASSAGES_FILE, np.array(passage_ids, dtype=np.int32))
+    np.save(index_dir / WEIGHTS_FILE, np.array(weights, dtype=np.float32))
+    meta = {
+        "version": INDEX_VERSION, "k1": k1, "b": b, "avg_length": avg_length,
+        "unknown_idf": math.log(1 + (n + 0.5) / 0.5), "passages": passages, "terms": terms,
+    }
+    (index_dir / META_FILE).write_text(json.dumps(meta, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    return n, len(terms), len(passage_ids)
+
+
+class KnowledgeBase:
+    """ بازیابی BM25 قطعه‌های راهنمای خرید از ایندکس ساخته‌شده؛ لیست‌های posting به صورت memory-map خوانده می‌شوند """
+
+    def __init__(self, index_dir, min_score=3.0, min_coverage=0.35):
+        self.index_dir = Path(index_dir)
+        self.min_score = min_score
+        self.min_coverage = min_coverage
+        meta = json.loads((self.index_dir / META_FILE).read_text(encoding="utf-8"))
+        if meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"knowledge index version {meta.get('version')} != {INDEX_VERSION}")
+        self.passages = meta["passages"]
+        self.terms = meta["terms"]
+        self.unknown_idf = meta["unknown_idf"]
+        self._passage_ids = np.load(self.index_dir / PASSAGES_FILE, mmap_mode="r")
+        self._weights = np.load(self.index_dir / WEIGHTS_FILE, mmap_mode="r")
+
+        self.searches = 0
+        self.answered = 0
+
+    def search(self, query, k=3):
+        """ لیست Hit بهترین k قطعه به ترتیب امتیاز """
+        self.searches += 1
+        scores = np.zeros(len(self.passages), dtype=np.float32)
+        matched = []
+        total_idf = 0.0
+        for term in set(tokenize(query)):
+            entry = self.terms.get(term)
+            if entry is None:
+                total_idf += self.unknown_idf
+                continue
+            offset, count, idf = entry
+            total_idf += idf
+            ids = self._passage_ids[offset:offset + count]
+            # هر قطعه در لیست posting یک کلمه فقط یک بار آمده، پس جمع با ایندکس‌گذاری درست است
+            scores[ids] += self._weights[offset:offset + count]
+            matched.append((ids, idf))
+
+        k = min(k, len(scores))
+        if k == 0 or not matched:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        coverage = np.zeros(len(top))
+        for ids, idf in matched:
+            coverage += np.isin(top, ids) * idf
+        coverage /= total_idf
+        return [
+            Hit(float(scores[i]), float(c), self.passages[i])
+            for i, c in zip(top, coverage) if scores[i] > 0
+        ]
+
+    def relevant(self, query, k=3):
+        """ قطعه‌ها فقط وقتی بهترین نتیجه هم امتیاز و هم پوشش کافی دارد؛ وگرنه لیست خالی (جستجوی اینترنتی) """
+        hits = self.search(query, k)
+        if not hits or hits[0].score < self.min_score or hits[0].coverage < self.min_coverage:
+            return []
+        self.answered += 1
+        return [hit for hit in hits if hit.score >= self.min_score / 2]
+
+    def stats(self):
+        return {
+            "index": str(self.index_dir),
+            "passages": len(self.passages),
+            "terms": len(self.terms),
+            "searches": self.searches,
+            "answered_locally": self.answered,
+        }
+
+
+def index_outdated(docs_dir, index_dir):
+    """ آیا ایندکس ساخته نشده، نسخه‌اش قدیمی است یا یکی از اسناد بعد از ساختش تغییر کرده؟ """
+    meta_path = Path(index_dir) / META_FILE
+    if not meta_path.exists():
+        return True
+    if json.loads(meta_path.read_text(encoding="utf-8")).get("version") != INDEX_VERSION:
+        return True
+    built = meta_path.stat().st_mtime
+    return any(path.stat().st_mtime > built for path in Path(docs_dir).glob("*.md"))
+
+
+def knowledge_base_from_env(build=False):
+    """ بارگذاری ایندکس KNOWLEDGE_INDEX_PATH؛ با build=True اگر نیست یا از اسناد KNOWLEDGE_DOCS_PATH قدیمی‌تر است اول ساخته می‌شود """
+    index_dir = os.getenv("KNOWLEDGE_INDEX_PATH", "knowledge_index")
+    if not index_dir:
+        return None
+    docs_dir = os.getenv("KNOWLEDGE_DOCS_PATH", "knowledge_base")
+    if build and any(Path(docs_dir).glob("*.md")) and index_outdated(docs_dir, index_dir):
+        passages, terms, postings = build_index(docs_dir, index_dir)
+        print(f"✅ ایندکس دانش ساخته شد: {passages} قطعه، {terms} کلمه، {postings} posting ← {index_dir}")
+    if not (Path(index_dir) / META_FILE).exists():
+        print(f"⚠️ ایندکس دانش محلی در {index_dir} پیدا نشد؛ هنگام شروع سرور یا با python knowledge_base.py ساخته می‌شود")
+        return None
+    return KnowledgeBase(
+        index_dir,
+        min_score=float(os.getenv("KNOWLEDGE_MIN_SCORE", "3.0")),
+        min_coverage=float(os.getenv("KNOWLEDGE_MIN_COVERAGE", "0.35")),
+    )
+
+
+if __name__ == "__main__":
+    # ✅ مرحله ساخت آفلاین ایندکس (بعد از هر تغییر در اسناد knowledge_base/ دوباره اجرا شود)
+    parser = argparse.ArgumentParser(description="build the BM25 index of the buying-guide knowledge base")
+    parser.add_argument("docs_dir", nargs="?", default=os.getenv("KNOWLEDGE_DOCS_PATH", "knowledge_base"))
+    parser.add_argument("index_dir", nargs="?", default=os.getenv("KNOWLEDGE_INDEX_PATH", "knowledge_index"))
+    args = parser.parse_args()
+    passages, terms, postings = build_index(args.docs_dir, args.index_dir)
+    print(f"✅ ایندکس ساخته شد: {passages} قطعه، {terms} کلمه، {postings} posting ← {args.index_dir}")
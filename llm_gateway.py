@@ -0,0 +1,92 @@
+import asyncio
+import os
+import time
+
+
+# ✅ تایم‌اوت پیش‌فرض هر محل فراخوانی (ثانیه)
+DEFAULT_SITE_TIMEOUTS = {
+    "classify": 15.0,
+    "classify_extract": 30.0,
+    "extract_filters": 25.0,
+    "summary": 25.0,
+    "card_blurbs": 10.0,
+    "details": 40.0,
+    "identify_property": 10.0,
+    "compare": 45.0,
+    "purchase": 45.0,
+    "market": 20.0,
+    "buying_guide": 20.0,
+}
+
+
+class LLMTimeoutError(Exception):
+    """ پاسخ مدل در مهلت تعیین‌شده برای این محل فراخوانی نرسید """
+
+    def __init__(self, site, message):
+        super().__init__(message)
+        self.site = site
+
+
+class LLMGateway:
+    """ درگاه مشترک async برای همه فراخوانی‌های OpenAI با محدودیت همزمانی سراسری و تایم‌اوت هر محل """
+
+    def __init__(self, client, model="gpt-4o-mini", max_concurrency=16, default_timeout=30.0, timeouts=None):
+        self.client = client
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.default_timeout = default_timeout
+        self.timeouts = dict(DEFAULT_SITE_TIMEOUTS, **(timeouts or {}))
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.calls = {}
+        self.timeouts_hit = {}
+
+    def timeout_for(self, site):
+        return self.timeouts.get(site, self.default_timeout)
+
+    async def chat(self, site, messages, **kwargs):
+        """ ارسال درخواست chat completion از طرف یک محل فراخوانی مشخص """
+        return await self._call(site, self.client.chat.completions.create, messages, **kwargs)
+
+    async def parse(self, site, messages, response_format, **kwargs):
+        """ درخواست با خروجی ساخت‌یافته (Structured Outputs) و تبدیل مستقیم به مدل Pydantic """
+        return await self._call(
+            site, self.client.chat.completions.parse, messages, response_format=response_format, **kwargs
+        )
+
+    async def _call(self, site, method, messages, **kwargs):
+        kwargs.setdefault("model", self.model)
+        timeout = self.timeout_for(site)
+        started = time.monotonic()
+        self.calls[site] = self.calls.get(site, 0) + 1
+
+        try:
+            # مهلت شامل زمان انتظار در صف محدودکننده هم می‌شود
+            async with asyncio.timeout(timeout):
+                async with self._semaphore:
+                    self.in_flight += 1
+                    try:
+                        return await method(messages=messages, **kwargs)
+                    finally:
+                        self.in_flight -= 1
+        except TimeoutError as e:
+            self.timeouts_hit[site] = self.timeouts_hit.get(site, 0) + 1
+            raise LLMTimeoutError(site, f"{site}: no response after {time.monotonic() - started:.1f}s") from e
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "calls": dict(self.calls),
+            "timeouts": dict(self.timeouts_hit),
+        }
+
+
+def llm_gateway_from_env(client):
+    """ ساخت LLMGateway با تنظیمات متغیرهای محیطی """
+    return LLMGateway(
+        client,
+        model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+        default_timeout=float(os.getenv("LLM_DEFAULT_TIMEOUT", "30")),
+    )
@@ -1,19 +1,37 @@
-import openai
 import os
-import requests
 import json
 import pandas as pd
+import numpy as np
 from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
+from pydantic import BaseModel, ValidationError
+from typing import Literal
 from dotenv import load_dotenv
 import uvicorn
 import time
-from cachetools import TTLCache, cached
 from datetime import datetime, timezone
 import re
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, LengthFinishReasonError, ContentFilterFinishReasonError
 import asyncio
 import logging
+from estaty_client import EstatyAPIError, estaty_client_from_env
+from catalog import inventory_mirror_from_env
+from price_stats import summarize_properties
+from property_index import PropertyIndex, RankedResults, SQM_TO_SQFT
+from llm_gateway import LLMTimeoutError, llm_gateway_from_env
+from intent_router import FILTER_INTENTS, IntentRouter
+from intent_cache import intent_cache_from_env
+from answer_cache import answer_cache_from_env
+from web_search import web_search_from_env
+from knowledge_base import knowledge_base_from_env
+from property_cards import card_renderer_from_env
+from fuzzy_index import extract_one
+from gazetteer import APARTMENT_TYPES, BEDROOMS, CITIES, DEVELOPERS, DISTRICTS, FACILITIES, PROPERTY_TYPES
+from summary_cache import summary_cache_from_env
+from result_sets import ResultSet, result_set_store_from_env
+from page_prefetch import page_prefetcher_from_env
+from prompt_projection import DEFAULT_BUDGETS, prompt_projector_from_env
 
 # logging.basicConfig(
 #     level=logging.INFO,  # می‌تونی DEBUG یا WARNING هم بذاری
@@ -24,90 +42,106 @@ import logging
 #     ]
 # )
 
-cache = TTLCache(maxsize=100, ttl=600)
-
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
-client = openai.OpenAI(api_key=api_key)
-
 
 client_2 = AsyncOpenAI(api_key=api_key)  # استفاده از نسخه async
 
+# ✅ همه فراخوانی‌های مدل از این درگاه مشترک عبور می‌کنند (محدودیت همزمانی + تایم‌اوت)
+llm = llm_gateway_from_env(client_2)
 
-ESTATY_API_KEY = os.getenv("ESTATY_API_KEY")
-ESTATY_API_URL = "https://panel.estaty.app/api/v1"
+# ✅ "combined": تشخیص نوع پیام و استخراج فیلترها در یک فراخوانی | "two_call": دو فراخوانی جداگانه (حالت قبلی)
+INTENT_EXTRACTION_MODE = os.getenv("INTENT_EXTRACTION_MODE", "combined")
 
+# ✅ پیام‌های ساده (بیشتر، ریست، ادامه، مقایسه با شماره، جواب کوتاه) بدون فراخوانی مدل تشخیص داده می‌شوند
+intent_router = IntentRouter()
+# ✅ تصمیم classifier برای عبارت‌های تکراری در همان وضعیت مکالمه دوباره از مدل پرسیده نمی‌شود
+intent_cache = intent_cache_from_env()
+# ✅ پاسخ سوال‌های تقریباً تکراری بازار و راهنمای خرید (ویزا، مالیات، ...) بدون جستجو و مدل از کش معنایی
+answer_cache = answer_cache_from_env()
+# ✅ جستجوی اینترنتی سوال‌های بازار و راهنمای خرید (بدون بلوکه کردن event loop، با مهلت و کش)
+web_search = web_search_from_env()
+# ✅ اسناد محلی راهنمای خرید (ویزا، مالکیت خارجی‌ها، هزینه‌های DLD، مالیات) با ایندکس BM25
+knowledge_base = knowledge_base_from_env()
+summary_cache = summary_cache_from_env()
+card_renderer = card_renderer_from_env(llm, summary_cache=summary_cache)
 
-# ✅ Define headers for authentication
-HEADERS = {
-    "App-Key": ESTATY_API_KEY,
-    "Content-Type": "application/json"
-}
+# ✅ فقط فیلدهای لازم هر پرامپت (به صورت JSON فشرده و در حد بودجه توکن) به مدل فرستاده می‌شود
+prompt_projector = prompt_projector_from_env()
 
-import random
-memory_state = {}
-types = {}
-memory_district = {}
-last_property_id = None
-last_properties_list = []
-last_selected_property = None  # ✅ ذخیره آخرین ملکی که کاربر در مورد آن اطلاعات بیشتری خواسته
-current_property_index = 0  # ✅ نگه‌داری ایندکس برای نمایش املاک بعدی
 
-# ✅ تابع فیلتر املاک از API
-def filter_properties(filters):
-
-    print("🔹 فیلترهای ارسال‌شده به API:", filters)
-    # filters["cache_bypass"] = random.randint(1000, 9999)
-    """ جستجوی املاک بر اساس فیلترهای کاربر """
-    response = requests.post(f"{ESTATY_API_URL}/filter", json=filters, headers=HEADERS)
+ESTATY_API_KEY = os.getenv("ESTATY_API_KEY")
+ESTATY_API_URL = "https://panel.estaty.app/api/v1"
 
-    # print("🔹 وضعیت پاسخ API:", response.status_code)
-    response_data = response.json()
-    # print("🔹 داده‌های دریافت‌شده از API:", response_data)
 
+# ✅ کلاینت مشترک Estaty (اتصال‌های keep-alive، تایم‌اوت و محدودیت همزمانی)
+estaty = estaty_client_from_env(ESTATY_API_URL, ESTATY_API_KEY)
 
-    ####
-    # filtered_properties = [
-    #     property for property in response_data.get("properties", [])
-    #     if property.get("sales_status", {}).get("name", "").lower() in ["available", "pre launch"]
-    # ]
+import random
+from session_store import session_store_from_env
 
+# ✅ وضعیت هر مکالمه جداگانه و بر اساس session_id نگه‌داری می‌شود
+sessions = session_store_from_env()
 
-    ##########
-    # فیلتر کردن املاک بر اساس وضعیت فروش و منطقه
-    district_filter = filters.get("district")
-    if district_filter:
-        district_filter = district_filter.lower()
+# ✅ آخرین نتیجه جستجوی هر مکالمه (شناسه‌ها + مکان صفحه‌بندی) برای «املاک بیشتر» بعد از ری‌استارت هم می‌ماند
+result_sets = result_set_store_from_env()
 
-    # مقداردهی فیلتر قیمت
-    max_price = filters.get("max_price")
-    min_price = filters.get("min_price")
+# ✅ صفحه بعدی نتایج بعد از ارسال صفحه فعلی در پس‌زمینه ساخته می‌شود تا «املاک بیشتر» معطل مدل نماند
+page_prefetcher = page_prefetcher_from_env()
 
-    # فیلتر کردن املاک بر اساس وضعیت فروش، منطقه و قیمت
-    filtered_properties = [
-        property for property in response_data.get("properties", [])
-        if property.get("sales_status", {}).get("name", "").lower() in ["available"]
-        and (district_filter is None or (property.get("district") and property["district"].get("name", "").lower() == district_filter))
-        and (max_price is None or (property.get("low_price") is not None and property["low_price"] <= max_price))
-        and (min_price is None or (property.get("low_price") is not None and property["low_price"] >= min_price))
-    ]
+async def query_inventory(filters, delivery_year=None, min_area=None, max_area=None, post_filter=False, ranked=False):
+    """ جستجو در نسخه محلی املاک؛ اگر فیلترها محلی قابل اجرا نباشند از API گرفته می‌شود """
+    properties = inventory.query(
+        filters, delivery_year=delivery_year, min_area=min_area, max_area=max_area,
+        available_only=post_filter, ranked=ranked
+    )
+    if properties is not None:
+        print(f"⚡ جستجو از نسخه محلی املاک: {len(properties)} ملک")
+        return properties
+
+    api_properties = await estaty.filter(filters)
+
+    # ✅ فیلترهای تکمیلی (وضعیت فروش، منطقه، قیمت، سال تحویل و مساحت) با ماسک‌های NumPy
+    index = PropertyIndex(api_properties, DEVELOPER_RANK)
+    mask = index.mask(
+        district=filters.get("district") if post_filter else None,
+        min_price=filters.get("min_price") if post_filter else None,
+        max_price=filters.get("max_price") if post_filter else None,
+        available_only=post_filter,
+        delivery_year=delivery_year,
+        min_area=min_area,
+        max_area=max_area,
+    )
+    return index.ranked(mask) if ranked else index.take(mask)
 
 
+# ✅ تابع فیلتر املاک از API
+async def filter_properties(filters, delivery_year=None, min_area=None, max_area=None, ranked=False):
 
-    ##########
+    print("🔹 فیلترهای ارسال‌شده به API:", filters)
+    # filters["cache_bypass"] = random.randint(1000, 9999)
+    """ جستجوی املاک بر اساس فیلترهای کاربر """
+    try:
+        # فیلتر کردن املاک بر اساس وضعیت فروش، منطقه و قیمت (و در صورت نیاز سال تحویل و مساحت)
+        filtered_properties = await query_inventory(
+            filters, delivery_year=delivery_year, min_area=min_area, max_area=max_area, post_filter=True,
+            ranked=ranked
+        )
+    except EstatyAPIError as e:
+        print(f"❌ خطا در دریافت املاک از Estaty: {e}")
+        return []
 
     # print(f"🔹 تعداد املاک قابل فروش پس از فیلتر: {len(filtered_properties)}")
     return filtered_properties
 
-    ####
-
-    # return response.json().get("properties", [])
-
 # ✅ تابع دریافت اطلاعات کامل یک ملک خاص
-def fetch_single_property(property_id):
+async def fetch_single_property(property_id):
     """ دریافت اطلاعات تکمیلی ملک از API """
-    response = requests.post(f"{ESTATY_API_URL}/getProperty", json={"id": property_id}, headers=HEADERS)
-    return response.json().get("property", {})
+    try:
+        return await inventory.get_detail(property_id)
+    except EstatyAPIError as e:
+        print(f"❌ خطا در دریافت اطلاعات ملک {property_id}: {e}")
+        return {}
 
 
 # property_data = fetch_single_property(1560)  # جایگذاری ID یک ملک واقعی
@@ -115,138 +149,102 @@ def fetch_single_property(property_id):
 
 
 
+@asynccontextmanager
+async def lifespan(app):
+    # ✅ ساخت ایندکس دانش راهنمای خرید اگر نیست یا از اسناد knowledge_base/ قدیمی‌تر است
+    global knowledge_base
+    knowledge_base = await asyncio.to_thread(knowledge_base_from_env, True)
+    # ✅ همگام‌سازی دوره‌ای نسخه محلی املاک (INVENTORY_SYNC_INTERVAL=0 غیرفعالش می‌کند)
+    sync_task = asyncio.create_task(inventory.run()) if inventory.sync_interval > 0 else None
+    yield
+    if sync_task is not None:
+        sync_task.cancel()
+    # ✅ بستن اتصال‌های باز هنگام خاموش شدن سرور
+    await estaty.aclose()
+    if summary_cache is not None:
+        summary_cache.close()
+    if result_sets is not None:
+        result_sets.close()
+    web_search.close()
+
+
 # ✅ راه‌اندازی FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # ✅ مدل دریافت پیام از کاربر
 class ChatRequest(BaseModel):
     message: str
+    session_id: str | None = None
+
+
+# ✅ ساختار خروجی فراخوانی ترکیبی (تشخیص نوع پیام + فیلترها)
+class FilterSlots(BaseModel):
+    new_search: bool | None
+    search_ready: bool | None
+    questions_needed: list[str]
+    city: str | None
+    district: str | None
+    property_type: str | None
+    apartmentType: str | None
+    max_price: int | None
+    min_price: int | None
+    bedrooms: str | None
+    min_area: float | None
+    max_area: float | None
+    sales_status: str | None
+    developer_company: str | None
+    delivery_date: str | None
+    payment_plan: str | None
+    post_delivery: str | None
+    guarantee_rental_guarantee: str | None
+    facilities_name: list[str] | None
+
+
+# ✅ ساختار خروجی تشخیص نوع پیام (حالت دو مرحله‌ای)
+class IntentDecision(BaseModel):
+    type: Literal[
+        "search", "search_no_bedroom", "details", "more", "market", "buying_guide", "unknown", "reset",
+        "compare", "purchase", "district_search", "property_price", "availability_check"
+    ]
+    detail_requested: Literal["price", "features", "location", "payment"] | None
+    reset: bool
 
-# ✅ استخراج فیلترهای جستجو از پیام کاربر
-def extract_filters(user_message: str, previous_filters: dict):
-    """ استفاده از GPT-4 برای استخراج اطلاعات کلیدی از پیام کاربر """
-    district_mapping = {
-            'Masdar City': 340, 'Meydan': 133, 'Wadi AlSafa 2': 146, 'Wadi AlSafa 5': 246, 'Alamerah': 279,
-            'JVC': 243, 'Remraam': 284, 'Aljadaf': 122, 'Liwan': 294, 'Arjan': 201, 'Dubai Creek Harbour': 152,
-            'Damac Lagoons': 259, 'Dubai Downtown': 143, 'Muwaileh': 304, 'Palm Jumeirah': 134, 'Business Bay': 252,
-            'City Walk': 228, 'Emaar South': 354, 'Dubai Production City': 217, 'Nadd Al Shiba': 355, 'Dubai Hills': 241,
-            'Jabal Ali Industrial Second': 131, 'AlYelayiss 2': 162, 'Town Square Dubai': 275, 'Majan': 231, 'Ramhan Island': 315,
-            'AlKifaf': 167, 'Alyasmeen': 310, 'Sports City': 203, 'Mbr District One': 319, 'Alraha': 352, 'Damac Hills 2': 213,
-            'Wadi AlSafa 4': 189, 'Expo City': 292, 'Almarjan Island': 297, 'Zaabeel Second': 120, 'Yas Island': 303,
-            'Zayed City': 295, 'Port Rashid': 378, 'Alhamra Island': 278, 'Jabal Ali First': 130, 'Dubai Land Residence Complex': 307,
-            'Reem Island': 298, 'Dubai Investment Park': 156, 'The Oasis': 363, 'Alheliow1': 311, 'Dubai South': 328, 'The Valley': 361,
-            'JVT': 244, 'Rashid Yachts and Marina': 383, 'Golf City': 266, 'Jebel Ali Village': 345, 'Alhudayriyat Island': 365,
-            'Damac Hills': 210, 'Alzorah': 364, 'Alfurjan': 346, 'Discovery Gardens': 235, 'Dubai Islands': 233, 'Alsatwa': 273,
-            'Dubai Motor City': 124, 'Palm Jabal Ali': 161, 'Saadiyat Island': 296, 'Dubai Marina': 239, 'Dubai Industrial City': 308,
-            'Mina Alarab': 293, 'Sobha Hartland': 332, 'Alwasl': 141, 'Bluewaters Bay': 286, 'JLT': 212, 'World Islands': 247,
-            'Mirdif': 163, 'Jumeirah Island One': 150, 'City Of Arabia': 236, 'Alreem Island': 264, 'Almaryah': 337,
-            'Albarsha South': 341, 'Aljada': 327, 'International City Phase (2)': 309, 'Alshamkha': 362, 'Ghaf Woods': 389,
-            'Hamriya West': 353, 'Al Yelayiss 1': 397, 'Al Tay': 343, 'Studio City': 316, 'Maryam Island': 314, 'Rukan Community': 414,
-            'Madinat Jumeirah Living': 285, 'Dubai Maritime City': 216, 'Wadi Al Safa 7': 261, 'Alzahya': 312, 'Jumeirah Park': 317,
-            'Bukadra': 349, 'Alsafouh Second': 407, 'Dubai Sports City': 342, 'Al Barsha South Second': 409, 'Mohammed Bin Rashid City': 318,
-            'Jumeirah 2': 334, 'Uptown, AlThanyah Fifth': 220, 'Wadi AlSafa 3': 187, 'Jumeirah Heights': 402, 'Dubai Silicon Oasis': 245,
-            'Dubai Design District': 230, 'Tilal AlGhaf': 199, 'Albelaida': 280, 'Jumeirah Beach Residence': 375, 'Dubai International Financial Centre (DIFC)': 333,
-            'Dubai Water Canal': 387, 'Al Barsha 1': 400, 'Alwadi Desert': 406, 'Jumeirah Golf Estates': 291, 'Warsan Fourth': 249,
-            'Meydan D11': 404, 'Nad Alsheba 1': 413, 'Aljurf': 359, 'MBR City D11': 368, 'International City': 248,
-            'Alrashidiya 1': 386, 'Free Zone': 367, 'Dubai Internet City': 398, 'Khalifa City': 357, 'Ghantoot': 358,
-            'Alnuaimia 1': 392, 'Alhamriyah': 415, 'Barsha Heights': 385, 'Ajmal Makan City': 276, 'Motor City': 326,
-            'Legends': 412, 'Sharm': 374, 'AlSafouh First': 125, 'Barashi': 305, 'Al Maryah Island': 399, 'Jumeirah Garden City': 356,
-            'Dubai Investment Park 2': 366, 'Sheikh Zayed Road, Alsafa': 263, 'Dubai Land': 417, 'Madinat Almataar': 250,
-            'Emaar Beachfront': 391, 'Dubai Harbour': 242, 'Alheliow2': 313, 'Alsuyoh Suburb': 324, 'Tilal': 325,
-            'Almuntazah': 339, 'Alrashidiya 3': 321, 'Alsafa': 268, 'Almamzar': 306, 'Sobha Hartland 2': 408, 'Siniya Island': 360,
-            'Ras AlKhor Ind. First': 257, 'Albarari': 418, 'Alwaha': 416, 'Dubai Science Park': 351, 'Ain Al Fayda': 369,
-            'Marina': 336, 'Dubai Healthcare City': 238, 'Trade Center First': 148, 'Damac Islands': 394,
-            'The Heights Country Club': 396, 'Al Yelayiss 5': 411, 'Hayat Islands': 283, 'Mina AlArab, Hayat Islands': 282,
-            'Dubai Media City': 258, 'Al Khalidiya': 382, 'AlBarsha South Fourth': 301, 'Alrahmaniya': 390, 'AlBarsha South Fifth': 123,
-            "AlFaqa'": 329, 'Raha Island': 347
-            
-        }
-    
-    developer_mapping = {
-        "Burtville Developments": 330, "Sobha": 3, "Tiger Properties": 103, "Azizi": 37, "Meraas": 70,
-        "Dubai Properties": 258, "Confident Group": 308, "Iman Developers": 61, "EMAAR": 2, "Shapoorji Pallonji": 91,
-        "Arada Properties": 35, "Ellington Properties": 50, "Select Group": 85, "Nshama": 76, "Arenco Real Estate": 398,
-        "Rijas Aces Property": 233, "Wasl": 109, "London Gate": 264, "Nakheel": 74, "GFH": 60,
-        "Expo City": 54, "AYS Developments": 36, "Imtiaz": 87, "Park Group": 366, "Prestige One": 80,
-        "Almazaya Holding": 68, "Samana Developers": 83, "Aldar": 32, "Bloom Holding": 270, "AG Properties": 317,
-        "Swank Development": 393, "Binghatti": 38, "Divine One Group": 311, "Emirates properties": 267,
-        "Dubai South": 323, "Pearlshire Developments": 329, "Gulf Land": 239, "Radiant": 269, "Modon Properties": 394,
-        "Oro24": 241, "Alzorah Development": 383, "Algouta Properties": 380, "Naseeb Group": 265, "GJ Properties": 326,
-        "Amwaj Development": 348, "Grid properties": 296, "Aqua Properties": 34, "SRG Holding": 95,
-        "Roya Lifestyle Developments": 338, "Omniyat": 77, "Aqasa Developers": 333, "Zimaya Properties": 392,
-        "Amali Properties": 341, "Credo": 324, "AAF Development": 409, "Dalands Developer": 427,
-        "The Heart of Europe": 101, "HRE Development": 399, "Lootah": 65, "AJ Gargash Real Estate": 465, "Damac": 318,
-        "Townx Real Estate": 105, "Symbolic": 97, "Nabni developments": 294, "Deyaar": 45, "Citi Developers": 283,
-        "Mashriq Elite": 332, "IFA Hotels & Resorts": 486, "Q Properties": 408, "ARAS Real Estate": 293,
-        "East & West Properties": 49, "H&H": 315, "Laya": 238, "Leos": 240, "Reportage": 232, "Empire Development": 52,
-        "Object 1": 237, "KASCO Development": 433, "Esnad Management": 421, "Majid Al Futtaim Group": 111,
-        "Signature D T": 203, "Sol Properties": 94, "Luxe Developer": 327, "Dugasta": 276, "Avelon Developments": 287,
-        "Rokane": 417, "LMD Real Estate": 227, "Source of Fate": 434, "Vision developments": 390,
-        "Peace Homes Development": 250, "JRP Development": 410, "MAG": 242, "Riviera Group": 298, "Durar": 320,
-        "Meraki Developers": 71, "Uniestate Properties": 107, "Eagle Hills": 299, "IRTH": 372,
-        "Amaya Properties LLC": 413, "Ajmal Makan": 260, "Siroya Ventures Realty L.L.C": 445, "HMB": 247,
-        "Enso Development": 403, "Marquis Point": 274, "Meteora": 278, "Vincitore": 108, "Taraf": 100,
-        "ADE Properties": 446, "Baccarat": 370, "Condor Group": 41, "Rabdan": 289, "Pure Gold": 256,
-        "Saas Properties": 300, "Dubai Invesment": 254, "Swiss Properties": 96, "Beyond": 443, "Green Group": 346,
-        "Mubadala": 468, "Main Realty": 334, "Danube Properties": 42, "Ambs Real Estate": 360, "MeDoRe": 255,
-        "Heilbronn Properties": 339, "Maaia Developments": 517, "Ginco Properties": 374, "Qube Development": 354,
-        "Orange": 303, "Alseeb Real Estate Development": 442, "Peak Summit Real Estate Development": 350,
-        "Regent Developers": 501, "Mr. Eight Development": 430, "BnW Developments": 382, "Tuscany Real Estate Development": 396,
-        "RAK Properties": 245, "Siadah International Real Estate": 406, "One Development": 425, "AHS Properties": 319,
-        "ARIB Developments": 389, "Segrex": 284, "DIFC": 502, "DarGlobal": 44, "Fortune 5": 58,
-        "Green Yard Properties": 412, "Ahmadyar Developments": 375, "Sankari Properties": 310, "Alta Real Estate Development": 491,
-        "Sama Ezdan": 205, "Stamn Development": 440, "Kamdar developments": 470, "BT Properties": 507, "IGO": 259,
-        "Orra Real Estate": 204, "Five Holdings": 56, "Karma": 62, "Almarwan Developments": 458,
-        "Khamas Group Of Investment Co's": 363, "Imkan": 371, "LAPIS Properties": 419, "Liv Developers": 64,
-        "S&S Real Estate": 499, "Fakhruddin Properties": 55, "Saba Property Developers": 416, "Majid Developments": 401,
-        "HVM Living": 484, "Golden Wood": 407, "EL Prime Properties": 431, "Wellcube.life": 395,
-        "Mubarak Al Beshara Real Estate Development": 420, "Dar Alkarama": 43, "Palma Holding": 340,
-        "Vantage Properties": 469, "Shurooq Development": 435, "Vakson Real Estate": 358, "Tasmeer Indigo Properties": 352,
-        "Acube Developments": 309, "Mada'in": 154, "Anax Developments": 301, "API": 455, "Alhamra": 351,
-        "AB Developers": 367, "Tarrad Real Estate": 451, "Esnaad": 302, "4 Direction Developers": 508,
-        "Alzarooni Development": 444, "Alma Developments": 500, "Reef Luxury Development": 424,
-        "Blanco Thornton Properties": 402, "Amaal": 498, "Wahat Al Zaweya": 397, "Alef Group": 273,
-        "One Yard": 200, "AAA Development": 441, "Ohana Developments": 369, "Forum Real Estate": 387,
-        "Nine Development": 411, "Nine Yards Development": 494, "Mira Developments": 282, "MAK Developers": 415,
-        "MS Homes": 376, "Crystal Bay Development": 377, "Galaxy": 379, "Advanced Properties": 268,
-        "City View Developments": 391, "Svarn": 368, "Centurion Developers": 464, "Union Properties": 364,
-        "Wellington Developments": 497, "Seven Mayfair Real Estate": 515, "DV8 Developers": 423, "Zenith Group": 513,
-        "AlMadar Investment L.L.C": 428, "Abou Eid Real Estate": 252, "Asak Real Estate": 485,
-        "Alhabtoor Group": 28, "Mill Hill Developer": 488, "Alaia Developments": 505, "True Future Development": 495,
-        "ARTE Development": 432, "Time Properties": 104, "GFS Builders & Developers": 471, "Zoya Developments": 386,
-        "Evera Real Estate Development": 467, "77 Shades of Green": 448, "BNH Real Estate Developer": 429,
-        "Oksa Developer": 475, "Alhelal Al zahaby": 452, "Kingdom Properties": 456, "Aark Developers": 26,
-        "Januss Developers": 447, "Grovy Real Estate": 210, "Range Developments": 479, "Matrix developments": 483,
-        "Shoumous": 261, "Lucky Aeon": 66, "Meydan": 422, "Pantheon Development": 78, "DMCC": 388,
-        "Arista Properties": 321, "DHG Properties": 295, "World Of Wonders": 291, "PMR Property": 450,
-        "Major Development’s": 292, "Takmeel Real Estate": 314, "Urban Properties": 385, "Emerald Palace Group": 51,
-        "Metac Properties L.L.C": 23, "Skyline Builders": 285, "Prescott": 357, "Vantage Ventures": 490,
-        "Zane Development": 481, "Yas Developers": 463, "Amirah Developments": 482, "Elysian Properties": 454,
-        "Nexus Developer": 449, "Hayaat Developments": 512, "Lincoln Star Real Estate": 466, "Arsenal East": 473,
-        "Laraix Developers": 511, "Aqaar": 305, "Baraka Development": 304, "Keymavens development": 345,
-        "The 100": 359, "Manam Real Estate Development": 438, "Almarina Holding": 474, "Dia Properties": 518,
-        "Iraz Developments": 335, "Seven Tides": 89, "Albait Alduwaliy Real Estate": 355,
-        "Palladium Development": 356, "Tabeer Developments": 98, "Lacasa Living": 477, "Wow Resorts": 405,
-        "Revolution": 342, "ABA Group": 336, "Cirrera Development": 516, "SOHO Development": 344,
-        "Signature Developers": 426, "Pinnacle Developers": 437, "BAMX Development": 519, "Mered": 288,
-        "AiZN Development": 404, "Octa Properties": 277, "Premier Choice": 520
-    }
 
-    # تهیه لیست نام شرکت‌ها و مناطق برای پرامپت
-    developer_names = ", ".join(developer_mapping.keys())
-    district_names = ", ".join(district_mapping.keys())
+class IntentWithFilters(IntentDecision):
+    filters: FilterSlots | None
 
-    prompt = f"""
-    کاربر به دنبال یک ملک در دبی است. از پیام زیر جزئیات مرتبط را استخراج کن:
 
-    "{user_message}"
+# ✅ سقف توکن خروجی فراخوانی‌های ساخت‌یافته؛ خروجی بلندتر یک بار بدون سقف تکرار می‌شود (parse_structured)
+# طولانی‌ترین JSON ممکن IntentDecision ۷۲ کاراکتر انگلیسی است (حدود ۲۵ توکن)
+CLASSIFY_MAX_TOKENS = 30
+# FilterSlots با همه فیلترها، سه امکانات و دو سوال فارسی ۵۸۵ کاراکتر (حدود ۲۱۰ توکن) و جستجوی معمولی حدود ۱۳۰ توکن است
+EXTRACT_FILTERS_MAX_TOKENS = 240
+CLASSIFY_EXTRACT_MAX_TOKENS = EXTRACT_FILTERS_MAX_TOKENS + CLASSIFY_MAX_TOKENS
 
+STRUCTURED_OUTPUT_ERRORS = (LLMTimeoutError, ValidationError, LengthFinishReasonError, ContentFilterFinishReasonError)
 
-    **🔹 اطلاعات قبلی کاربر درباره جستجوی ملک:**
-    ```json
-    {json.dumps(previous_filters, ensure_ascii=False)}
-    ```
 
+async def parse_structured(site, prompt, response_format, max_tokens=None):
+    """ فراخوانی با خروجی ساخت‌یافته؛ اگر خروجی به سقف توکن خورد یک بار بدون سقف تکرار می‌شود (نه حذف کل پاسخ) """
+    messages = [{"role": "system", "content": prompt}]
+    if max_tokens is None:
+        return await llm.parse(site, messages=messages, response_format=response_format)
+    try:
+        return await llm.parse(site, messages=messages, response_format=response_format, max_tokens=max_tokens)
+    except LengthFinishReasonError:
+        print(f"⚠️ خروجی {site} به سقف {max_tokens} توکن رسید؛ تکرار بدون سقف")
+        return await llm.parse(site, messages=messages, response_format=response_format)
+
+
+# ✅ نوع پیام‌هایی که فیلتر جستجو لازم دارند
+# ✅ استخراج فیلترهای جستجو از پیام کاربر
+def filter_extraction_rules():
+    """ قوانین استخراج فیلترها از پیام کاربر (مشترک بین extract_filters و حالت ترکیبی) """
+    # تهیه لیست نام شرکت‌ها و مناطق برای پرامپت
+    developer_names = ", ".join(DEVELOPERS.names)
+    district_names = ", ".join(DISTRICTS.names)
+
+    return f"""
     **📌 قوانین پردازش:**
     - 🚨 غلط‌های املایی رایج را اصلاح کن. اما اگر کلمه‌ای به صورت صحیح نام یک شرکت یا منطقه باشد، آن را تغییر نده.
     - 🚨 درک غلط‌های املایی و تایپی را به صورت خودکار انجام بده. اگر کلمه‌ای نادرست نوشته شده ولی معنی جمله واضح است، آن را به درستی تفسیر کن.
@@ -426,29 +424,41 @@ def extract_filters(user_message: str, previous_filters: dict):
     """
 
 
+async def extract_filters(user_message: str, previous_filters: dict, prefetched=None):
+    """ استفاده از GPT-4 برای استخراج اطلاعات کلیدی از پیام کاربر """
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "system", "content": prompt}]
-        )
-
-        print("🔹 پاسخ OpenAI:", response)
+        if prefetched is not None:
+            # ✅ فیلترها قبلاً در همان فراخوانی تشخیص نوع پیام استخراج شده‌اند
+            extracted_data = dict(prefetched)
+            print("🔹 فیلترهای استخراج‌شده در حالت ترکیبی:", extracted_data)
+        else:
+            prompt = f"""
+            کاربر به دنبال یک ملک در دبی است. از پیام زیر جزئیات مرتبط را استخراج کن:
 
-        # ✅ دریافت مقدار `content` از پاسخ OpenAI
-        response_content = response.choices[0].message.content.strip()
+            "{user_message}"
 
-        if not response_content:
-            print("❌ OpenAI response is empty!")
-            return {}
 
-        # ✅ حذف ` ```json ` و ` ``` ` از رشته بازگشتی
-        if response_content.startswith("```json"):
-            response_content = response_content.replace("```json", "").replace("```", "").strip()
+            **🔹 اطلاعات قبلی کاربر درباره جستجوی ملک:**
+            ```json
+            {json.dumps(previous_filters, ensure_ascii=False)}
+            ```
+            """ + filter_extraction_rules()
 
-        print("🔹 داده JSON پردازش شده:", response_content)
-        # logging.info(f"extracted from user message: {response_content}")
-        extracted_data = json.loads(response_content)
+            # ✅ خروجی با اسکیمای FilterSlots محدود می‌شود؛ دیگر JSON ناقص یا داخل ```json نمی‌رسد
+            try:
+                completion = await parse_structured("extract_filters", prompt, FilterSlots, max_tokens=EXTRACT_FILTERS_MAX_TOKENS)
+                slots = completion.choices[0].message.parsed
+            except LengthFinishReasonError as e:
+                # پاسخ ناقص ماند: فیلد جدیدی نداریم ولی فیلترهای قبلی همین مکالمه پایین‌تر حفظ می‌شوند
+                print("⚠️ خروجی استخراج فیلترها ناقص ماند؛ ادامه با فیلترهای قبلی:", e)
+                slots = FilterSlots.model_validate({**dict.fromkeys(FilterSlots.model_fields), "questions_needed": []})
+            if slots is None:
+                print("❌ OpenAI response is empty!", completion.choices[0].message.refusal)
+                return {}
+
+            extracted_data = slots.model_dump()
+            print("🔹 فیلترهای استخراج‌شده:", extracted_data)
                 # حفظ فیلترهای قبلی اگر مقدار جدیدی ارائه نشده باشد
 
         # if not extracted_data.get("search_ready"):
@@ -475,8 +485,8 @@ def extract_filters(user_message: str, previous_filters: dict):
         ]
         
         for key in essential_keys:
-            if extracted_data.get(key) is None and memory_state.get(key) is not None:
-                extracted_data[key] = memory_state[key]  # ✅ مقدار قبلی را نگه دار
+            if extracted_data.get(key) is None and previous_filters.get(key) is not None:
+                extracted_data[key] = previous_filters[key]  # ✅ مقدار قبلی را نگه دار
 
         # بررسی وجود قیمت و تعداد اتاق
         if extracted_data.get("bedrooms") is not None:
@@ -492,9 +502,9 @@ def extract_filters(user_message: str, previous_filters: dict):
             if "بودجه شما چقدر است؟" in extracted_data.get("questions_needed", []):
                 extracted_data["questions_needed"].remove("بودجه شما چقدر است؟")
 
-        if memory_state.get("post_delivery") == "Yes":
+        if previous_filters.get("post_delivery") == "Yes":
             extracted_data["post_delivery"] = "Yes"
-        elif memory_state.get("post_delivery") == "No":
+        elif previous_filters.get("post_delivery") == "No":
             extracted_data["post_delivery"] = "No"
 
         if extracted_data.get("payment_plan") == "Yes":
@@ -517,7 +527,7 @@ def extract_filters(user_message: str, previous_filters: dict):
 
 
         # ✅ بررسی پاسخ کاربر به سوال post_delivery
-        if memory_state.get("post_delivery") == "question":
+        if previous_filters.get("post_delivery") == "question":
             if any(phrase in user_message for phrase in ["قبل تحویل","قبل از تحویل", "پیش از تحویل", "قبل"]):
                 extracted_data["post_delivery"] = "No"
                 if "پرداخت قبل از تحویل باشد یا بعد از تحویل؟" in extracted_data.get("questions_needed", []):
@@ -528,7 +538,7 @@ def extract_filters(user_message: str, previous_filters: dict):
                     extracted_data["questions_needed"].remove("پرداخت قبل از تحویل باشد یا بعد از تحویل؟")
 
         # اگر هیچ مقدار جدید برای post_delivery نیومده ولی تو حافظه بوده که باید سوال پرسیده شه، نگهش دار
-        if extracted_data.get("post_delivery") is None and memory_state.get("post_delivery") == "question":
+        if extracted_data.get("post_delivery") is None and previous_filters.get("post_delivery") == "question":
             extracted_data["post_delivery"] = "question"
             if "پرداخت قبل از تحویل باشد یا بعد از تحویل؟" not in extracted_data["questions_needed"]:
                 extracted_data["questions_needed"].append("پرداخت قبل از تحویل باشد یا بعد از تحویل؟")
@@ -573,119 +583,191 @@ def extract_filters(user_message: str, previous_filters: dict):
         # ✅ پردازش رشته JSON به یک دیکشنری
         return extracted_data
 
-    except json.JSONDecodeError as e:
-        print("❌ JSON Decode Error:", e)
+    except STRUCTURED_OUTPUT_ERRORS as e:
+        print("❌ خطا در استخراج فیلترها:", e)
         return {}
 
     except Exception as e:
         print("❌ Unexpected Error:", e)
         return {}
 
-property_name_to_id = {}
+# لیست محبوب‌ترین توسعه‌دهنده‌ها
+DEVELOPERS_BY_POPULARITY = [
+
+    # Tier 1: بسیار معروف و پیشرو
+    "EMAAR", "Damac", "Aldar", "Nakheel", "Dubai Properties", "Meraas", "Sobha", "Ellington Properties",
+    "Omniyat", "Select Group", "Wasl", "Azizi", "Binghatti", "Danube Properties", "Tiger Properties",
+
+    # Tier 2: شناخته‌شده و معتبر
+    "Arada Properties", "The Heart of Europe", "Samana Developers", "MAG", "Nshama", "Deyaar",
+    "IFA Hotels & Resorts", "RAK Properties", "Bloom Holding", "Imkan", "Reportage",
+    "Majid Al Futtaim Group", "Meydan", "Five Holdings", "Arenco Real Estate",
+    "Almazaya Holding", "Shapoorji Pallonji", "London Gate", "Riviera Group",
+
+    # Tier 3: در حال رشد و نوظهور
+    "Burtville Developments", "Confident Group", "Iman Developers", "Rijas Aces Property", "GFH",
+    "Expo City", "AYS Developments", "Imtiaz", "Park Group", "Prestige One", "AG Properties",
+    "Swank Development", "Divine One Group", "Emirates properties", "Dubai South", "Pearlshire Developments",
+    "Gulf Land", "Radiant", "Modon Properties", "Oro24", "Alzorah Development", "Algouta Properties",
+    "Naseeb Group", "GJ Properties", "Amwaj Development", "Grid properties", "Aqua Properties",
+    "SRG Holding", "Roya Lifestyle Developments", "Aqasa Developers", "Zimaya Properties", "Amali Properties",
+    "Credo", "AAF Development", "Dalands Developer", "HRE Development", "Lootah", "AJ Gargash Real Estate",
+    "Townx Real Estate", "Symbolic", "Nabni developments", "Citi Developers", "Mashriq Elite",
+    "Q Properties", "ARAS Real Estate", "East & West Properties", "H&H", "Laya", "Leos", "Empire Development",
+    "Object 1", "KASCO Development", "Esnad Management", "Signature D T", "Sol Properties", "Luxe Developer",
+    "Dugasta", "Avelon Developments", "Rokane", "LMD Real Estate", "Source of Fate", "Vision developments",
+    "Peace Homes Development", "JRP Development", "Durar", "Meraki Developers", "Uniestate Properties",
+    "Eagle Hills", "IRTH", "Amaya Properties LLC", "Ajmal Makan", "Siroya Ventures Realty L.L.C", "HMB",
+    "Enso Development", "Marquis Point", "Meteora", "Vincitore", "Taraf", "ADE Properties", "Baccarat",
+    "Condor Group", "Rabdan", "Pure Gold", "Saas Properties", "Dubai Invesment", "Swiss Properties",
+    "Beyond", "Green Group", "Mubadala", "Main Realty", "Ambs Real Estate", "MeDoRe", "Heilbronn Properties",
+    "Maaia Developments", "Ginco Properties", "Qube Development", "Orange", "Alseeb Real Estate Development",
+    "Peak Summit Real Estate Development", "Regent Developers", "Mr. Eight Development", "BnW Developments",
+    "Tuscany Real Estate Development", "Siadah International Real Estate", "One Development", "AHS Properties",
+    "ARIB Developments", "Segrex", "DIFC", "DarGlobal", "Fortune 5", "Green Yard Properties",
+    "Ahmadyar Developments", "Sankari Properties", "Alta Real Estate Development", "Sama Ezdan",
+    "Stamn Development", "Kamdar developments", "BT Properties", "IGO", "Orra Real Estate", "Karma",
+    "Almarwan Developments", "Khamas Group Of Investment Co's", "LAPIS Properties", "Liv Developers",
+    "S&S Real Estate", "Fakhruddin Properties", "Saba Property Developers", "Majid Developments",
+    "HVM Living", "Golden Wood", "EL Prime Properties", "Wellcube.life",
+    "Mubarak Al Beshara Real Estate Development", "Dar Alkarama", "Palma Holding", "Vantage Properties",
+    "Shurooq Development", "Vakson Real Estate", "Tasmeer Indigo Properties", "Acube Developments",
+    "Mada'in", "Anax Developments", "API", "Alhamra", "AB Developers", "Tarrad Real Estate", "Esnaad",
+    "4 Direction Developers", "Alzarooni Development", "Alma Developments", "Reef Luxury Development",
+    "Blanco Thornton Properties", "Amaal", "Wahat Al Zaweya", "Alef Group", "One Yard", "AAA Development",
+    "Ohana Developments", "Forum Real Estate", "Nine Development", "Nine Yards Development", "Mira Developments",
+    "MAK Developers", "MS Homes", "Crystal Bay Development", "Galaxy", "Advanced Properties",
+    "City View Developments", "Svarn", "Centurion Developers", "Union Properties", "Wellington Developments",
+    "Seven Mayfair Real Estate", "DV8 Developers", "Zenith Group", "AlMadar Investment L.L.C",
+    "Abou Eid Real Estate", "Asak Real Estate", "Alhabtoor Group", "Mill Hill Developer",
+    "Alaia Developments", "True Future Development", "ARTE Development", "Time Properties",
+    "GFS Builders & Developers", "Zoya Developments", "Evera Real Estate Development", "77 Shades of Green",
+    "BNH Real Estate Developer", "Oksa Developer", "Alhelal Al zahaby", "Kingdom Properties",
+    "Aark Developers", "Januss Developers", "Grovy Real Estate", "Range Developments", "Matrix developments",
+    "Shoumous", "Lucky Aeon", "Pantheon Development", "DMCC", "Arista Properties", "DHG Properties",
+    "World Of Wonders", "PMR Property", "Major Development’s", "Takmeel Real Estate", "Urban Properties",
+    "Emerald Palace Group", "Metac Properties L.L.C", "Skyline Builders", "Prescott", "Vantage Ventures",
+    "Zane Development", "Yas Developers", "Amirah Developments", "Elysian Properties", "Nexus Developer",
+    "Hayaat Developments", "Lincoln Star Real Estate", "Arsenal East", "Laraix Developers", "Aqaar",
+    "Baraka Development", "Keymavens development", "The 100", "Manam Real Estate Development",
+    "Almarina Holding", "Dia Properties", "Iraz Developments", "Seven Tides", "Albait Alduwaliy Real Estate",
+    "Palladium Development", "Tabeer Developments", "Lacasa Living", "Wow Resorts", "Revolution",
+    "ABA Group", "Cirrera Development", "SOHO Development", "Signature Developers", "Pinnacle Developers",
+    "BAMX Development", "Mered", "AiZN Development", "Octa Properties", "Premier Choice"
+]
+
+# تبدیل لیست به دیکشنری {نام شرکت کوچک‌شده: رتبه}
+DEVELOPER_RANK = {name.lower(): rank for rank, name in enumerate(DEVELOPERS_BY_POPULARITY)}
+
+# ✅ نسخه محلی املاک قابل فروش که در پس‌زمینه همگام می‌شود (رتبه توسعه‌دهنده هم در ستون‌هایش ذخیره می‌شود)
+inventory = inventory_mirror_from_env(estaty, developer_rank=DEVELOPER_RANK)
 
 
 def sort_properties_by_developer_popularity(properties):
-    # لیست محبوب‌ترین توسعه‌دهنده‌ها
-    developers_by_popularity = [
-
-        # Tier 1: بسیار معروف و پیشرو
-        "EMAAR", "Damac", "Aldar", "Nakheel", "Dubai Properties", "Meraas", "Sobha", "Ellington Properties",
-        "Omniyat", "Select Group", "Wasl", "Azizi", "Binghatti", "Danube Properties", "Tiger Properties",
-
-        # Tier 2: شناخته‌شده و معتبر
-        "Arada Properties", "The Heart of Europe", "Samana Developers", "MAG", "Nshama", "Deyaar",
-        "IFA Hotels & Resorts", "RAK Properties", "Bloom Holding", "Imkan", "Reportage",
-        "Majid Al Futtaim Group", "Meydan", "Five Holdings", "Arenco Real Estate",
-        "Almazaya Holding", "Shapoorji Pallonji", "London Gate", "Riviera Group",
-
-        # Tier 3: در حال رشد و نوظهور
-        "Burtville Developments", "Confident Group", "Iman Developers", "Rijas Aces Property", "GFH",
-        "Expo City", "AYS Developments", "Imtiaz", "Park Group", "Prestige One", "AG Properties",
-        "Swank Development", "Divine One Group", "Emirates properties", "Dubai South", "Pearlshire Developments",
-        "Gulf Land", "Radiant", "Modon Properties", "Oro24", "Alzorah Development", "Algouta Properties",
-        "Naseeb Group", "GJ Properties", "Amwaj Development", "Grid properties", "Aqua Properties",
-        "SRG Holding", "Roya Lifestyle Developments", "Aqasa Developers", "Zimaya Properties", "Amali Properties",
-        "Credo", "AAF Development", "Dalands Developer", "HRE Development", "Lootah", "AJ Gargash Real Estate",
-        "Townx Real Estate", "Symbolic", "Nabni developments", "Citi Developers", "Mashriq Elite",
-        "Q Properties", "ARAS Real Estate", "East & West Properties", "H&H", "Laya", "Leos", "Empire Development",
-        "Object 1", "KASCO Development", "Esnad Management", "Signature D T", "Sol Properties", "Luxe Developer",
-        "Dugasta", "Avelon Developments", "Rokane", "LMD Real Estate", "Source of Fate", "Vision developments",
-        "Peace Homes Development", "JRP Development", "Durar", "Meraki Developers", "Uniestate Properties",
-        "Eagle Hills", "IRTH", "Amaya Properties LLC", "Ajmal Makan", "Siroya Ventures Realty L.L.C", "HMB",
-        "Enso Development", "Marquis Point", "Meteora", "Vincitore", "Taraf", "ADE Properties", "Baccarat",
-        "Condor Group", "Rabdan", "Pure Gold", "Saas Properties", "Dubai Invesment", "Swiss Properties",
-        "Beyond", "Green Group", "Mubadala", "Main Realty", "Ambs Real Estate", "MeDoRe", "Heilbronn Properties",
-        "Maaia Developments", "Ginco Properties", "Qube Development", "Orange", "Alseeb Real Estate Development",
-        "Peak Summit Real Estate Development", "Regent Developers", "Mr. Eight Development", "BnW Developments",
-        "Tuscany Real Estate Development", "Siadah International Real Estate", "One Development", "AHS Properties",
-        "ARIB Developments", "Segrex", "DIFC", "DarGlobal", "Fortune 5", "Green Yard Properties",
-        "Ahmadyar Developments", "Sankari Properties", "Alta Real Estate Development", "Sama Ezdan",
-        "Stamn Development", "Kamdar developments", "BT Properties", "IGO", "Orra Real Estate", "Karma",
-        "Almarwan Developments", "Khamas Group Of Investment Co's", "LAPIS Properties", "Liv Developers",
-        "S&S Real Estate", "Fakhruddin Properties", "Saba Property Developers", "Majid Developments",
-        "HVM Living", "Golden Wood", "EL Prime Properties", "Wellcube.life",
-        "Mubarak Al Beshara Real Estate Development", "Dar Alkarama", "Palma Holding", "Vantage Properties",
-        "Shurooq Development", "Vakson Real Estate", "Tasmeer Indigo Properties", "Acube Developments",
-        "Mada'in", "Anax Developments", "API", "Alhamra", "AB Developers", "Tarrad Real Estate", "Esnaad",
-        "4 Direction Developers", "Alzarooni Development", "Alma Developments", "Reef Luxury Development",
-        "Blanco Thornton Properties", "Amaal", "Wahat Al Zaweya", "Alef Group", "One Yard", "AAA Development",
-        "Ohana Developments", "Forum Real Estate", "Nine Development", "Nine Yards Development", "Mira Developments",
-        "MAK Developers", "MS Homes", "Crystal Bay Development", "Galaxy", "Advanced Properties",
-        "City View Developments", "Svarn", "Centurion Developers", "Union Properties", "Wellington Developments",
-        "Seven Mayfair Real Estate", "DV8 Developers", "Zenith Group", "AlMadar Investment L.L.C",
-        "Abou Eid Real Estate", "Asak Real Estate", "Alhabtoor Group", "Mill Hill Developer",
-        "Alaia Developments", "True Future Development", "ARTE Development", "Time Properties",
-        "GFS Builders & Developers", "Zoya Developments", "Evera Real Estate Development", "77 Shades of Green",
-        "BNH Real Estate Developer", "Oksa Developer", "Alhelal Al zahaby", "Kingdom Properties",
-        "Aark Developers", "Januss Developers", "Grovy Real Estate", "Range Developments", "Matrix developments",
-        "Shoumous", "Lucky Aeon", "Pantheon Development", "DMCC", "Arista Properties", "DHG Properties",
-        "World Of Wonders", "PMR Property", "Major Development’s", "Takmeel Real Estate", "Urban Properties",
-        "Emerald Palace Group", "Metac Properties L.L.C", "Skyline Builders", "Prescott", "Vantage Ventures",
-        "Zane Development", "Yas Developers", "Amirah Developments", "Elysian Properties", "Nexus Developer",
-        "Hayaat Developments", "Lincoln Star Real Estate", "Arsenal East", "Laraix Developers", "Aqaar",
-        "Baraka Development", "Keymavens development", "The 100", "Manam Real Estate Development",
-        "Almarina Holding", "Dia Properties", "Iraz Developments", "Seven Tides", "Albait Alduwaliy Real Estate",
-        "Palladium Development", "Tabeer Developments", "Lacasa Living", "Wow Resorts", "Revolution",
-        "ABA Group", "Cirrera Development", "SOHO Development", "Signature Developers", "Pinnacle Developers",
-        "BAMX Development", "Mered", "AiZN Development", "Octa Properties", "Premier Choice"
-    ]
+    """ ترتیب املاک بر اساس محبوبیت توسعه‌دهنده (توسعه‌دهنده ناشناخته ته لیست) """
+    # ✅ نتایج filter_properties(ranked=True) از قبل با ستون رتبه و به صورت تنبل مرتب می‌شوند
+    if isinstance(properties, RankedResults):
+        return properties
+    return PropertyIndex(properties, DEVELOPER_RANK).ranked(np.ones(len(properties), dtype=bool))
+
+
+async def search_properties(filters, delivery_year=None, min_area=None, max_area=None):
+    """ جستجو و ساخت ResultSet (شناسه‌ها به ترتیب محبوبیت توسعه‌دهنده + خود جستجو برای اجرای دوباره) """
+    query = {
+        "filters": dict(filters),
+        "delivery_year": delivery_year,
+        "min_area": min_area,
+        "max_area": max_area,
+    }
+    properties = await filter_properties(
+        filters, delivery_year=delivery_year, min_area=min_area, max_area=max_area, ranked=True
+    )
+    ids, keys = sort_properties_by_developer_popularity(properties).id_keys()
+    return ResultSet(query, ids, keys)
+
+
+async def materialize_properties(result_set, property_ids):
+    """ املاک این شناسه‌ها از نسخه محلی؛ شناسه‌هایی که آنجا نیستند با اجرای دوباره همان جستجو (از کش Estaty) """
+    found = inventory.lookup(property_ids)
+    if any(prop is None for prop in found):
+        query = result_set.query
+        properties = await filter_properties(
+            query["filters"], delivery_year=query["delivery_year"],
+            min_area=query["min_area"], max_area=query["max_area"],
+        )
+        by_id = {str(prop.get("id")): prop for prop in properties}
+        found = [
+            prop if prop is not None else by_id.get(str(property_id))
+            for prop, property_id in zip(found, property_ids)
+        ]
+    # املاکی که از زمان جستجو حذف شده‌اند نمایش داده نمی‌شوند
+    return [prop for prop in found if prop is not None]
 
-    # تبدیل لیست به دیکشنری {نام شرکت کوچک‌شده: رتبه}
-    developer_rank = {name.lower(): rank for rank, name in enumerate(developers_by_popularity)}
 
-    def get_rank(property_item):
-        developer_name = (
-            property_item.get("developer_company", {}).get("name", "").lower()
-        )
-        return developer_rank.get(developer_name, float("inf"))  # اگر پیدا نشد، ته لیست
+async def next_page(result_set, count, start=None):
+    """ (املاک صفحه بعد، تعداد شناسه‌های مصرف‌شده)؛ فقط همین تعداد ملک ساخته می‌شود و مکان صفحه‌بندی جلو نمی‌رود """
+    start = result_set.cursor if start is None else start
+    page, consumed = [], 0
+    while len(page) < count and start + consumed < len(result_set):
+        property_ids = result_set.peek(count - len(page), start=start + consumed)
+        page += await materialize_properties(result_set, property_ids)
+        consumed += len(property_ids)
+    return page, consumed
+
+
+def page_token(result_set, start_index):
+    """ صفحه آماده‌شده فقط برای همین جستجو، همین مکان و همین شماره کارت اول معتبر است """
+    return result_set.query_key, result_set.cursor, start_index
+
+
+async def prepare_page(result_set, count, start, start_index):
+    """ ساخت پس‌زمینه صفحه بعد: (املاک، تعداد شناسه‌های مصرف‌شده، کارت‌ها) """
+    page, consumed = await next_page(result_set, count, start=start)
+    cards = await card_renderer.render(page, start_index)
+    return page, consumed, cards
+
 
-    return sorted(properties, key=get_rank)
+def stream_chunk(state, html, index=None):
+    """ ارسال یک تکه از پاسخ به کلاینت SSE (فقط وقتی پیام از طریق /chat/stream آمده باشد) """
+    if state.stream is not None:
+        state.stream.put_nowait({"index": index, "html": html})
 
 
-async def generate_ai_summary(properties, start_index=0):
-    """ ارائه خلاصه کوتاه از املاک پیشنهادی به صورت تدریجی """
+async def generate_ai_summary(state, result_set, header=""):
+    """ ارائه خلاصه کوتاه از صفحه بعدی نتیجه جستجو به صورت تدریجی """
 
-    global last_properties_list, current_property_index, selected_properties, property_name_to_id, comp_properties
     number_property = 3
 
-    if not properties:
+    if result_set is None or not len(result_set):
         return "متأسفانه هیچ ملکی با این مشخصات پیدا نشد. لطفاً بازه قیمتی یا تعداد اتاق خواب را تغییر دهید یا منطقه دیگری انتخاب کنید."
 
-    # properties = sort_properties_by_developer_popularity(properties)
-
+    state.result_set = result_set
+    # ✅ شماره کارت‌ها در کل مکالمه یکتاست تا مقایسه با شماره بعد از جستجوی جدید هم درست بماند
+    index_n = len(state.numbered_properties) + 1
 
-    last_properties_list = properties
-    comp_properties = properties
-    current_property_index = start_index + number_property
-    st_index = start_index + 1
-    index_n = len(property_name_to_id) + 1
+    # ✅ صفحه‌ای که بعد از پیام قبلی در پس‌زمینه ساخته شده (املاک + کارت‌ها) بدون انتظار استفاده می‌شود
+    prepared = None
+    if result_set.cursor > 0:
+        prepared = await page_prefetcher.take(state.session_id, page_token(result_set, index_n))
+    else:
+        page_prefetcher.cancel(state.session_id)
 
-    selected_properties = properties[start_index:current_property_index]
+    if prepared is not None:
+        selected_properties, consumed, cards = prepared
+    else:
+        selected_properties, consumed = await next_page(result_set, number_property)
+        cards = None
+    result_set.advance(consumed)
+    state.selected_properties = selected_properties
+    if result_sets is not None:
+        await result_sets.save(state.session_id, result_set)
 
     if not selected_properties:
-        return "✅ تمامی املاک نمایش داده شده‌اند و مورد جدیدی موجود نیست."
+        return header + "✅ تمامی املاک نمایش داده شده‌اند و مورد جدیدی موجود نیست."
 
-    formatted_output = ""
+    formatted_output = header
+    if header:
+        stream_chunk(state, header)
         # ✅ **ذخیره نام ملک و ID آن برای جستجوهای بعدی**
     for prop in selected_properties:
         prop_name = prop.get("title", "").strip().lower()
@@ -697,92 +779,33 @@ async def generate_ai_summary(properties, start_index=0):
             prop["delivery_date"] = datetime.fromtimestamp(unix_timestamp, tz=timezone.utc).strftime('%Y-%m-%d')
 
         if prop_name and prop_id:
-            property_name_to_id[prop_name] = prop_id
-
-    print("📌 لیست املاک ذخیره‌شده پس از مقداردهی:", property_name_to_id)
-    print("📌 تعداد املاک ذخیره‌شده:", len(property_name_to_id))
-
-    async def process_property(prop, index):
-        """ پردازش و نمایش هر ملک به‌صورت جداگانه بدون انتظار برای بقیه """
-        image_url = prop.get("cover", "https://via.placeholder.com/150")
-        property_id = prop.get("id")
-
-
-        # ✅ پرامپت برای خلاصه‌سازی املاک
-        prompt = f"""
-        شما یک مشاور املاک در دبی هستید. کاربران به دنبال خرید ملک در دبی هستند. 
-        لطفاً خلاصه‌ای کوتاه و جذاب به زبان فارسی از این املاک ارائه دهید تا کاربر بتواند راحت‌تر انتخاب کند:
-
-        {json.dumps(prop, ensure_ascii=False, indent=2)}
-
-        **📌 مقدار 'index' برای شماره‌گذاری املاک: {index}**
-
-
-        اطلاعاتی که می‌توان ارائه داد شامل:
-        - 🏡 {index}. نام پروژه: نام ملک (به انگلیسی)
-        - 🏡 معرفی کلی ملک  
-        - 📍 موقعیت جغرافیایی  
-        - زمان تحویل: (آماده تحویل / در حال ساخت ) و تاریخ تحویل به میلادی و تاریخی که میخوای بنویسی رو قبلش به ماهی که بهش نزدیکه گرد کن یعنی اگر اخر فوریه 2027 هست بنویس مارچ 2027 و برای بقیه ماه ها هم همین الگو را داشته باش
-        - 💲 شروع قیمت به درهم
-        - 📏 حداقل مساحت حتما به فوت مربع
-        - 🔗 لینک مشاهده اطلاعات کامل ملک در سایت رسمی **[سایت Trunest](https://www.trunest.ae/property/{property_id})**
-        
-
-        **لحن شما باید حرفه‌ای، صمیمی و کمک‌کننده باشد، مثل یک مشاور املاک واقعی که به مشتری توضیح می‌دهد.**
-
-        **قوانین پاسخ:**
-        - شماره گذاری برای معرفی املاک رو از `{index}` بگیر و کنار اسم پروژه قرار بده.
-        - معرفی کلی ملک کوتاه باشد در حد حداکثر سه خط و بقیه رو هم به صورت تیتر و متن بنویس
-        - برای موقعیت جغرافیایی مختصات رو ننویس
-        - قیمت، متراژ، موقعیت مکانی و یک ویژگی کلیدی را ذکر کنید.
-
-        - تایتل‌ها را داخل `<h3>` قرار بده تا بزرگتر نمایش داده شوند.
-        - متن توضیحی را داخل `<p>` قرار بده تا با اندازه عادی باشد.
+            state.property_name_to_id[prop_name] = prop_id
 
-        - حتماً لینک‌ها را به صورت **هایپرلینک HTML** بنویس. مثال: <a href="https://www.trunest.ae/property/{property_id}">🔗 سایت Trunest</a>
+    for index, prop in enumerate(selected_properties, start=index_n):
+        state.numbered_properties[index] = (prop.get("title"), prop.get("id"))
 
+    print("📌 لیست املاک ذخیره‌شده پس از مقداردهی:", state.property_name_to_id)
+    print("📌 تعداد املاک ذخیره‌شده:", len(state.property_name_to_id))
 
-        """
-
-        response = await client_2.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "system", "content": prompt}]
-        )
+    # ✅ دریافت پس‌زمینه جزئیات همین املاک برای سوال‌های بعدی (details / compare / purchase)
+    estaty.prefetch_properties([prop.get("id") for prop in selected_properties])
 
-        return f"""
-        <div style="display: flex; flex-direction: column; align-items: center; padding: 10px;">
-            <img src="{image_url}" alt="تصویر ملک" style="width: 250px; height: 180px; border-radius: 8px; object-fit: cover;">
-            <div style="flex-grow: 1; text-align: right;">
-                {response.choices[0].message.content}
-            </div>
-        </div>
-        """
-    # # **📌 پردازش و نمایش املاک به محض آماده شدن**
-    # tasks = [process_property(prop, index) for index, prop in enumerate(selected_properties, start=index_n)]
-    # results = await asyncio.gather(*tasks)
-    
-    # formatted_output += "".join(results)
-
-    # # **📌 پردازش و نمایش املاک به محض آماده شدن**
-    # for index, prop in enumerate(selected_properties, start=index_n):
-    #     formatted_output += await process_property(prop, index)
-
-    # **📌 پردازش همزمان سه ملک و نمایش به ترتیب**
-    results = await asyncio.gather(
-        *[process_property(prop, index) for index, prop in enumerate(selected_properties, start=index_n)]
-    )
-
-    formatted_output += "".join(results)
+    # **📌 کارت‌ها مستقیم از فیلدهای لیست ساخته می‌شوند (حداکثر یک فراخوانی مدل برای معرفی کوتاه)**
+    if cards is None:
+        cards = await card_renderer.render(selected_properties, index_n)
+    for index, card in cards:
+        formatted_output += card
+        stream_chunk(state, card, index)
 
     # ✅ جمله پایانی برای راهنمایی کاربر
-    formatted_output += """
+    footer = """
     <div style="text-align: right; direction: rtl; padding: 10px; width: 100%;">
         <p style="margin: 0;">برای مشاهده اطلاعات بیشتر درباره هر ملک، میتوانید عبارت <b>'پروژه [نام پروژه] را بیشتر توضیح بده'</b> را بنویسید.</p>
         <p style="margin-top: 5px;">اگر به املاک بیشتری نیاز دارید، بگویید: <b>'املاک بیشتری نشان بده'</b>.</p>
     </div>
     """
 
-    formatted_output += """
+    footer += """
     <div style="text-align: right; direction: rtl; padding: 10px; width: 100%;">
         <p style="margin-bottom: 8px;">همچنین میتوانید برای دریافت اطلاعات بیشتر یا خرید هر یک از این املاک، با کارشناسان ما در شرکت ترونست تماس بگیرید:</p>
         <p style="margin: 0;"><b>📞 شماره تلفن:</b> 0097143639825</p>
@@ -791,26 +814,38 @@ async def generate_ai_summary(properties, start_index=0):
     </div>
     """
 
+    formatted_output += footer
+    stream_chunk(state, footer)
+
+    if result_set.remaining() > 0:
+        next_index = index_n + len(selected_properties)
+        page_prefetcher.schedule(
+            state.session_id,
+            page_token(result_set, next_index),
+            prepare_page(result_set, number_property, result_set.cursor, next_index),
+        )
+
     return formatted_output
 
 
 
 # ✅ تابع ارائه اطلاعات تکمیلی یک ملک خاص
-def generate_ai_details(property_id, detail_type=None):
+async def generate_ai_details(state, property_id, detail_type=None):
     """ ارائه اطلاعات تکمیلی یک ملک خاص یا بخشی خاص از آن """
 
-
-    global property_name_to_id, selected_properties
+    selected_properties = state.selected_properties
     selected_property = next((p for p in selected_properties if p.get("id") == property_id), None)
     if not selected_property:
         print(f"❌ هشدار: ملکی با آی‌دی {property_id} در selected_properties پیدا نشد!")
         selected_property = {}  # **اگر اطلاعات قبلی وجود ندارد، دیکشنری خالی باشد**
 
 
-    detailed_info = fetch_single_property(property_id)
+    detailed_info = await fetch_single_property(property_id)
 
     combined_info = {**selected_property, **detailed_info}
     combined_info["property_url"] = f"https://www.trunest.ae/property/{property_id}"
+    projection = f"details_{detail_type}" if f"details_{detail_type}" in DEFAULT_BUDGETS else "details"
+    property_info = prompt_projector.project(combined_info, projection)
 
     # ✅ در صورتی که کاربر درخواست جزئیات خاصی کرده باشد
     if detail_type:
@@ -818,7 +853,7 @@ def generate_ai_details(property_id, detail_type=None):
         شما یک مشاور املاک در دبی هستید که به زبان فارسی صحبت میکند. کاربران می‌خواهند اطلاعات بیشتری درباره بخش خاصی از این ملک بدانند.
 
         اطلاعات ملک:
-        {json.dumps(combined_info, ensure_ascii=False, indent=2)}
+        {property_info}
 
         **جزئیاتی که کاربر درخواست کرده:** {detail_type}
 
@@ -831,7 +866,7 @@ def generate_ai_details(property_id, detail_type=None):
         شما یک مشاور املاک در دبی هستید که به زبان فارسی صحبت میکند. لطفاً اطلاعات زیر را به‌فارسی روان و طبیعی به صورت حرفه‌ای، دقیق و کمک‌کننده ارائه دهید:
 
 
-        {json.dumps(combined_info, ensure_ascii=False, indent=2)}
+        {property_info}
 
         لحن شما باید حرفه‌ای، دوستانه و کمک‌کننده باشد. اطلاعاتی که می‌توان ارائه داد شامل:
         - **آی‌دی ملک** (برای بررسی دقیق‌تر)
@@ -853,8 +888,8 @@ def generate_ai_details(property_id, detail_type=None):
 
         """
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
+    response = await llm.chat(
+        "details",
         messages=[{"role": "system", "content": prompt}]
     )
 
@@ -862,11 +897,15 @@ def generate_ai_details(property_id, detail_type=None):
 
 
 
-from duckduckgo_search import DDGS
 from fastapi import HTTPException
 
 async def fetch_real_estate_trends(query):
     """ جستجو در اینترنت و خلاصه کردن اطلاعات بازار مسکن دبی """
+    if answer_cache is not None:
+        cached, _ = answer_cache.get("market", query)
+        if cached is not None:
+            return cached
+
     try:
         if "دبی" in query or "امارات" in query or "Dubai" in query or "UAE" in query:
             search_query = query  # تغییر نده، چون دبی در متن هست
@@ -875,20 +914,8 @@ async def fetch_real_estate_trends(query):
 
         print(f"🔍 **جستجوی دقیق:** {search_query}")  # برای دیباگ
 
-        search_summary = ""  # مقدار پیش‌فرض برای جلوگیری از کرش
-
-        try:
-            # ✅ جستجو در اینترنت با DDGS
-            with DDGS() as ddgs:
-                results = list(ddgs.text(search_query, max_results=5))
-
-            if results:
-                search_summary = "\n".join([f"{r['title']}: {r['body']}" for r in results if 'body' in r])
-            else:
-                print("⚠️ هیچ نتیجه‌ای از DDGS دریافت نشد.")
-
-        except Exception as e:
-            print(f"⚠️ خطا در جستجو با DDGS: {str(e)}. ادامه فقط با اطلاعات GPT.")  # هندل کردن تایم‌اوت و سایر خطاهای احتمالی
+        # ✅ جستجو در اینترنت با DDGS بیرون از event loop و با مهلت سخت (در صورت تاخیر یا خطا، رشته خالی)
+        search_summary = await web_search.summary(search_query)
 
 
         prompt = f"""
@@ -906,13 +933,16 @@ async def fetch_real_estate_trends(query):
         - متن توضیحی را داخل `<p>` قرار بده تا با اندازه عادی باشد.
         """
 
-        ai_response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        ai_response = await llm.chat(
+            "market",
             messages=[{"role": "system", "content": prompt}],
             max_tokens=150
         )
 
-        return ai_response.choices[0].message.content.strip()
+        answer = ai_response.choices[0].message.content.strip()
+        if answer_cache is not None:
+            answer_cache.put("market", query, answer)
+        return answer
 
     except Exception as e:
         print(f"❌ خطا در جستجو: {str(e)}")  # لاگ خطا
@@ -922,6 +952,20 @@ async def fetch_real_estate_trends(query):
 async def fetch_real_estate_buying_guide(user_question):
     """ جستجو و ارائه پاسخ به سؤالات درباره خرید ملک، ویزا و مالیات در دبی """
 
+    # ✅ اطلاعات تماس به انتهای پاسخ اضافه می‌شود
+    contact_info = """
+        <div style="text-align: right; direction: rtl; padding: 10px; width: 100%;">
+            <p style="margin: 0;"><b>📞 شماره تلفن:</b> 0097143639825</p>
+            <p style="margin: 0;"><b>📱 شماره همراه:</b> 00971569939796</p>
+            <p style="margin: 0;"><b>💬 واتساپ:</b> <a href="https://wa.me/00971569939796">تماس با واتساپ</a></p>
+        </div>
+        """
+
+    if answer_cache is not None:
+        cached, _ = answer_cache.get("buying_guide", user_question)
+        if cached is not None:
+            return cached + contact_info
+
     try:
         if "دبی" in user_question or "امارات" in user_question or "Dubai" in user_question or "UAE" in user_question:
             search_query = user_question  # تغییر نده، چون دبی در متن هست
@@ -935,20 +979,15 @@ async def fetch_real_estate_buying_guide(user_question):
         # search_query = user_question  # 🔹 جستجوی همان پیام کاربر!
         # print(f"🔍 **جستجوی گوگل برای:** {search_query}")  # برای دیباگ
 
-        search_summary = ""  # مقدار پیش‌فرض برای جلوگیری از کرش
-
-        try:
-            # ✅ جستجو در اینترنت با DDGS
-            with DDGS() as ddgs:
-                results = list(ddgs.text(search_query, max_results=5))
-
-            if results:
-                search_summary = "\n".join([f"{r['title']}: {r['body']}" for r in results if 'body' in r])
-            else:
-                print("⚠️ هیچ نتیجه‌ای از DDGS دریافت نشد.")
-
-        except Exception as e:
-            print(f"⚠️ خطا در جستجو با DDGS: {str(e)}. ادامه فقط با اطلاعات GPT.")  # هندل کردن تایم‌اوت و سایر خطاهای احتمالی
+        # ✅ اول اسناد محلی؛ فقط اگر قطعه مرتبطی پیدا نشد جستجو در اینترنت با DDGS (بیرون از event loop و با مهلت سخت)
+        hits = knowledge_base.relevant(user_question) if knowledge_base is not None else []
+        if hits:
+            print(f"📚 پاسخ از اسناد محلی: {[hit.passage['source'] for hit in hits]} (امتیاز {hits[0].score:.2f})")
+            search_summary = "\n".join(f"{hit.passage['title']}: {hit.passage['text']}" for hit in hits)
+            search_source = "راهنمای داخلی شرکت ترونست"
+        else:
+            search_summary = await web_search.summary(search_query)
+            search_source = "اینترنت"
 
 
         # ✅ ارسال اطلاعات به GPT برای تولید خلاصه فارسی
@@ -957,7 +996,7 @@ async def fetch_real_estate_buying_guide(user_question):
 
         "{search_query}"
 
-        همچنین این اطلاعات از اینترنت گرفته شده : 
+        همچنین این اطلاعات از {search_source} گرفته شده : 
         "{search_summary if search_summary else 'هیچ نتیجه‌ای از اینترنت دریافت نشد.'}"
 
 
@@ -969,22 +1008,16 @@ async def fetch_real_estate_buying_guide(user_question):
         - متن توضیحی را داخل `<p>` قرار بده تا با اندازه عادی باشد.
 
         """
-        ai_response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        ai_response = await llm.chat(
+            "buying_guide",
             messages=[{"role": "system", "content": response_prompt}],
             max_tokens=150
         )
 
-        # ✅ اضافه کردن اطلاعات تماس به انتهای پاسخ
-        contact_info = """
-        <div style="text-align: right; direction: rtl; padding: 10px; width: 100%;">
-            <p style="margin: 0;"><b>📞 شماره تلفن:</b> 0097143639825</p>
-            <p style="margin: 0;"><b>📱 شماره همراه:</b> 00971569939796</p>
-            <p style="margin: 0;"><b>💬 واتساپ:</b> <a href="https://wa.me/00971569939796">تماس با واتساپ</a></p>
-        </div>
-        """
-
-        return ai_response.choices[0].message.content.strip() + contact_info
+        answer = ai_response.choices[0].message.content.strip()
+        if answer_cache is not None:
+            answer_cache.put("buying_guide", user_question, answer)
+        return answer + contact_info
 
     except Exception as e:
         print(f"❌ خطا در جستجو: {str(e)}")  # لاگ خطا
@@ -994,9 +1027,8 @@ async def fetch_real_estate_buying_guide(user_question):
 
 
 import json
-from fuzzywuzzy import process
 
-async def extract_property_identifier(user_message, property_name_to_id):
+async def extract_property_identifier(user_message, property_name_to_id, numbered_properties):
     """با استفاده از هوش مصنوعی، شماره یا نام ملک را از پیام کاربر استخراج می‌کند و ID آن را برمی‌گرداند."""
 
     # ✅ چاپ دیکشنری برای دیباگ
@@ -1009,6 +1041,9 @@ async def extract_property_identifier(user_message, property_name_to_id):
     if not property_names:
         return None  # اگر لیست خالی باشد، مقدار None برگردان
 
+    # ✅ همان شماره‌هایی که روی کارت‌ها نمایش داده شده‌اند (نه ترتیب property_name_to_id)
+    numbered_titles = {number: title for number, (title, _) in numbered_properties.items()}
+
     # **پرامپت برای تشخیص شماره یا نام ملک**
     prompt = f"""
     کاربر یک مشاور املاک در دبی را خطاب قرار داده و در مورد جزئیات یک ملک سؤال می‌کند.
@@ -1016,6 +1051,9 @@ async def extract_property_identifier(user_message, property_name_to_id):
     **لیست املاک موجود:**
     {json.dumps(property_names, ensure_ascii=False)}
 
+    **شماره کارت هر ملک (شماره: نام):**
+    {json.dumps(numbered_titles, ensure_ascii=False)}
+
     **متن کاربر:**
     "{user_message}"
 
@@ -1023,15 +1061,15 @@ async def extract_property_identifier(user_message, property_name_to_id):
     - اگر عددی چه به فارسی چه به انگلیسی ذکر شده (مثلاً ۲)، فقط همان عدد را در خروجی بده.  
     - اگر id ملک نوشته شده 
     - اگر نام یکی از املاک بالا ذکر شده، فقط نام آن را در خروجی بده.
-    - اگر کاربر عباراتی مانند "ملک دوم"، "ملک شماره ۲"، "دومین ملک" و... استفاده کرد، شماره ملک را به ترتیب در لیست بگیر.
+    - اگر کاربر عباراتی مانند "ملک دوم"، "ملک شماره ۲"، "دومین ملک" و... استفاده کرد، همان شماره کارت را بده.
 
     **خروجی فقط شامل مقدار باشد:**
     - یک عدد (مثلاً `2`)
     - یا نام ملک (مثلاً `"Marriott Residences"`)
     """
 
-    ai_response = client.chat.completions.create(
-        model="gpt-4o-mini",
+    ai_response = await llm.chat(
+        "identify_property",
         messages=[{"role": "system", "content": prompt}],
         max_tokens=30
     )
@@ -1044,12 +1082,11 @@ async def extract_property_identifier(user_message, property_name_to_id):
 
     # ✅ بررسی عددی بودن مقدار استخراج‌شده (اگر شماره ملک باشد)
     if extracted_info.isdigit():
-        extracted_index = int(extracted_info) - 1  # **تبدیل شماره به ایندکس (1-based to 0-based)**
-        
-        if 0 <= extracted_index < len(property_names):  # **بررسی اینکه عدد در محدوده باشد**
-            property_name = property_names[extracted_index]
-            return property_name_to_id[property_name]  # **برگرداندن `id` ملک**
-        
+        # ✅ شماره کارت از طریق numbered_properties (مثل compare_properties) به ملک می‌رسد
+        numbered = numbered_properties.get(int(extracted_info))
+        if numbered is not None:
+            return numbered[1]  # **برگرداندن `id` ملک**
+
         return None  # اگر عدد معتبر نبود، مقدار `None` برگردد
 
     # ✅ بررسی اینکه آیا نام ملک در دیکشنری هست؟
@@ -1058,7 +1095,7 @@ async def extract_property_identifier(user_message, property_name_to_id):
         return property_name_to_id[extracted_info]  # **برگرداندن `id` ملک**
 
     # ✅ اگر تطابق ۱۰۰٪ نبود، از fuzzy matching استفاده کن
-    best_match, score = process.extractOne(extracted_info, property_names)
+    best_match, score = extract_one(extracted_info, property_names)
     print(f"📌 بهترین تطابق fuzzy: {best_match} (امتیاز: {score})")
 
     if score > 70:  # **اگر دقت بالا بود، مقدار را قبول کن**
@@ -1068,18 +1105,24 @@ async def extract_property_identifier(user_message, property_name_to_id):
 
 
 
-def fetch_properties_from_estaty(property_names):
+async def fetch_properties_from_estaty(property_names):
     """ جستجوی دو ملک در Estaty API برای دریافت ID آن‌ها """
     found_properties = []
-    
-    for name in property_names:
-        filters = {"property_name": name}
-        response = requests.post(f"{ESTATY_API_URL}/filter", json=filters, headers=HEADERS)
-        
-        if response.status_code == 200:
-            properties = response.json().get("properties", [])
-            if properties:
-                found_properties.append((properties[0]["title"], properties[0]["id"]))
+
+    # ✅ جستجوی همزمان همه نام‌ها
+    results = await asyncio.gather(
+        *[estaty.filter({"property_name": name}) for name in property_names],
+        return_exceptions=True
+    )
+
+    for properties in results:
+        if isinstance(properties, EstatyAPIError):
+            print(f"❌ خطا در جستجوی ملک در Estaty: {properties}")
+            continue
+        if isinstance(properties, BaseException):
+            raise properties
+        if properties:
+            found_properties.append((properties[0]["title"], properties[0]["id"]))
     
     return found_properties
 
@@ -1088,10 +1131,11 @@ def fetch_properties_from_estaty(property_names):
 
 
 
-async def compare_properties(user_message: str) -> str:
+async def compare_properties(state, user_message: str) -> str:
     """ مقایسه‌ی دو یا چند ملک و ارائه بهترین پیشنهاد """
     
-    global comp_properties, property_name_to_id
+    numbered_properties = state.numbered_properties
+    property_name_to_id = state.property_name_to_id
 
     mentioned_properties = []
 
@@ -1100,12 +1144,12 @@ async def compare_properties(user_message: str) -> str:
     mentioned_properties = []
 
     if len(property_numbers) == 2:
-        first_index = int(property_numbers[0]) - 1  # ایندکس‌ها از 0 شروع می‌شوند
-        second_index = int(property_numbers[1]) - 1  
+        first_number = int(property_numbers[0])  # همان شماره‌ای که روی کارت نمایش داده شده
+        second_number = int(property_numbers[1])
 
-        if 0 <= first_index < len(comp_properties) and 0 <= second_index < len(comp_properties):
-            mentioned_properties.append((comp_properties[first_index]["title"], comp_properties[first_index]["id"]))
-            mentioned_properties.append((comp_properties[second_index]["title"], comp_properties[second_index]["id"]))
+        if first_number in numbered_properties and second_number in numbered_properties:
+            mentioned_properties.append(numbered_properties[first_number])
+            mentioned_properties.append(numbered_properties[second_number])
 
     # # ✅ **اگر اعداد پیدا نشدند، بررسی کنیم که آیا کاربر نام ملک را نوشته است**
     # if not mentioned_properties:
@@ -1125,7 +1169,7 @@ async def compare_properties(user_message: str) -> str:
                     mentioned_properties.append((user_prop, property_name_to_id[user_prop]))
             else:
                 # ✅ **بررسی شباهت فقط برای املاک قبلاً معرفی‌شده**
-                best_match, score = process.extractOne(user_prop, property_name_to_id.keys()) if property_name_to_id else (None, 0)
+                best_match, score = extract_one(user_prop, property_name_to_id.keys()) if property_name_to_id else (None, 0)
                 print(f"📌 بهترین تطابق fuzzy: {best_match} (امتیاز: {score})")
 
                 if score > 75:  # **اگر شباهت بالای ۷۵٪ بود، این ملک را در نظر بگیر**
@@ -1140,7 +1184,7 @@ async def compare_properties(user_message: str) -> str:
         print(mentioned_names)
 
         if len(mentioned_names) >= 2:
-            found_properties = fetch_properties_from_estaty(mentioned_names[:2])
+            found_properties = await fetch_properties_from_estaty(mentioned_names[:2])
             if len(found_properties) == 2:
                 mentioned_properties.extend(found_properties)
 
@@ -1153,8 +1197,10 @@ async def compare_properties(user_message: str) -> str:
     first_property_name, first_property_id = mentioned_properties[0]
     second_property_name, second_property_id = mentioned_properties[1]
 
-    first_property_details = fetch_single_property(first_property_id)
-    second_property_details = fetch_single_property(second_property_id)
+    first_property_details, second_property_details = await asyncio.gather(
+        fetch_single_property(first_property_id),
+        fetch_single_property(second_property_id)
+    )
 
     # **بررسی اینکه آیا اطلاعات ملک‌ها پیدا شده است**
     if not first_property_details or not second_property_details:
@@ -1194,10 +1240,10 @@ async def compare_properties(user_message: str) -> str:
     مقایسه کنید و در نهایت **بهترین گزینه را برای خرید معرفی کنید**.
 
     **🔹 اطلاعات ملک اول ({first_property_name}):**  
-    {json.dumps(first_property_details, ensure_ascii=False, indent=2)}
+    {prompt_projector.project(first_property_details, "compare")}
 
     **🔹 اطلاعات ملک دوم ({second_property_name}):**  
-    {json.dumps(second_property_details, ensure_ascii=False, indent=2)}
+    {prompt_projector.project(second_property_details, "compare")}
 
     🔹 **جمع‌بندی:**  
     - مشخص کنید کدام ملک بهتر است و چرا؟  
@@ -1209,8 +1255,8 @@ async def compare_properties(user_message: str) -> str:
     - متن توضیحی را داخل `<p>` قرار بده تا با اندازه عادی باشد.
     """
 
-    ai_response = client.chat.completions.create(
-        model="gpt-4o-mini",
+    ai_response = await llm.chat(
+        "compare",
         messages=[{"role": "system", "content": comparison_prompt}]
     )
 
@@ -1219,10 +1265,11 @@ async def compare_properties(user_message: str) -> str:
 
 
 
-async def process_purchase_request(user_message: str) -> str:
+async def process_purchase_request(state, user_message: str) -> str:
     """ بررسی درخواست خرید ملک و ارائه اطلاعات پرداخت، اقساط و تخفیف‌ها """
 
-    global property_name_to_id
+    property_name_to_id = state.property_name_to_id
+    selected_properties = state.selected_properties
 
     # ✅ **استخراج نام ملک از پیام کاربر**
     user_property_names = re.findall(r'([A-Za-z0-9\-]+(?:\s[A-Za-z0-9\-]+)*)', user_message)
@@ -1232,7 +1279,7 @@ async def process_purchase_request(user_message: str) -> str:
     # ✅ **بررسی نام ملک با Fuzzy Matching برای تشخیص غلط املایی**
     if property_name_to_id:
         for user_prop in user_property_names:
-            best_match, score = process.extractOne(user_prop, property_name_to_id.keys())
+            best_match, score = extract_one(user_prop, property_name_to_id.keys())
             print(f"📌 بهترین تطابق fuzzy: {best_match} (امتیاز: {score})")  # دیباگ
             if score > 70:  # **اگر دقت بالای ۷۰٪ بود، مقدار را قبول کن**
                 mentioned_properties.append((best_match, property_name_to_id[best_match]))
@@ -1241,7 +1288,7 @@ async def process_purchase_request(user_message: str) -> str:
     #     return "❌ لطفاً نام دقیق ملکی که قصد خرید آن را دارید مشخص کنید."
     if not mentioned_properties:
         # print("❌ ملک در لیست قبلی یافت نشد، جستجو در Estaty API انجام می‌شود...")
-        found_properties = fetch_properties_from_estaty(user_property_names[:1])  # فقط اولین ملک را بررسی کن
+        found_properties = await fetch_properties_from_estaty(user_property_names[:1])  # فقط اولین ملک را بررسی کن
         if not found_properties:
             return "❌ متأسفم، این ملک در لیست املاک موجود پیدا نشد. لطفاً نام دقیق‌تر را وارد کنید."
         
@@ -1250,7 +1297,7 @@ async def process_purchase_request(user_message: str) -> str:
 
     # ✅ دریافت اطلاعات ملک از API
     property_name, property_id = mentioned_properties[0]
-    property_details = fetch_single_property(property_id)
+    property_details = await fetch_single_property(property_id)
 
     if not property_details:
         return "❌ متأسفم، نتوانستم اطلاعات این ملک را پیدا کنم."
@@ -1260,7 +1307,7 @@ async def process_purchase_request(user_message: str) -> str:
     شما یک مشاور املاک حرفه‌ای در دبی به زبان فارسی هستید. یک مشتری قصد خرید ملکی دارد و می‌خواهد درباره شرایط پرداخت و تخفیف‌های آن بداند.
 
     **🔹 مشخصات ملک:**  
-    {json.dumps(property_details, ensure_ascii=False, indent=2)}
+    {prompt_projector.project(property_details, "purchase")}
 
     🔹 **لطفاً اطلاعات زیر را ارائه دهید:**  
     - 💲 **قیمت کل ملک و روش‌های پرداخت**  
@@ -1284,8 +1331,8 @@ async def process_purchase_request(user_message: str) -> str:
     **لحن شما باید حرفه‌ای، دقیق و کمک‌کننده باشد.**  
     """
 
-    ai_response = client.chat.completions.create(
-        model="gpt-4o-mini",
+    ai_response = await llm.chat(
+        "purchase",
         messages=[{"role": "system", "content": purchase_prompt}]
     )
 
@@ -1293,8 +1340,40 @@ async def process_purchase_request(user_message: str) -> str:
 
 
 
+async def count_districts(filters, delivery_date=None, min_area=None, max_area=None):
+    """ شمارش املاک هر منطقه با گرفتن املاک (وقتی جدول تجمیعی این فیلترها را ندارد)؛ خطای API به صورت متن پیام """
+    # ✅ فیلتر سال تحویل و مساحت همراه با بقیه فیلترها روی ستون‌های NumPy اجرا می‌شود
+    try:
+        properties = await query_inventory(
+            filters, delivery_year=delivery_date, min_area=min_area, max_area=max_area
+        )
+    except EstatyAPIError as e:
+        print(f"❌ خطا در دریافت اطلاعات مناطق: {e}")
+        return "❌ خطا در دریافت اطلاعات مناطق. لطفاً دوباره امتحان کنید."
+
+    if delivery_date is not None:
+        print(f"🔍 بعد از فیلتر بر اساس سال تحویل ({delivery_date}): {len(properties)}")
+
+    if min_area is not None or max_area is not None:
+        min_val = min_area if min_area is not None else 0
+        max_val = max_area if max_area is not None else float("inf")
+        print(f"📐 بعد از فیلتر بر اساس مساحت پروژه (sqft) بین {min_val * SQM_TO_SQFT} تا {max_val * SQM_TO_SQFT}: {len(properties)}")
+
+    # ✅ استخراج مناطق و شمارش تعداد املاک موجود در هر منطقه
+    district_counts = {}
+    for prop in properties:
+        district_info = prop.get("district")
+        if district_info and isinstance(district_info, dict):  # بررسی می‌کنیم که district وجود دارد و دیکشنری است
+            district_name = district_info.get("name")
+            if district_name:
+                district_counts[district_name] = district_counts.get(district_name, 0) + 1
+
+    # ✅ مرتب‌سازی بر اساس تعداد املاک موجود
+    return sorted(district_counts.items(), key=lambda x: x[1], reverse=True)
+
+
 # def find_districts_by_budget(max_price, bedrooms=None, apartment_typ=None, min_price=None):
-def find_districts_by_budget(max_price=None, min_price=None, max_area= None, min_area = None, bedrooms=None, apartment_typ=None, facilities=None, developer_company=None, delivery_date=None, post_delivery=None, payment_plan=None, guarantee_rental=None):
+async def find_districts_by_budget(state, max_price=None, min_price=None, max_area= None, min_area = None, bedrooms=None, apartment_typ=None, facilities=None, developer_company=None, delivery_date=None, post_delivery=None, payment_plan=None, guarantee_rental=None):
 
     """جستجوی مناطق مناسب با توجه به بودجه و تعداد اتاق‌خواب"""
     filters = {}
@@ -1308,68 +1387,14 @@ def find_districts_by_budget(max_price=None, min_price=None, max_area= None, min
 
     if apartment_typ is not None:
         apartment_typ = str(apartment_typ).strip().title()  # تبدیل به فرمت استاندارد
-                # ✅ دیکشنری نگاشت نوع آپارتمان به `id`
-        apartment_type_mapping = {
-                    "Apartment": 1,
-                    "Building": 31,
-                    "Duplex": 27,
-                    "Full Floor": 4,
-                    "Hotel": 32,
-                    "Hotel Apartment": 8,
-                    "Land / Plot": 6,
-                    "Loft": 34,
-                    "Office": 7,
-                    "Penthouse": 10,
-                    "Retail": 33,
-                    "Shop": 29,
-                    "Show Room": 30,
-                    "Store": 25,
-                    "Suite": 35,
-                    "Townhouse": 9,
-                    "Triplex": 28,
-                    "Villa": 3,
-                    "Warehouse": 26
-                }
-
                 # ✅ تبدیل مقدار `property_type` به `id` معادل آن
-        filters["apartmentType"] = [apartment_type_mapping.get(apartment_typ, apartment_typ)]
+        filters["apartmentType"] = [APARTMENT_TYPES.get(apartment_typ, apartment_typ)]
 
     if bedrooms is not None:
         bedrooms_count = str(bedrooms)  # مقدار را به رشته تبدیل کن
 
-        bedrooms_mapping = {
-            "1": 10,
-            "1.5": 23,
-            "2": 11,
-            "2.5": 24,
-            "3": 12,
-            "3.5": 25,
-            "4": 13,
-            "4.5": 26,
-            "5": 14,
-            "5.5": 27,
-            "6": 15,
-            "6.5": 28,
-            "7": 16,
-            "7.5": 29,
-            "8": 17,
-            "9": 18,
-            "10": 19,
-            "11": 22,
-            "Studio": 9,       
-            "Penthouse": 34,   
-            "Retail": 31,      
-            "Office": 20,      
-            "Showroom": 35,    
-            "Store": 30,       
-            "Suite": 32,       
-            "Hotel Room": 33,   
-            "Full Floor": 36,  
-            "Land / Plot": 21  
-        }
-
         # مقدار `property_type` را به `id` تغییر بده
-        filters["apartments"] = [bedrooms_mapping.get(bedrooms_count, bedrooms_count)]
+        filters["apartments"] = [BEDROOMS.get(bedrooms_count, bedrooms_count)]
 
     if facilities is not None:
         facilities_list = facilities  # دریافت امکانات از `extracted_data`
@@ -1379,111 +1404,14 @@ def find_districts_by_budget(max_price=None, min_price=None, max_area= None, min
             # facilities_list = [facilities_list]  # تبدیل رشته به لیست تک‌عضوی
             facilities_list = [x.strip() for x in facilities_list.split(",") if x.strip()]
         
-        facilities_mapping = {
-                "24 hour security": "408",
-                "24/7 Security and Maintenance Services": "399",
-                "Access Control System": "314",
-                "Air Fitness zones": "570",
-                "Art Garden": "510",
-                "BBQ Area": "21",
-                "Baby Care Centre": "163",
-                "Badminton Court": "100",
-                "Balcony": "76",
-                "Basketball Court": "427",
-                "Basketball Playground": "10",
-                "Beach": "387",
-                "Beach Club": "595",
-                "Beauty Saloon": "106",
-                "Bicycle parking": "348",
-                "Bike Paths": "52",
-                "Bike tracks": "458",
-                "Bocce Play Area": "525",
-                "Broadband Internet": "46",
-                "Building Management System": "325",
-                "Business Centre": "175",
-                "CCTV Surveillance": "313",
-                "Cabana Seating": "88",
-                "Cafe": "184",
-                "Central A/C & Heating": "47",
-                "Changing Room and Locker": "533",
-                "Chess Board": "97",
-                "Children's Play Area": "6",
-                "Children's Swimming Pool": "7",
-                "Cinema": "19",
-                "Clinic": "279",
-                "Close Circuit TV System": "323",
-                "Club House": "226",
-                "Co-Working Spaces": "221",
-                "Community hubs": "460",
-                "Concierge Service": "37",
-                "Covered Parking": "31",
-                "Cricket Pitch": "95",
-                "Cycling Track": "276",
-                "Direct Beach Access": "96",
-                "Dog Park": "363",
-                "Electric Vehicle Charging Stations": "229",
-                "Fitness Area": "424",
-                "Fitness Club": "50",
-                "Fitness studio": "397",
-                "Football Playground": "9",
-                "Games Lounge Room": "269",
-                "Garden": "11",
-                "Gym": "334",
-                "Gymnasium": "454",
-                "Health Club": "102",
-                "Hospital": "368",
-                "Jogging Track": "105",
-                "Kids Pool": "381",
-                "Kids Swimming Pool": "452",
-                "Laundry Room": "107",
-                "Library": "87",
-                "Mall": "111",
-                "Meeting Rooms": "369",
-                "Mini Golf": "96",
-                "Mosque": "204",
-                "Music Room": "268",
-                "Nursery": "217",
-                "Outdoor Gym": "26",
-                "Padel Tennis": "467",
-                "Park": "54",
-                "Parking": "405",
-                "Pet Shop": "281",
-                "Pharmacy": "57",
-                "Play Area": "425",
-                "Playground": "319",
-                "Pool Deck": "415",
-                "Private Cinema For Each Unit": "364",
-                "Private Parking for Each unit": "484",
-                "Security": "40",
-                "SPA": "43",
-                "Sauna": "13",
-                "Sauna & Steam Room": "144",
-                "School": "49",
-                "Shared Outdoor Swimming Pool": "20",
-                "Skate Park": "428",
-                "Smart Homes": "378",
-                "Squash Courts": "209",
-                "Supermarket": "56",
-                "Swimming Pool": "74",
-                "Tennis Playground": "8",
-                "Theater": "19",
-                "VR Game Room": "382",
-                "Water Fountain": "356",
-                "Veterinary Clinic": "280",
-                "Yoga": "167",
-                "Zen Garden": "511",
-                "Kids Club": "331",
-                "Safe & Secure": "529"
-        }
-
         if isinstance(facilities_list, list):  # بررسی اینکه ورودی یک لیست باشد
             mapped_facilities = []
 
             for facility in facilities_list:
-                best_match, score = process.extractOne(facility.strip(), facilities_mapping.keys())
+                best_match, score = FACILITIES.extract_one(facility.strip())
 
                 if score > 70:  # **فقط اگر دقت بالای ۷۰٪ بود، مقدار را قبول کن**
-                    mapped_facilities.append(facilities_mapping[best_match])
+                    mapped_facilities.append(FACILITIES[best_match])
 
             if mapped_facilities:  # **اگر امکاناتی پیدا شد، به `filters` اضافه شود**
                 filters["facilities"] = mapped_facilities
@@ -1496,84 +1424,14 @@ def find_districts_by_budget(max_price=None, min_price=None, max_area= None, min
         if isinstance(developer_list, str):
             developer_list = [developer_list]  # تبدیل رشته به لیست تک‌عضوی
 
-        developer_mapping = {
-            "Burtville Developments": 330, "Sobha": 3, "Tiger Properties": 103, "Azizi": 37, "Meraas": 70,
-            "Dubai Properties": 258, "Confident Group": 308, "Iman Developers": 61, "EMAAR": 2, "Shapoorji Pallonji": 91,
-            "Arada Properties": 35, "Ellington Properties": 50, "Select Group": 85, "Nshama": 76, "Arenco Real Estate": 398,
-            "Rijas Aces Property": 233, "Wasl": 109, "London Gate": 264, "Nakheel": 74, "GFH": 60,
-            "Expo City": 54, "AYS Developments": 36, "Imtiaz": 87, "Park Group": 366, "Prestige One": 80,
-            "Almazaya Holding": 68, "Samana Developers": 83, "Aldar": 32, "Bloom Holding": 270, "AG Properties": 317,
-            "Swank Development": 393, "Binghatti": 38, "Divine One Group": 311, "Emirates properties": 267,
-            "Dubai South": 323, "Pearlshire Developments": 329, "Gulf Land": 239, "Radiant": 269, "Modon Properties": 394,
-            "Oro24": 241, "Alzorah Development": 383, "Algouta Properties": 380, "Naseeb Group": 265, "GJ Properties": 326,
-            "Amwaj Development": 348, "Grid properties": 296, "Aqua Properties": 34, "SRG Holding": 95,
-            "Roya Lifestyle Developments": 338, "Omniyat": 77, "Aqasa Developers": 333, "Zimaya Properties": 392,
-            "Amali Properties": 341, "Credo": 324, "AAF Development": 409, "Dalands Developer": 427,
-            "The Heart of Europe": 101, "HRE Development": 399, "Lootah": 65, "AJ Gargash Real Estate": 465, "Damac": 318,
-            "Townx Real Estate": 105, "Symbolic": 97, "Nabni developments": 294, "Deyaar": 45, "Citi Developers": 283,
-            "Mashriq Elite": 332, "IFA Hotels & Resorts": 486, "Q Properties": 408, "ARAS Real Estate": 293,
-            "East & West Properties": 49, "H&H": 315, "Laya": 238, "Leos": 240, "Reportage": 232, "Empire Development": 52,
-            "Object 1": 237, "KASCO Development": 433, "Esnad Management": 421, "Majid Al Futtaim Group": 111,
-            "Signature D T": 203, "Sol Properties": 94, "Luxe Developer": 327, "Dugasta": 276, "Avelon Developments": 287,
-            "Rokane": 417, "LMD Real Estate": 227, "Source of Fate": 434, "Vision developments": 390,
-            "Peace Homes Development": 250, "JRP Development": 410, "MAG": 242, "Riviera Group": 298, "Durar": 320,
-            "Meraki Developers": 71, "Uniestate Properties": 107, "Eagle Hills": 299, "IRTH": 372,
-            "Amaya Properties LLC": 413, "Ajmal Makan": 260, "Siroya Ventures Realty L.L.C": 445, "HMB": 247,
-            "Enso Development": 403, "Marquis Point": 274, "Meteora": 278, "Vincitore": 108, "Taraf": 100,
-            "ADE Properties": 446, "Baccarat": 370, "Condor Group": 41, "Rabdan": 289, "Pure Gold": 256,
-            "Saas Properties": 300, "Dubai Invesment": 254, "Swiss Properties": 96, "Beyond": 443, "Green Group": 346,
-            "Mubadala": 468, "Main Realty": 334, "Danube Properties": 42, "Ambs Real Estate": 360, "MeDoRe": 255,
-            "Heilbronn Properties": 339, "Maaia Developments": 517, "Ginco Properties": 374, "Qube Development": 354,
-            "Orange": 303, "Alseeb Real Estate Development": 442, "Peak Summit Real Estate Development": 350,
-            "Regent Developers": 501, "Mr. Eight Development": 430, "BnW Developments": 382, "Tuscany Real Estate Development": 396,
-            "RAK Properties": 245, "Siadah International Real Estate": 406, "One Development": 425, "AHS Properties": 319,
-            "ARIB Developments": 389, "Segrex": 284, "DIFC": 502, "DarGlobal": 44, "Fortune 5": 58,
-            "Green Yard Properties": 412, "Ahmadyar Developments": 375, "Sankari Properties": 310, "Alta Real Estate Development": 491,
-            "Sama Ezdan": 205, "Stamn Development": 440, "Kamdar developments": 470, "BT Properties": 507, "IGO": 259,
-            "Orra Real Estate": 204, "Five Holdings": 56, "Karma": 62, "Almarwan Developments": 458,
-            "Khamas Group Of Investment Co's": 363, "Imkan": 371, "LAPIS Properties": 419, "Liv Developers": 64,
-            "S&S Real Estate": 499, "Fakhruddin Properties": 55, "Saba Property Developers": 416, "Majid Developments": 401,
-            "HVM Living": 484, "Golden Wood": 407, "EL Prime Properties": 431, "Wellcube.life": 395,
-            "Mubarak Al Beshara Real Estate Development": 420, "Dar Alkarama": 43, "Palma Holding": 340,
-            "Vantage Properties": 469, "Shurooq Development": 435, "Vakson Real Estate": 358, "Tasmeer Indigo Properties": 352,
-            "Acube Developments": 309, "Mada'in": 154, "Anax Developments": 301, "API": 455, "Alhamra": 351,
-            "AB Developers": 367, "Tarrad Real Estate": 451, "Esnaad": 302, "4 Direction Developers": 508,
-            "Alzarooni Development": 444, "Alma Developments": 500, "Reef Luxury Development": 424,
-            "Blanco Thornton Properties": 402, "Amaal": 498, "Wahat Al Zaweya": 397, "Alef Group": 273,
-            "One Yard": 200, "AAA Development": 441, "Ohana Developments": 369, "Forum Real Estate": 387,
-            "Nine Development": 411, "Nine Yards Development": 494, "Mira Developments": 282, "MAK Developers": 415,
-            "MS Homes": 376, "Crystal Bay Development": 377, "Galaxy": 379, "Advanced Properties": 268,
-            "City View Developments": 391, "Svarn": 368, "Centurion Developers": 464, "Union Properties": 364,
-            "Wellington Developments": 497, "Seven Mayfair Real Estate": 515, "DV8 Developers": 423, "Zenith Group": 513,
-            "AlMadar Investment L.L.C": 428, "Abou Eid Real Estate": 252, "Asak Real Estate": 485,
-            "Alhabtoor Group": 28, "Mill Hill Developer": 488, "Alaia Developments": 505, "True Future Development": 495,
-            "ARTE Development": 432, "Time Properties": 104, "GFS Builders & Developers": 471, "Zoya Developments": 386,
-            "Evera Real Estate Development": 467, "77 Shades of Green": 448, "BNH Real Estate Developer": 429,
-            "Oksa Developer": 475, "Alhelal Al zahaby": 452, "Kingdom Properties": 456, "Aark Developers": 26,
-            "Januss Developers": 447, "Grovy Real Estate": 210, "Range Developments": 479, "Matrix developments": 483,
-            "Shoumous": 261, "Lucky Aeon": 66, "Meydan": 422, "Pantheon Development": 78, "DMCC": 388,
-            "Arista Properties": 321, "DHG Properties": 295, "World Of Wonders": 291, "PMR Property": 450,
-            "Major Development’s": 292, "Takmeel Real Estate": 314, "Urban Properties": 385, "Emerald Palace Group": 51,
-            "Metac Properties L.L.C": 23, "Skyline Builders": 285, "Prescott": 357, "Vantage Ventures": 490,
-            "Zane Development": 481, "Yas Developers": 463, "Amirah Developments": 482, "Elysian Properties": 454,
-            "Nexus Developer": 449, "Hayaat Developments": 512, "Lincoln Star Real Estate": 466, "Arsenal East": 473,
-            "Laraix Developers": 511, "Aqaar": 305, "Baraka Development": 304, "Keymavens development": 345,
-            "The 100": 359, "Manam Real Estate Development": 438, "Almarina Holding": 474, "Dia Properties": 518,
-            "Iraz Developments": 335, "Seven Tides": 89, "Albait Alduwaliy Real Estate": 355,
-            "Palladium Development": 356, "Tabeer Developments": 98, "Lacasa Living": 477, "Wow Resorts": 405,
-            "Revolution": 342, "ABA Group": 336, "Cirrera Development": 516, "SOHO Development": 344,
-            "Signature Developers": 426, "Pinnacle Developers": 437, "BAMX Development": 519, "Mered": 288,
-            "AiZN Development": 404, "Octa Properties": 277, "Premier Choice": 520
-        }
-
         if isinstance(developer_list, list):  # بررسی اینکه ورودی یک لیست باشد
             mapped_developers = []
 
             for developer in developer_list:
-                best_match, score = process.extractOne(developer.strip(), developer_mapping.keys())
+                best_match, score = DEVELOPERS.extract_one(developer.strip())
 
                 if score > 70:  # **فقط اگر دقت بالای ۷۰٪ بود، مقدار را قبول کن**
-                    mapped_developers.append(developer_mapping[best_match])
+                    mapped_developers.append(DEVELOPERS[best_match])
 
             if mapped_developers:  # **اگر شرکت‌هایی پیدا شدند، به `filters` اضافه شود**
                 filters["developer_company_id"] = mapped_developers
@@ -1606,15 +1464,6 @@ def find_districts_by_budget(max_price=None, min_price=None, max_area= None, min
     print(filters)
     # logging.info(f"filter district: {filters}")
 
-    response = requests.post(f"{ESTATY_API_URL}/filter", json=filters, headers=HEADERS)
-
-    print(response)
-    if response.status_code != 200:
-        return "❌ خطا در دریافت اطلاعات مناطق. لطفاً دوباره امتحان کنید."
-
-    data = response.json()
-    properties = data.get("properties", [])
-
     if delivery_date is not None:
         try:
             user_date = delivery_date.strip()
@@ -1634,49 +1483,20 @@ def find_districts_by_budget(max_price=None, min_price=None, max_area= None, min
             print(f"❌ خطا در پردازش تاریخ: {e}")
             delivery_date = None
 
-    if delivery_date is not None:
-        target_year = delivery_date  # سال موردنظر کاربر
-        start_of_year = int(datetime(target_year, 1, 1).timestamp())  # تبدیل به یونیکس (ژانویه)
-        end_of_year = int(datetime(target_year, 12, 31, 23, 59, 59).timestamp())  # تبدیل به یونیکس (دسامبر)
-
-        properties = [
-            prop for prop in properties
-            if "delivery_date" in prop and prop["delivery_date"].isdigit() and 
-            start_of_year <= int(prop["delivery_date"]) <= end_of_year
-        ]
-
-        print(f"🔍 بعد از فیلتر بر اساس سال تحویل ({target_year}): {len(properties)}")
-
-    if min_area is not None or max_area is not None:
-        min_val = min_area if min_area is not None else 0
-        max_val = max_area if max_area is not None else float("inf")
-
-        properties = [
-            prop for prop in properties
-            if "min_area" in prop and prop["min_area"] is not None and isinstance(prop["min_area"], (int, float)) and
-            (min_val * 10.7639) <= float(prop["min_area"]) <= (max_val * 10.7639)
-        ]
-
-        print(f"📐 بعد از فیلتر بر اساس مساحت پروژه (sqft) بین {min_val * 10.7639} تا {max_val * 10.7639}: {len(properties)}")
+    # ✅ اول از جدول تجمیعی مناطق (ساخته‌شده در همگام‌سازی)؛ بدون گرفتن و شمردن تک‌تک املاک
+    sorted_districts = inventory.district_counts(
+        filters, delivery_year=delivery_date, min_area=min_area, max_area=max_area
+    )
+    if sorted_districts is not None:
+        print(f"⚡ مناطق از جدول تجمیعی: {len(sorted_districts)} منطقه")
+    else:
+        sorted_districts = await count_districts(filters, delivery_date, min_area, max_area)
+        if isinstance(sorted_districts, str):
+            return sorted_districts
 
-    if not properties:
+    if not sorted_districts:
         return "❌ متأسفم، هیچ منطقه‌ای متناسب با بودجه شما پیدا نشد."
 
-    # ✅ استخراج مناطق و شمارش تعداد املاک موجود در هر منطقه
-    district_counts = {}
-    for prop in properties:
-        district_info = prop.get("district")
-        if district_info and isinstance(district_info, dict):  # بررسی می‌کنیم که district وجود دارد و دیکشنری است
-            district_name = district_info.get("name")
-            if district_name:
-                district_counts[district_name] = district_counts.get(district_name, 0) + 1
-
-    if not district_counts:
-        return "❌ هیچ منطقه‌ای با این بودجه پیدا نشد."
-
-    # ✅ مرتب‌سازی بر اساس تعداد املاک موجود
-    sorted_districts = sorted(district_counts.items(), key=lambda x: x[1], reverse=True)
-
     # ✅ ایجاد پاسخ مناسب برای کاربر
     # response_text = "**📍 مناطقی که با بودجه شما مناسب هستند:**\n"
     response_text = """
@@ -1693,7 +1513,7 @@ def find_districts_by_budget(max_price=None, min_price=None, max_area= None, min
         response_text += f"<li>در منطقه <span dir='ltr'><b>{district}</b></span>، <b>{count}</b> ملک در دسترس است.</li>\n"
 
         top_districts.append(district)
-    memory_district["suggested_districts"] = top_districts
+    state.memory_district["suggested_districts"] = top_districts
 
     response_text += """
     </ul>
@@ -1705,7 +1525,7 @@ def find_districts_by_budget(max_price=None, min_price=None, max_area= None, min
     return response_text
 
 
-def find_price(district=None, bedrooms=None, apartment_typ=None, max_area= None, min_area = None, facilities=None, developer_company=None, delivery_date=None, post_delivery=None, payment_plan=None, guarantee_rental=None):
+async def find_price(district=None, bedrooms=None, apartment_typ=None, max_area= None, min_area = None, facilities=None, developer_company=None, delivery_date=None, post_delivery=None, payment_plan=None, guarantee_rental=None):
 
     """جستجوی مناطق مناسب با توجه به بودجه و تعداد اتاق‌خواب"""
     filters = {}
@@ -1713,110 +1533,19 @@ def find_price(district=None, bedrooms=None, apartment_typ=None, max_area= None,
     if bedrooms is not None:
         bedrooms_count = str(bedrooms).strip().title()  # مقدار را به رشته تبدیل کن
 
-        bedrooms_mapping = {
-            "1": 10,
-            "1.5": 23,
-            "2": 11,
-            "2.5": 24,
-            "3": 12,
-            "3.5": 25,
-            "4": 13,
-            "4.5": 26,
-            "5": 14,
-            "5.5": 27,
-            "6": 15,
-            "6.5": 28,
-            "7": 16,
-            "7.5": 29,
-            "8": 17,
-            "9": 18,
-            "10": 19,
-            "11": 22,
-            "Studio": 9,       
-            "Penthouse": 34,   
-            "Retail": 31,      
-            "Office": 20,      
-            "Showroom": 35,    
-            "Store": 30,       
-            "Suite": 32,       
-            "Hotel Room": 33,   
-            "Full Floor": 36,  
-            "Land / Plot": 21  
-        }
-
         # مقدار `property_type` را به `id` تغییر بده
-        filters["apartments"] = [bedrooms_mapping.get(bedrooms_count, bedrooms_count)]
+        filters["apartments"] = [BEDROOMS.get(bedrooms_count, bedrooms_count)]
 
 
     if apartment_typ is not None:
         apartment_typ = str(apartment_typ).strip().title()  # تبدیل به فرمت استاندارد
-                # ✅ دیکشنری نگاشت نوع آپارتمان به `id`
-        apartment_type_mapping = {
-                    "Apartment": 1,
-                    "Building": 31,
-                    "Duplex": 27,
-                    "Full Floor": 4,
-                    "Hotel": 32,
-                    "Hotel Apartment": 8,
-                    "Land / Plot": 6,
-                    "Loft": 34,
-                    "Office": 7,
-                    "Penthouse": 10,
-                    "Retail": 33,
-                    "Shop": 29,
-                    "Show Room": 30,
-                    "Store": 25,
-                    "Suite": 35,
-                    "Townhouse": 9,
-                    "Triplex": 28,
-                    "Villa": 3,
-                    "Warehouse": 26
-                }
-
                 # ✅ تبدیل مقدار `property_type` به `id` معادل آن
-        filters["apartmentType"] = [apartment_type_mapping.get(apartment_typ, apartment_typ)]
+        filters["apartmentType"] = [APARTMENT_TYPES.get(apartment_typ, apartment_typ)]
 
     if district is not None:
         district_i = str(district).strip().title()  # مقدار را به رشته تبدیل کن
 
-        district_mapping = {
-            'Masdar City': 340, 'Meydan': 133, 'Wadi AlSafa 2': 146, 'Wadi AlSafa 5': 246, 'Alamerah': 279,
-            'JVC': 243, 'Remraam': 284, 'Aljadaf': 122, 'Liwan': 294, 'Arjan': 201, 'Dubai Creek Harbour': 152,
-            'Damac Lagoons': 259, 'Dubai Downtown': 143, 'Muwaileh': 304, 'Palm Jumeirah': 134, 'Business Bay': 252,
-            'City Walk': 228, 'Emaar South': 354, 'Dubai Production City': 217, 'Nadd Al Shiba': 355, 'Dubai Hills': 241,
-            'Jabal Ali Industrial Second': 131, 'AlYelayiss 2': 162, 'Town Square Dubai': 275, 'Majan': 231, 'Ramhan Island': 315,
-            'AlKifaf': 167, 'Alyasmeen': 310, 'Sports City': 203, 'Mbr District One': 319, 'Alraha': 352, 'Damac Hills 2': 213,
-            'Wadi AlSafa 4': 189, 'Expo City': 292, 'Almarjan Island': 297, 'Zaabeel Second': 120, 'Yas Island': 303,
-            'Zayed City': 295, 'Port Rashid': 378, 'Alhamra Island': 278, 'Jabal Ali First': 130, 'Dubai Land Residence Complex': 307,
-            'Reem Island': 298, 'Dubai Investment Park': 156, 'The Oasis': 363, 'Alheliow1': 311, 'Dubai South': 328, 'The Valley': 361,
-            'JVT': 244, 'Rashid Yachts and Marina': 383, 'Golf City': 266, 'Jebel Ali Village': 345, 'Alhudayriyat Island': 365,
-            'Damac Hills': 210, 'Alzorah': 364, 'Alfurjan': 346, 'Discovery Gardens': 235, 'Dubai Islands': 233, 'Alsatwa': 273,
-            'Dubai Motor City': 124, 'Palm Jabal Ali': 161, 'Saadiyat Island': 296, 'Dubai Marina': 239, 'Dubai Industrial City': 308,
-            'Mina Alarab': 293, 'Sobha Hartland': 332, 'Alwasl': 141, 'Bluewaters Bay': 286, 'JLT': 212, 'World Islands': 247,
-            'Mirdif': 163, 'Jumeirah Island One': 150, 'City Of Arabia': 236, 'Alreem Island': 264, 'Almaryah': 337,
-            'Albarsha South': 341, 'Aljada': 327, 'International City Phase (2)': 309, 'Alshamkha': 362, 'Ghaf Woods': 389,
-            'Hamriya West': 353, 'Al Yelayiss 1': 397, 'Al Tay': 343, 'Studio City': 316, 'Maryam Island': 314, 'Rukan Community': 414,
-            'Madinat Jumeirah Living': 285, 'Dubai Maritime City': 216, 'Wadi Al Safa 7': 261, 'Alzahya': 312, 'Jumeirah Park': 317,
-            'Bukadra': 349, 'Alsafouh Second': 407, 'Dubai Sports City': 342, 'Al Barsha South Second': 409, 'Mohammed Bin Rashid City': 318,
-            'Jumeirah 2': 334, 'Uptown, AlThanyah Fifth': 220, 'Wadi AlSafa 3': 187, 'Jumeirah Heights': 402, 'Dubai Silicon Oasis': 245,
-            'Dubai Design District': 230, 'Tilal AlGhaf': 199, 'Albelaida': 280, 'Jumeirah Beach Residence': 375, 'Dubai International Financial Centre (DIFC)': 333,
-            'Dubai Water Canal': 387, 'Al Barsha 1': 400, 'Alwadi Desert': 406, 'Jumeirah Golf Estates': 291, 'Warsan Fourth': 249,
-            'Meydan D11': 404, 'Nad Alsheba 1': 413, 'Aljurf': 359, 'MBR City D11': 368, 'International City': 248,
-            'Alrashidiya 1': 386, 'Free Zone': 367, 'Dubai Internet City': 398, 'Khalifa City': 357, 'Ghantoot': 358,
-            'Alnuaimia 1': 392, 'Alhamriyah': 415, 'Barsha Heights': 385, 'Ajmal Makan City': 276, 'Motor City': 326,
-            'Legends': 412, 'Sharm': 374, 'AlSafouh First': 125, 'Barashi': 305, 'Al Maryah Island': 399, 'Jumeirah Garden City': 356,
-            'Dubai Investment Park 2': 366, 'Sheikh Zayed Road, Alsafa': 263, 'Dubai Land': 417, 'Madinat Almataar': 250,
-            'Emaar Beachfront': 391, 'Dubai Harbour': 242, 'Alheliow2': 313, 'Alsuyoh Suburb': 324, 'Tilal': 325,
-            'Almuntazah': 339, 'Alrashidiya 3': 321, 'Alsafa': 268, 'Almamzar': 306, 'Sobha Hartland 2': 408, 'Siniya Island': 360,
-            'Ras AlKhor Ind. First': 257, 'Albarari': 418, 'Alwaha': 416, 'Dubai Science Park': 351, 'Ain Al Fayda': 369,
-            'Marina': 336, 'Dubai Healthcare City': 238, 'Trade Center First': 148, 'Damac Islands': 394,
-            'The Heights Country Club': 396, 'Al Yelayiss 5': 411, 'Hayat Islands': 283, 'Mina AlArab, Hayat Islands': 282,
-            'Dubai Media City': 258, 'Al Khalidiya': 382, 'AlBarsha South Fourth': 301, 'Alrahmaniya': 390, 'AlBarsha South Fifth': 123,
-            "AlFaqa'": 329, 'Raha Island': 347
-            
-        }
-
-        best_match, score = process.extractOne(district_i, district_mapping.keys())
+        best_match, score = DISTRICTS.extract_one(district_i)
         print(f"📌 بهترین تطابق fuzzy: {best_match} (امتیاز: {score})")  # نمایش اطلاعات برای دیباگ
             
         if score > 70:  # **اگر دقت بالای ۷۰٪ بود، مقدار را قبول کن**
@@ -1830,111 +1559,14 @@ def find_price(district=None, bedrooms=None, apartment_typ=None, max_area= None,
             # facilities_list = [facilities_list]  # تبدیل رشته به لیست تک‌عضوی
             facilities_list = [x.strip() for x in facilities_list.split(",") if x.strip()]
         
-        facilities_mapping = {
-                "24 hour security": "408",
-                "24/7 Security and Maintenance Services": "399",
-                "Access Control System": "314",
-                "Air Fitness zones": "570",
-                "Art Garden": "510",
-                "BBQ Area": "21",
-                "Baby Care Centre": "163",
-                "Badminton Court": "100",
-                "Balcony": "76",
-                "Basketball Court": "427",
-                "Basketball Playground": "10",
-                "Beach": "387",
-                "Beach Club": "595",
-                "Beauty Saloon": "106",
-                "Bicycle parking": "348",
-                "Bike Paths": "52",
-                "Bike tracks": "458",
-                "Bocce Play Area": "525",
-                "Broadband Internet": "46",
-                "Building Management System": "325",
-                "Business Centre": "175",
-                "CCTV Surveillance": "313",
-                "Cabana Seating": "88",
-                "Cafe": "184",
-                "Central A/C & Heating": "47",
-                "Changing Room and Locker": "533",
-                "Chess Board": "97",
-                "Children's Play Area": "6",
-                "Children's Swimming Pool": "7",
-                "Cinema": "19",
-                "Clinic": "279",
-                "Close Circuit TV System": "323",
-                "Club House": "226",
-                "Co-Working Spaces": "221",
-                "Community hubs": "460",
-                "Concierge Service": "37",
-                "Covered Parking": "31",
-                "Cricket Pitch": "95",
-                "Cycling Track": "276",
-                "Direct Beach Access": "96",
-                "Dog Park": "363",
-                "Electric Vehicle Charging Stations": "229",
-                "Fitness Area": "424",
-                "Fitness Club": "50",
-                "Fitness studio": "397",
-                "Football Playground": "9",
-                "Games Lounge Room": "269",
-                "Garden": "11",
-                "Gym": "334",
-                "Gymnasium": "454",
-                "Health Club": "102",
-                "Hospital": "368",
-                "Jogging Track": "105",
-                "Kids Pool": "381",
-                "Kids Swimming Pool": "452",
-                "Laundry Room": "107",
-                "Library": "87",
-                "Mall": "111",
-                "Meeting Rooms": "369",
-                "Mini Golf": "96",
-                "Mosque": "204",
-                "Music Room": "268",
-                "Nursery": "217",
-                "Outdoor Gym": "26",
-                "Padel Tennis": "467",
-                "Park": "54",
-                "Parking": "405",
-                "Pet Shop": "281",
-                "Pharmacy": "57",
-                "Play Area": "425",
-                "Playground": "319",
-                "Pool Deck": "415",
-                "Private Cinema For Each Unit": "364",
-                "Private Parking for Each unit": "484",
-                "Security": "40",
-                "SPA": "43",
-                "Sauna": "13",
-                "Sauna & Steam Room": "144",
-                "School": "49",
-                "Shared Outdoor Swimming Pool": "20",
-                "Skate Park": "428",
-                "Smart Homes": "378",
-                "Squash Courts": "209",
-                "Supermarket": "56",
-                "Swimming Pool": "74",
-                "Tennis Playground": "8",
-                "Theater": "19",
-                "VR Game Room": "382",
-                "Water Fountain": "356",
-                "Veterinary Clinic": "280",
-                "Yoga": "167",
-                "Zen Garden": "511",
-                "Kids Club": "331",
-                "Safe & Secure": "529"
-        }
-
         if isinstance(facilities_list, list):  # بررسی اینکه ورودی یک لیست باشد
             mapped_facilities = []
 
             for facility in facilities_list:
-                best_match, score = process.extractOne(facility.strip(), facilities_mapping.keys())
+                best_match, score = FACILITIES.extract_one(facility.strip())
 
                 if score > 70:  # **فقط اگر دقت بالای ۷۰٪ بود، مقدار را قبول کن**
-                    mapped_facilities.append(facilities_mapping[best_match])
+                    mapped_facilities.append(FACILITIES[best_match])
 
             if mapped_facilities:  # **اگر امکاناتی پیدا شد، به `filters` اضافه شود**
                 filters["facilities"] = mapped_facilities
@@ -1947,84 +1579,14 @@ def find_price(district=None, bedrooms=None, apartment_typ=None, max_area= None,
         if isinstance(developer_list, str):
             developer_list = [developer_list]  # تبدیل رشته به لیست تک‌عضوی
 
-        developer_mapping = {
-            "Burtville Developments": 330, "Sobha": 3, "Tiger Properties": 103, "Azizi": 37, "Meraas": 70,
-            "Dubai Properties": 258, "Confident Group": 308, "Iman Developers": 61, "EMAAR": 2, "Shapoorji Pallonji": 91,
-            "Arada Properties": 35, "Ellington Properties": 50, "Select Group": 85, "Nshama": 76, "Arenco Real Estate": 398,
-            "Rijas Aces Property": 233, "Wasl": 109, "London Gate": 264, "Nakheel": 74, "GFH": 60,
-            "Expo City": 54, "AYS Developments": 36, "Imtiaz": 87, "Park Group": 366, "Prestige One": 80,
-            "Almazaya Holding": 68, "Samana Developers": 83, "Aldar": 32, "Bloom Holding": 270, "AG Properties": 317,
-            "Swank Development": 393, "Binghatti": 38, "Divine One Group": 311, "Emirates properties": 267,
-            "Dubai South": 323, "Pearlshire Developments": 329, "Gulf Land": 239, "Radiant": 269, "Modon Properties": 394,
-            "Oro24": 241, "Alzorah Development": 383, "Algouta Properties": 380, "Naseeb Group": 265, "GJ Properties": 326,
-            "Amwaj Development": 348, "Grid properties": 296, "Aqua Properties": 34, "SRG Holding": 95,
-            "Roya Lifestyle Developments": 338, "Omniyat": 77, "Aqasa Developers": 333, "Zimaya Properties": 392,
-            "Amali Properties": 341, "Credo": 324, "AAF Development": 409, "Dalands Developer": 427,
-            "The Heart of Europe": 101, "HRE Development": 399, "Lootah": 65, "AJ Gargash Real Estate": 465, "Damac": 318,
-            "Townx Real Estate": 105, "Symbolic": 97, "Nabni developments": 294, "Deyaar": 45, "Citi Developers": 283,
-            "Mashriq Elite": 332, "IFA Hotels & Resorts": 486, "Q Properties": 408, "ARAS Real Estate": 293,
-            "East & West Properties": 49, "H&H": 315, "Laya": 238, "Leos": 240, "Reportage": 232, "Empire Development": 52,
-            "Object 1": 237, "KASCO Development": 433, "Esnad Management": 421, "Majid Al Futtaim Group": 111,
-            "Signature D T": 203, "Sol Properties": 94, "Luxe Developer": 327, "Dugasta": 276, "Avelon Developments": 287,
-            "Rokane": 417, "LMD Real Estate": 227, "Source of Fate": 434, "Vision developments": 390,
-            "Peace Homes Development": 250, "JRP Development": 410, "MAG": 242, "Riviera Group": 298, "Durar": 320,
-            "Meraki Developers": 71, "Uniestate Properties": 107, "Eagle Hills": 299, "IRTH": 372,
-            "Amaya Properties LLC": 413, "Ajmal Makan": 260, "Siroya Ventures Realty L.L.C": 445, "HMB": 247,
-            "Enso Development": 403, "Marquis Point": 274, "Meteora": 278, "Vincitore": 108, "Taraf": 100,
-            "ADE Properties": 446, "Baccarat": 370, "Condor Group": 41, "Rabdan": 289, "Pure Gold": 256,
-            "Saas Properties": 300, "Dubai Invesment": 254, "Swiss Properties": 96, "Beyond": 443, "Green Group": 346,
-            "Mubadala": 468, "Main Realty": 334, "Danube Properties": 42, "Ambs Real Estate": 360, "MeDoRe": 255,
-            "Heilbronn Properties": 339, "Maaia Developments": 517, "Ginco Properties": 374, "Qube Development": 354,
-            "Orange": 303, "Alseeb Real Estate Development": 442, "Peak Summit Real Estate Development": 350,
-            "Regent Developers": 501, "Mr. Eight Development": 430, "BnW Developments": 382, "Tuscany Real Estate Development": 396,
-            "RAK Properties": 245, "Siadah International Real Estate": 406, "One Development": 425, "AHS Properties": 319,
-            "ARIB Developments": 389, "Segrex": 284, "DIFC": 502, "DarGlobal": 44, "Fortune 5": 58,
-            "Green Yard Properties": 412, "Ahmadyar Developments": 375, "Sankari Properties": 310, "Alta Real Estate Development": 491,
-            "Sama Ezdan": 205, "Stamn Development": 440, "Kamdar developments": 470, "BT Properties": 507, "IGO": 259,
-            "Orra Real Estate": 204, "Five Holdings": 56, "Karma": 62, "Almarwan Developments": 458,
-            "Khamas Group Of Investment Co's": 363, "Imkan": 371, "LAPIS Properties": 419, "Liv Developers": 64,
-            "S&S Real Estate": 499, "Fakhruddin Properties": 55, "Saba Property Developers": 416, "Majid Developments": 401,
-            "HVM Living": 484, "Golden Wood": 407, "EL Prime Properties": 431, "Wellcube.life": 395,
-            "Mubarak Al Beshara Real Estate Development": 420, "Dar Alkarama": 43, "Palma Holding": 340,
-            "Vantage Properties": 469, "Shurooq Development": 435, "Vakson Real Estate": 358, "Tasmeer Indigo Properties": 352,
-            "Acube Developments": 309, "Mada'in": 154, "Anax Developments": 301, "API": 455, "Alhamra": 351,
-            "AB Developers": 367, "Tarrad Real Estate": 451, "Esnaad": 302, "4 Direction Developers": 508,
-            "Alzarooni Development": 444, "Alma Developments": 500, "Reef Luxury Development": 424,
-            "Blanco Thornton Properties": 402, "Amaal": 498, "Wahat Al Zaweya": 397, "Alef Group": 273,
-            "One Yard": 200, "AAA Development": 441, "Ohana Developments": 369, "Forum Real Estate": 387,
-            "Nine Development": 411, "Nine Yards Development": 494, "Mira Developments": 282, "MAK Developers": 415,
-            "MS Homes": 376, "Crystal Bay Development": 377, "Galaxy": 379, "Advanced Properties": 268,
-            "City View Developments": 391, "Svarn": 368, "Centurion Developers": 464, "Union Properties": 364,
-            "Wellington Developments": 497, "Seven Mayfair Real Estate": 515, "DV8 Developers": 423, "Zenith Group": 513,
-            "AlMadar Investment L.L.C": 428, "Abou Eid Real Estate": 252, "Asak Real Estate": 485,
-            "Alhabtoor Group": 28, "Mill Hill Developer": 488, "Alaia Developments": 505, "True Future Development": 495,
-            "ARTE Development": 432, "Time Properties": 104, "GFS Builders & Developers": 471, "Zoya Developments": 386,
-            "Evera Real Estate Development": 467, "77 Shades of Green": 448, "BNH Real Estate Developer": 429,
-            "Oksa Developer": 475, "Alhelal Al zahaby": 452, "Kingdom Properties": 456, "Aark Developers": 26,
-            "Januss Developers": 447, "Grovy Real Estate": 210, "Range Developments": 479, "Matrix developments": 483,
-            "Shoumous": 261, "Lucky Aeon": 66, "Meydan": 422, "Pantheon Development": 78, "DMCC": 388,
-            "Arista Properties": 321, "DHG Properties": 295, "World Of Wonders": 291, "PMR Property": 450,
-            "Major Development’s": 292, "Takmeel Real Estate": 314, "Urban Properties": 385, "Emerald Palace Group": 51,
-            "Metac Properties L.L.C": 23, "Skyline Builders": 285, "Prescott": 357, "Vantage Ventures": 490,
-            "Zane Development": 481, "Yas Developers": 463, "Amirah Developments": 482, "Elysian Properties": 454,
-            "Nexus Developer": 449, "Hayaat Developments": 512, "Lincoln Star Real Estate": 466, "Arsenal East": 473,
-            "Laraix Developers": 511, "Aqaar": 305, "Baraka Development": 304, "Keymavens development": 345,
-            "The 100": 359, "Manam Real Estate Development": 438, "Almarina Holding": 474, "Dia Properties": 518,
-            "Iraz Developments": 335, "Seven Tides": 89, "Albait Alduwaliy Real Estate": 355,
-            "Palladium Development": 356, "Tabeer Developments": 98, "Lacasa Living": 477, "Wow Resorts": 405,
-            "Revolution": 342, "ABA Group": 336, "Cirrera Development": 516, "SOHO Development": 344,
-            "Signature Developers": 426, "Pinnacle Developers": 437, "BAMX Development": 519, "Mered": 288,
-            "AiZN Development": 404, "Octa Properties": 277, "Premier Choice": 520
-        }
-
         if isinstance(developer_list, list):  # بررسی اینکه ورودی یک لیست باشد
             mapped_developers = []
 
             for developer in developer_list:
-                best_match, score = process.extractOne(developer.strip(), developer_mapping.keys())
+                best_match, score = DEVELOPERS.extract_one(developer.strip())
 
                 if score > 70:  # **فقط اگر دقت بالای ۷۰٪ بود، مقدار را قبول کن**
-                    mapped_developers.append(developer_mapping[best_match])
+                    mapped_developers.append(DEVELOPERS[best_match])
 
             if mapped_developers:  # **اگر شرکت‌هایی پیدا شدند، به `filters` اضافه شود**
                 filters["developer_company_id"] = mapped_developers
@@ -2060,8 +1622,6 @@ def find_price(district=None, bedrooms=None, apartment_typ=None, max_area= None,
     print(filters)
     # logging.info(f"filter find price: {filters}")
     # اضافه کردن فیلتر برای قیمت
-    properties = filter_properties(filters)
-
     if delivery_date is not None:
         try:
             user_date = delivery_date.strip()
@@ -2081,46 +1641,51 @@ def find_price(district=None, bedrooms=None, apartment_typ=None, max_area= None,
             print(f"❌ خطا در پردازش تاریخ: {e}")
             delivery_date = None  
 
-    if delivery_date is not None:
-        target_year = delivery_date  # سال موردنظر کاربر
-        start_of_year = int(datetime(target_year, 1, 1).timestamp())  # تبدیل به یونیکس (ژانویه)
-        end_of_year = int(datetime(target_year, 12, 31, 23, 59, 59).timestamp())  # تبدیل به یونیکس (دسامبر)
-
-        properties = [
-            prop for prop in properties
-            if "delivery_date" in prop and prop["delivery_date"].isdigit() and 
-            start_of_year <= int(prop["delivery_date"]) <= end_of_year
-        ]
+    # ✅ اول از آرایه‌های مرتب قیمت هر (منطقه، اتاق‌خواب، نوع واحد) که در همگام‌سازی ساخته شده‌اند
+    answered, summary = inventory.price_summary(
+        filters, delivery_year=delivery_date, min_area=min_area, max_area=max_area
+    )
+    if answered:
+        print(f"⚡ رنج قیمت از آمار محلی: {summary.count if summary else 0} ملک")
+        if summary is None:
+            return "❌ متأسفانه هیچ ملکی پیدا نشد."
+        return format_price_summary(summary)
 
-        print(f"🔍 بعد از فیلتر بر اساس سال تحویل ({target_year}): {len(properties)}")
+    # ✅ فیلتر سال تحویل و مساحت همراه با بقیه فیلترها روی ستون‌های NumPy اجرا می‌شود
+    properties = await filter_properties(filters, delivery_year=delivery_date, min_area=min_area, max_area=max_area)
 
+    if delivery_date is not None:
+        print(f"🔍 بعد از فیلتر بر اساس سال تحویل ({delivery_date}): {len(properties)}")
 
     if min_area is not None or max_area is not None:
         min_val = min_area if min_area is not None else 0
         max_val = max_area if max_area is not None else float("inf")
-
-        properties = [
-            prop for prop in properties
-            if "min_area" in prop and prop["min_area"] is not None and isinstance(prop["min_area"], (int, float)) and
-            (min_val * 10.7639) <= float(prop["min_area"]) <= (max_val * 10.7639)
-        ]
-
-        print(f"📐 بعد از فیلتر بر اساس مساحت پروژه (sqft) بین {min_val * 10.7639} تا {max_val * 10.7639}: {len(properties)}")
+        print(f"📐 بعد از فیلتر بر اساس مساحت پروژه (sqft) بین {min_val * SQM_TO_SQFT} تا {max_val * SQM_TO_SQFT}: {len(properties)}")
 
     if not properties:
-        return f"❌ متأسفانه هیچ ملکی پیدا نشد."
+        return "❌ متأسفانه هیچ ملکی پیدا نشد."
 
-    # ✅ محاسبه رنج قیمت
-    prices = [prop.get("low_price", 0) for prop in properties if prop.get("low_price") is not None]
-        
-    if not prices:
-        return f"❌ متأسفانه اطلاعات قیمت موجود نیست."
+    # ✅ محاسبه رنج قیمت (چارک‌ها به جای فقط کمترین و بیشترین که با چند ملک استثنایی منحرف می‌شوند)
+    summary = summarize_properties(properties)
 
-    min_price = min(prices)
-    max_price = max(prices)
+    if summary is None:
+        return "❌ متأسفانه اطلاعات قیمت موجود نیست."
 
-    response = f"💰 رنج قیمت املاک با این مشخصات:\n- کمترین قیمت: {min_price} درهم\n- بیشترین قیمت: {max_price} درهم"
+    return format_price_summary(summary)
 
+
+def format_price_summary(summary):
+    """ متن پاسخ رنج قیمت از خلاصه آماری """
+    response = (
+        f"💰 رنج قیمت املاک با این مشخصات ({summary.count} ملک):\n"
+        f"- کمترین قیمت: {summary.min:,.0f} درهم\n"
+        f"- ۲۵٪ املاک زیر: {summary.p25:,.0f} درهم\n"
+        f"- قیمت میانه: {summary.median:,.0f} درهم\n"
+        f"- ۷۵٪ املاک زیر: {summary.p75:,.0f} درهم\n"
+        f"- بیشترین قیمت: {summary.max:,.0f} درهم"
+    )
+    if summary.per_sqft_median is not None:
+        response += f"\n- میانه قیمت هر فوت مربع: {summary.per_sqft_median:,.0f} درهم"
     return response
 
 
@@ -2135,27 +1700,9 @@ def clear_filter_memory(memory_state):
     for key in filter_keys:
         memory_state.pop(key, None)  # پاک کن اگه هست
 
-just_answered_questions = True
-
-async def real_estate_chatbot(user_message: str) -> str:
-    """ بررسی نوع پیام و ارائه پاسخ مناسب با تشخیص هوشمند """
-
-    print(f"📌  user message : {user_message}")
-    # logging.info(f"user_message: {user_message}")
-
-    global last_properties_list, current_property_index, memory_state, developer_mapping, facilities_mapping, just_answered_questions
-
-    # ✅ **۱. تشخیص اینکه پیام فقط یک سلام است یا سوالی در مورد ملک**
-    greetings = ["سلام", "سلام خوبی؟", "سلام چطوری؟", "سلام وقت بخیر", "سلام روزت بخیر"]
-    if user_message.strip() in greetings:
-        return random.choice([
-            "سلام! من اینجا هستم که به شما در خرید ملک کمک کنم 😊 اگر سوالی در مورد املاک دارید، بفرمایید.",
-            "سلام دوست عزیز! به چت‌بات مشاور املاک خوش آمدید. چطور می‌توانم کمکتان کنم؟ 🏡",
-            "سلام! اگر به دنبال خرید یا سرمایه‌گذاری در املاک دبی هستید، من راهنمای شما هستم!",
-        ])
-
-    # ✅ **۲. استفاده از هوش مصنوعی برای تشخیص نوع درخواست کاربر**
-    prompt = f"""
+def intent_classification_rules(user_message, memory_state, memory_district):
+    """ پرامپت تشخیص نوع پیام کاربر (بدون بخش قالب خروجی) """
+    return f"""
     کاربر در حال مکالمه با یک مشاور املاک در دبی به زبان فارسی است. پیام زیر را تجزیه و تحلیل کن:
 
     "{user_message}"
@@ -2371,8 +1918,12 @@ async def real_estate_chatbot(user_message: str) -> str:
 
 
     ** اگر پیام مربوط به درخواست جستجوی ملک است، بررسی کن آیا کاربر جزئیات قبلی (مانند منطقه، قیمت و نوع ملک) را تغییر داده یا یک درخواست جدید داده است.**
+    """
 
 
+async def classify_message(user_message, memory_state, memory_district):
+    """ تشخیص نوع پیام با یک فراخوانی جداگانه (حالت دو مرحله‌ای قدیمی) """
+    prompt = intent_classification_rules(user_message, memory_state, memory_district) + """
     **خروجی فقط یک JSON شامل دو مقدار باشد:**  
     - `"type"`: یکی از گزینه‌های `search`, `market`, `buying_guide`, `details`, `more`, `unknown`  
     - `"detail_requested"`: اگر `details` باشد، مقدار `price`, `features`, `location`, `payment` باشد، وگرنه مقدار `null` باشد.
@@ -2380,29 +1931,126 @@ async def real_estate_chatbot(user_message: str) -> str:
 
     """
 
-    ai_response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "system", "content": prompt}],
-        max_tokens=50
-    )
+    try:
+        completion = await parse_structured("classify", prompt, IntentDecision, max_tokens=CLASSIFY_MAX_TOKENS)
+    except STRUCTURED_OUTPUT_ERRORS as e:
+        print(f"⚠️ خطا در تشخیص نوع پیام: {e}")
+        return None
 
+    decision = completion.choices[0].message.parsed
+    print(f"🔍 پاسخ OpenAI: {decision}")
+    # logging.info(f"message type: {decision}")
+    return decision.model_dump() if decision is not None else None
 
-# ✅ استخراج پاسخ هوش مصنوعی
-    response_content = ai_response.choices[0].message.content.strip()
-    print(f"🔍 پاسخ OpenAI: {response_content}")
-    # logging.info(f"message type: {response_content}")
+
+async def classify_and_extract(user_message, memory_state, memory_district):
+    """ تشخیص نوع پیام و استخراج فیلترهای جستجو در یک فراخوانی با خروجی ساخت‌یافته """
+    prompt = intent_classification_rules(user_message, memory_state, memory_district) + """
+    ---
+    ### **🔎 استخراج فیلترهای جستجو در همین پاسخ**
+    اگر نوع پیام یکی از `search`، `search_no_bedroom`، `availability_check`، `district_search` یا `property_price` است، فیلترهای جستجو را از پیام کاربر (و اطلاعات قبلی مکالمه در بالا) طبق قوانین زیر استخراج کن و در `filters` قرار بده. در غیر این صورت مقدار `filters` را `null` بگذار.
+    """ + filter_extraction_rules() + """
+    **خروجی:**
+    - `"type"`: نوع پیام طبق دسته‌های بالا
+    - `"detail_requested"`: اگر `details` باشد، مقدار `price`, `features`, `location`, `payment` باشد، وگرنه مقدار `null` باشد.
+    - `"reset"`: `true` اگر کاربر درخواست ریست داده باشد، و `false` در غیر این صورت.
+    - `"filters"`: فیلترهای استخراج‌شده یا `null`
+    """
 
     try:
-        if response_content.startswith("```json"):
-            response_content = response_content.replace("```json", "").replace("```", "").strip()
+        completion = await parse_structured(
+            "classify_extract", prompt, IntentWithFilters, max_tokens=CLASSIFY_EXTRACT_MAX_TOKENS
+        )
+        decision = completion.choices[0].message.parsed
+    except STRUCTURED_OUTPUT_ERRORS as e:
+        print(f"⚠️ خطا در فراخوانی ترکیبی، بازگشت به حالت دو مرحله‌ای: {e}")
+        decision = None
 
-        # ✅ حالا مقدار پردازش شده را نمایش می‌دهیم
-        print(f"✅ پاسخ OpenAI بعد از پردازش: {response_content}")
+    if decision is None:
+        # ✅ اگر خروجی ساخت‌یافته نرسید، همان مسیر قبلی (تشخیص نوع + استخراج جداگانه) اجرا می‌شود
+        return await classify_message(user_message, memory_state, memory_district), None
 
-        # ✅ تبدیل به JSON
-        parsed_response = json.loads(response_content)
-        
-    except json.JSONDecodeError:
+    print(f"✅ پاسخ ترکیبی OpenAI: {decision}")
+
+    filters = None
+    if decision.type in FILTER_INTENTS and decision.filters is not None:
+        filters = decision.filters.model_dump()
+
+    parsed_response = {
+        "type": decision.type,
+        "detail_requested": decision.detail_requested,
+        "reset": decision.reset,
+    }
+    return parsed_response, filters
+
+
+# پاسخ وقتی یکی از فراخوانی‌های مدل در مهلتش جواب نداد
+LLM_TIMEOUT_MESSAGE = "⏳ پاسخ‌گویی بیش از حد معمول طول کشید. لطفاً چند لحظه بعد دوباره امتحان کنید."
+
+# ✅ تعداد پیام‌هایی که به خاطر تایم‌اوت مدل (به تفکیک محل فراخوانی) با پیام «دوباره امتحان کنید» جواب گرفتند
+timeout_replies = {}
+
+
+async def real_estate_chatbot(state, user_message: str) -> str:
+    """ پاسخ پیام کاربر؛ تایم‌اوت هر فراخوانی مدل (جزئیات، مقایسه، خرید و ...) به پیام «دوباره امتحان کنید» تبدیل می‌شود """
+    try:
+        return await answer_message(state, user_message)
+    except LLMTimeoutError as e:
+        print(f"⏳ تایم‌اوت مدل: {e}")
+        timeout_replies[e.site] = timeout_replies.get(e.site, 0) + 1
+        # اگر بخشی از پاسخ استریم شده، پیام خطا هم به صورت تکه ارسال می‌شود
+        stream_chunk(state, LLM_TIMEOUT_MESSAGE)
+        return LLM_TIMEOUT_MESSAGE
+
+
+async def answer_message(state, user_message: str) -> str:
+    """ بررسی نوع پیام و ارائه پاسخ مناسب با تشخیص هوشمند """
+
+    print(f"📌  user message : {user_message}")
+    # logging.info(f"user_message: {user_message}")
+
+    # ✅ وضعیت مکالمه همین کاربر (به جای متغیرهای سراسری)
+    memory_state = state.memory_state
+    memory_district = state.memory_district
+    types = state.types
+    property_name_to_id = state.property_name_to_id
+    just_answered_questions = state.just_answered_questions
+
+    # ✅ **۱. تشخیص اینکه پیام فقط یک سلام است یا سوالی در مورد ملک**
+    if intent_router.is_greeting(user_message):
+        return random.choice([
+            "سلام! من اینجا هستم که به شما در خرید ملک کمک کنم 😊 اگر سوالی در مورد املاک دارید، بفرمایید.",
+            "سلام دوست عزیز! به چت‌بات مشاور املاک خوش آمدید. چطور می‌توانم کمکتان کنم؟ 🏡",
+            "سلام! اگر به دنبال خرید یا سرمایه‌گذاری در املاک دبی هستید، من راهنمای شما هستم!",
+        ])
+
+    # ✅ **۲. استفاده از هوش مصنوعی برای تشخیص نوع درخواست کاربر**
+    # در حالت ترکیبی، فیلترهای جستجو هم در همین فراخوانی استخراج می‌شوند
+    original_message = user_message
+    prefetched_filters = None
+    parsed_response = intent_router.route(user_message, memory_state, state.numbered_properties)
+    if parsed_response is not None:
+        print(f"⚡ تشخیص سریع بدون مدل: {parsed_response}")
+    else:
+        parsed_response = intent_cache.get(user_message, memory_state) if intent_cache is not None else None
+        if parsed_response is not None:
+            print(f"⚡ تشخیص از کش: {parsed_response}")
+        else:
+            # ✅ قوانین استخراج فیلتر (حدود ۲۰ هزار کاراکتر) فقط وقتی فرستاده می‌شود که پیام احتمالاً جستجوست؛
+            # بقیه پیام‌ها فقط تشخیص نوع (حدود ۱۳ هزار کاراکتر) دارند و اگر جستجو بودند extract_filters جدا اجرا می‌شود
+            combined = INTENT_EXTRACTION_MODE == "combined" and intent_router.filter_intent_likely(user_message, memory_state)
+            if combined:
+                parsed_response, prefetched_filters = await classify_and_extract(user_message, memory_state, memory_district)
+            else:
+                parsed_response = await classify_message(user_message, memory_state, memory_district)
+
+            # در حالت ترکیبی فیلترهای استخراج‌شده به مقادیر حافظه وابسته‌اند، پس نوع‌های جستجو کش نمی‌شوند
+            # (برای آن‌ها همان یک فراخوانی ترکیبی لازم است)
+            cacheable = not combined or (parsed_response or {}).get("type") not in FILTER_INTENTS
+            if intent_cache is not None and cacheable:
+                intent_cache.put(user_message, memory_state, parsed_response)
+
+    if parsed_response is None:
         return "متوجه نشدم که به دنبال چه چیزی هستید. لطفاً واضح‌تر بگویید که دنبال ملک هستید یا اطلاعات بیشتری درباره ملکی می‌خواهید."
 
     response_type = parsed_response.get("type", "unknown")
@@ -2439,6 +2087,7 @@ async def real_estate_chatbot(user_message: str) -> str:
             if reset_requested:
                 print("🔄 کاربر درخواست ریست داده است. پاک‌سازی حافظه و ادامه...")
                 clear_filter_memory(memory_state)
+                page_prefetcher.cancel(state.session_id)
                 response_type = types["previous_type"]
                 user_message = memory_state["pending_message"]
             
@@ -2459,6 +2108,11 @@ async def real_estate_chatbot(user_message: str) -> str:
         print("memory_edame", memory_state)
 
 
+    # ✅ اگر پیام در انتظار جایگزین پیام فعلی شد، فیلترهای استخراج‌شده دیگر معتبر نیستند
+    if user_message != original_message:
+        prefetched_filters = None
+
+
     #----------------------------------------- memory newest logic   
     print("message_type_ghable_soal", message_type)
     print("has_active_filters", has_active_filters)
@@ -2477,6 +2131,7 @@ async def real_estate_chatbot(user_message: str) -> str:
         if reset_requested:
             print("🔄 کاربر درخواست ریست داده است. پاک‌سازی حافظه...")
             clear_filter_memory(memory_state)
+            page_prefetcher.cancel(state.session_id)
             # memory_state.clear()  # 🚀 حافظه را ریست کن
             return "✅ فیلترهای قبلی حذف شدند. لطفاً جستجوی جدیدی را شروع کنید. 😊"
 
@@ -2488,36 +2143,35 @@ async def real_estate_chatbot(user_message: str) -> str:
     # ✅ **۳. تشخیص درخواست اطلاعات بیشتر درباره املاک قبلاً معرفی‌شده**
     if "details" in response_type.lower():
     # ✅ استخراج شماره یا نام ملک از پیام کاربر
-        property_id = await extract_property_identifier(user_message, property_name_to_id)
+        property_id = await extract_property_identifier(user_message, property_name_to_id, state.numbered_properties)
         print(f"📌 مقدار property_identifier استخراج‌شده: {property_id}")
 
-        global last_property_id
         if property_id is None:
-            if last_property_id is not None:
-                property_id = last_property_id  # استفاده از ملک قبلی
+            if state.last_property_id is not None:
+                property_id = state.last_property_id  # استفاده از ملک قبلی
                 print(f"ℹ️ استفاده از آخرین ملک پرسیده‌شده: {property_id}")
             else:
                 return "❌ لطفاً شماره یا نام ملک را مشخص کنید."
 
         # ✅ ذخیره این ملک به عنوان آخرین ملکی که درباره‌اش سوال شده است
-        last_property_id = property_id
+        state.last_property_id = property_id
 
-        return generate_ai_details(property_id, detail_type=detail_requested)
+        return await generate_ai_details(state, property_id, detail_type=detail_requested)
 
     
     if "compare" in response_type.lower():
-        return await compare_properties(user_message)
+        return await compare_properties(state, user_message)
     
     if "purchase" in response_type.lower():
         detail_requested = None  # مقدار detail_requested را خالی کن
-        return await process_purchase_request(user_message)   
+        return await process_purchase_request(state, user_message)   
     
     if "district_search" in response_type.lower():
-        extracted_data = extract_filters(user_message, memory_state)
+        extracted_data = await extract_filters(user_message, memory_state, prefetched=prefetched_filters)
 
         if extracted_data.get("questions_needed"):
             memory_state["asked_questions"] = extracted_data["questions_needed"] 
-        just_answered_questions = memory_state.get("asked_questions") and not extracted_data.get("questions_needed")
+        just_answered_questions = state.just_answered_questions = memory_state.get("asked_questions") and not extracted_data.get("questions_needed")
         if just_answered_questions:
             memory_state.pop("asked_questions", None)
 
@@ -2536,7 +2190,8 @@ async def real_estate_chatbot(user_message: str) -> str:
         guarantee_rental = extracted_data.get("guarantee_rental_guarantee")
 
 
-        return find_districts_by_budget(
+        return await find_districts_by_budget(
+        state,
         max_price=max_price, 
         min_price=min_price, 
         min_area=min_area,
@@ -2554,7 +2209,10 @@ async def real_estate_chatbot(user_message: str) -> str:
 
 
     if "more" in response_type.lower():
-        return await generate_ai_summary(last_properties_list, start_index=current_property_index)
+        # ✅ بعد از ری‌استارت سرور، نتیجه جستجوی قبلی این مکالمه از دیسک خوانده می‌شود
+        if state.result_set is None and result_sets is not None:
+            state.result_set = await result_sets.load(state.session_id)
+        return await generate_ai_summary(state, state.result_set)
     
     if "buying_guide" in response_type.lower():
         return await fetch_real_estate_buying_guide(user_message)
@@ -2562,7 +2220,7 @@ async def real_estate_chatbot(user_message: str) -> str:
 
     # ✅ قسمت 2: در کد اصلی چک کردن نوع availability_check
     if "availability_check" in response_type.lower():
-        extracted_data = extract_filters(user_message, memory_state)  # تابعی که فیلترها رو از پیام درمیاره
+        extracted_data = await extract_filters(user_message, memory_state, prefetched=prefetched_filters)  # تابعی که فیلترها رو از پیام درمیاره
         
         if "questions_needed" in extracted_data:
             payment_question = "پرداخت قبل از تحویل باشد یا بعد از تحویل؟"
@@ -2572,7 +2230,7 @@ async def real_estate_chatbot(user_message: str) -> str:
 
         if extracted_data.get("questions_needed"):
             memory_state["asked_questions"] = extracted_data["questions_needed"] 
-        just_answered_questions = memory_state.get("asked_questions") and not extracted_data.get("questions_needed")
+        just_answered_questions = state.just_answered_questions = memory_state.get("asked_questions") and not extracted_data.get("questions_needed")
         if just_answered_questions:
             memory_state.pop("asked_questions", None)
 
@@ -2596,54 +2254,12 @@ async def real_estate_chatbot(user_message: str) -> str:
         if extracted_data.get("city") is not None:
             city_id = extracted_data["city"]  # مقدار را به رشته تبدیل کن
 
-            city_mapping = {
-            "Dubai": 6,
-            "Abu Dhabi": 9
-        }
-
-            filters["city_id"] = [city_mapping.get(city_id, city_id)]
+            filters["city_id"] = [CITIES.get(city_id, city_id)]
 
         if extracted_data.get("district"):
             district_i = str(extracted_data["district"]).strip().title()  # مقدار را به رشته تبدیل کن
 
-            district_mapping = {
-            'Masdar City': 340, 'Meydan': 133, 'Wadi AlSafa 2': 146, 'Wadi AlSafa 5': 246, 'Alamerah': 279,
-            'JVC': 243, 'Remraam': 284, 'Aljadaf': 122, 'Liwan': 294, 'Arjan': 201, 'Dubai Creek Harbour': 152,
-            'Damac Lagoons': 259, 'Dubai Downtown': 143, 'Muwaileh': 304, 'Palm Jumeirah': 134, 'Business Bay': 252,
-            'City Walk': 228, 'Emaar South': 354, 'Dubai Production City': 217, 'Nadd Al Shiba': 355, 'Dubai Hills': 241,
-            'Jabal Ali Industrial Second': 131, 'AlYelayiss 2': 162, 'Town Square Dubai': 275, 'Majan': 231, 'Ramhan Island': 315,
-            'AlKifaf': 167, 'Alyasmeen': 310, 'Sports City': 203, 'Mbr District One': 319, 'Alraha': 352, 'Damac Hills 2': 213,
-            'Wadi AlSafa 4': 189, 'Expo City': 292, 'Almarjan Island': 297, 'Zaabeel Second': 120, 'Yas Island': 303,
-            'Zayed City': 295, 'Port Rashid': 378, 'Alhamra Island': 278, 'Jabal Ali First': 130, 'Dubai Land Residence Complex': 307,
-            'Reem Island': 298, 'Dubai Investment Park': 156, 'The Oasis': 363, 'Alheliow1': 311, 'Dubai South': 328, 'The Valley': 361,
-            'JVT': 244, 'Rashid Yachts and Marina': 383, 'Golf City': 266, 'Jebel Ali Village': 345, 'Alhudayriyat Island': 365,
-            'Damac Hills': 210, 'Alzorah': 364, 'Alfurjan': 346, 'Discovery Gardens': 235, 'Dubai Islands': 233, 'Alsatwa': 273,
-            'Dubai Motor City': 124, 'Palm Jabal Ali': 161, 'Saadiyat Island': 296, 'Dubai Marina': 239, 'Dubai Industrial City': 308,
-            'Mina Alarab': 293, 'Sobha Hartland': 332, 'Alwasl': 141, 'Bluewaters Bay': 286, 'JLT': 212, 'World Islands': 247,
-            'Mirdif': 163, 'Jumeirah Island One': 150, 'City Of Arabia': 236, 'Alreem Island': 264, 'Almaryah': 337,
-            'Albarsha South': 341, 'Aljada': 327, 'International City Phase (2)': 309, 'Alshamkha': 362, 'Ghaf Woods': 389,
-            'Hamriya West': 353, 'Al Yelayiss 1': 397, 'Al Tay': 343, 'Studio City': 316, 'Maryam Island': 314, 'Rukan Community': 414,
-            'Madinat Jumeirah Living': 285, 'Dubai Maritime City': 216, 'Wadi Al Safa 7': 261, 'Alzahya': 312, 'Jumeirah Park': 317,
-            'Bukadra': 349, 'Alsafouh Second': 407, 'Dubai Sports City': 342, 'Al Barsha South Second': 409, 'Mohammed Bin Rashid City': 318,
-            'Jumeirah 2': 334, 'Uptown, AlThanyah Fifth': 220, 'Wadi AlSafa 3': 187, 'Jumeirah Heights': 402, 'Dubai Silicon Oasis': 245,
-            'Dubai Design District': 230, 'Tilal AlGhaf': 199, 'Albelaida': 280, 'Jumeirah Beach Residence': 375, 'Dubai International Financial Centre (DIFC)': 333,
-            'Dubai Water Canal': 387, 'Al Barsha 1': 400, 'Alwadi Desert': 406, 'Jumeirah Golf Estates': 291, 'Warsan Fourth': 249,
-            'Meydan D11': 404, 'Nad Alsheba 1': 413, 'Aljurf': 359, 'MBR City D11': 368, 'International City': 248,
-            'Alrashidiya 1': 386, 'Free Zone': 367, 'Dubai Internet City': 398, 'Khalifa City': 357, 'Ghantoot': 358,
-            'Alnuaimia 1': 392, 'Alhamriyah': 415, 'Barsha Heights': 385, 'Ajmal Makan City': 276, 'Motor City': 326,
-            'Legends': 412, 'Sharm': 374, 'AlSafouh First': 125, 'Barashi': 305, 'Al Maryah Island': 399, 'Jumeirah Garden City': 356,
-            'Dubai Investment Park 2': 366, 'Sheikh Zayed Road, Alsafa': 263, 'Dubai Land': 417, 'Madinat Almataar': 250,
-            'Emaar Beachfront': 391, 'Dubai Harbour': 242, 'Alheliow2': 313, 'Alsuyoh Suburb': 324, 'Tilal': 325,
-            'Almuntazah': 339, 'Alrashidiya 3': 321, 'Alsafa': 268, 'Almamzar': 306, 'Sobha Hartland 2': 408, 'Siniya Island': 360,
-            'Ras AlKhor Ind. First': 257, 'Albarari': 418, 'Alwaha': 416, 'Dubai Science Park': 351, 'Ain Al Fayda': 369,
-            'Marina': 336, 'Dubai Healthcare City': 238, 'Trade Center First': 148, 'Damac Islands': 394,
-            'The Heights Country Club': 396, 'Al Yelayiss 5': 411, 'Hayat Islands': 283, 'Mina AlArab, Hayat Islands': 282,
-            'Dubai Media City': 258, 'Al Khalidiya': 382, 'AlBarsha South Fourth': 301, 'Alrahmaniya': 390, 'AlBarsha South Fifth': 123,
-            "AlFaqa'": 329, 'Raha Island': 347
-            
-        }
-
-            best_match, score = process.extractOne(district_i, district_mapping.keys())
+            best_match, score = DISTRICTS.extract_one(district_i)
             print(f"📌 بهترین تطابق fuzzy: {best_match} (امتیاز: {score})")  # نمایش اطلاعات برای دیباگ
             
             if score > 70:  # **اگر دقت بالای ۷۰٪ بود، مقدار را قبول کن**
@@ -2652,7 +2268,7 @@ async def real_estate_chatbot(user_message: str) -> str:
             #     filters["district"] = district_i  # اگر تطابق نداشت، همان مقدار ورودی کاربر را نگه دار
 
             # if score > 70:  # اگر دقت بالای ۷۰٪ بود، مقدار را قبول کن
-            #     filters["district"] = [district_mapping[best_match]]
+            #     filters["district"] = [DISTRICTS[best_match]]
             # else:
             #     print(f"⚠️ نام منطقه '{district_i}' به هیچ منطقه‌ای تطابق نداشت!")
 
@@ -2660,39 +2276,8 @@ async def real_estate_chatbot(user_message: str) -> str:
         if extracted_data.get("bedrooms") is not None:
             bedrooms_count = str(extracted_data["bedrooms"]).strip().title()  # مقدار را به رشته تبدیل کن
 
-            bedrooms_mapping = {
-            "1": 10,
-            "1.5": 23,
-            "2": 11,
-            "2.5": 24,
-            "3": 12,
-            "3.5": 25,
-            "4": 13,
-            "4.5": 26,
-            "5": 14,
-            "5.5": 27,
-            "6": 15,
-            "6.5": 28,
-            "7": 16,
-            "7.5": 29,
-            "8": 17,
-            "9": 18,
-            "10": 19,
-            "11": 22,
-            "Studio": 9,       
-            "Penthouse": 34,   
-            "Retail": 31,      
-            "Office": 20,      
-            "Showroom": 35,    
-            "Store": 30,       
-            "Suite": 32,       
-            "Hotel Room": 33,   
-            "Full Floor": 36,  
-            "Land / Plot": 21  
-        }
-
             # مقدار `property_type` را به `id` تغییر بده
-            filters["apartments"] = [bedrooms_mapping.get(bedrooms_count, bedrooms_count)]
+            filters["apartments"] = [BEDROOMS.get(bedrooms_count, bedrooms_count)]
 
         if extracted_data.get("max_price") is not None:
             filters["max_price"] = extracted_data.get("max_price")
@@ -2715,45 +2300,16 @@ async def real_estate_chatbot(user_message: str) -> str:
             if isinstance(property_type_name, dict):
                 property_type_name = property_type_name.get("name", "")
 
-            # تبدیل نام انگلیسی به ID
-            property_type_mapping = {
-                "Residential": {"id": 20, "name": "Residential"},
-                "Commercial": {"id": 3, "name": "Commercial"}
-            }
-
             # مقدار `property_type` را به `id` تغییر بده
-            filters["property_type"] = property_type_mapping.get(property_type_name, property_type_name)
+            filters["property_type"] = PROPERTY_TYPES.get(property_type_name, property_type_name)
 
         # if extracted_data.get("property_type"):
         #     filters["property_type"] = extracted_data.get("property_type")
 
         if extracted_data.get("apartmentType") is not None:
             apartment_type = str(extracted_data["apartmentType"]).strip().title()  # تبدیل به فرمت استاندارد
-            # ✅ دیکشنری نگاشت نوع آپارتمان به `id`
-            apartment_type_mapping = {
-                "Apartment": 1,
-                "Building": 31,
-                "Duplex": 27,
-                "Full Floor": 4,
-                "Hotel": 32,
-                "Hotel Apartment": 8,
-                "Land / Plot": 6,
-                "Loft": 34,
-                "Office": 7,
-                "Penthouse": 10,
-                "Retail": 33,
-                "Shop": 29,
-                "Show Room": 30,
-                "Store": 25,
-                "Suite": 35,
-                "Townhouse": 9,
-                "Triplex": 28,
-                "Villa": 3,
-                "Warehouse": 26
-            }
-
             # ✅ تبدیل مقدار `property_type` به `id` معادل آن
-            filters["apartmentType"] = [apartment_type_mapping.get(apartment_type, apartment_type)]
+            filters["apartmentType"] = [APARTMENT_TYPES.get(apartment_type, apartment_type)]
 
 
 
@@ -2812,84 +2368,14 @@ async def real_estate_chatbot(user_message: str) -> str:
             if isinstance(developer_list, str):
                 developer_list = [developer_list]  # تبدیل رشته به لیست تک‌عضوی
 
-            developer_mapping = {
-                "Burtville Developments": 330, "Sobha": 3, "Tiger Properties": 103, "Azizi": 37, "Meraas": 70,
-                "Dubai Properties": 258, "Confident Group": 308, "Iman Developers": 61, "EMAAR": 2, "Shapoorji Pallonji": 91,
-                "Arada Properties": 35, "Ellington Properties": 50, "Select Group": 85, "Nshama": 76, "Arenco Real Estate": 398,
-                "Rijas Aces Property": 233, "Wasl": 109, "London Gate": 264, "Nakheel": 74, "GFH": 60,
-                "Expo City": 54, "AYS Developments": 36, "Imtiaz": 87, "Park Group": 366, "Prestige One": 80,
-                "Almazaya Holding": 68, "Samana Developers": 83, "Aldar": 32, "Bloom Holding": 270, "AG Properties": 317,
-                "Swank Development": 393, "Binghatti": 38, "Divine One Group": 311, "Emirates properties": 267,
-                "Dubai South": 323, "Pearlshire Developments": 329, "Gulf Land": 239, "Radiant": 269, "Modon Properties": 394,
-                "Oro24": 241, "Alzorah Development": 383, "Algouta Properties": 380, "Naseeb Group": 265, "GJ Properties": 326,
-                "Amwaj Development": 348, "Grid properties": 296, "Aqua Properties": 34, "SRG Holding": 95,
-                "Roya Lifestyle Developments": 338, "Omniyat": 77, "Aqasa Developers": 333, "Zimaya Properties": 392,
-                "Amali Properties": 341, "Credo": 324, "AAF Development": 409, "Dalands Developer": 427,
-                "The Heart of Europe": 101, "HRE Development": 399, "Lootah": 65, "AJ Gargash Real Estate": 465, "Damac": 318,
-                "Townx Real Estate": 105, "Symbolic": 97, "Nabni developments": 294, "Deyaar": 45, "Citi Developers": 283,
-                "Mashriq Elite": 332, "IFA Hotels & Resorts": 486, "Q Properties": 408, "ARAS Real Estate": 293,
-                "East & West Properties": 49, "H&H": 315, "Laya": 238, "Leos": 240, "Reportage": 232, "Empire Development": 52,
-                "Object 1": 237, "KASCO Development": 433, "Esnad Management": 421, "Majid Al Futtaim Group": 111,
-                "Signature D T": 203, "Sol Properties": 94, "Luxe Developer": 327, "Dugasta": 276, "Avelon Developments": 287,
-                "Rokane": 417, "LMD Real Estate": 227, "Source of Fate": 434, "Vision developments": 390,
-                "Peace Homes Development": 250, "JRP Development": 410, "MAG": 242, "Riviera Group": 298, "Durar": 320,
-                "Meraki Developers": 71, "Uniestate Properties": 107, "Eagle Hills": 299, "IRTH": 372,
-                "Amaya Properties LLC": 413, "Ajmal Makan": 260, "Siroya Ventures Realty L.L.C": 445, "HMB": 247,
-                "Enso Development": 403, "Marquis Point": 274, "Meteora": 278, "Vincitore": 108, "Taraf": 100,
-                "ADE Properties": 446, "Baccarat": 370, "Condor Group": 41, "Rabdan": 289, "Pure Gold": 256,
-                "Saas Properties": 300, "Dubai Invesment": 254, "Swiss Properties": 96, "Beyond": 443, "Green Group": 346,
-                "Mubadala": 468, "Main Realty": 334, "Danube Properties": 42, "Ambs Real Estate": 360, "MeDoRe": 255,
-                "Heilbronn Properties": 339, "Maaia Developments": 517, "Ginco Properties": 374, "Qube Development": 354,
-                "Orange": 303, "Alseeb Real Estate Development": 442, "Peak Summit Real Estate Development": 350,
-                "Regent Developers": 501, "Mr. Eight Development": 430, "BnW Developments": 382, "Tuscany Real Estate Development": 396,
-                "RAK Properties": 245, "Siadah International Real Estate": 406, "One Development": 425, "AHS Properties": 319,
-                "ARIB Developments": 389, "Segrex": 284, "DIFC": 502, "DarGlobal": 44, "Fortune 5": 58,
-                "Green Yard Properties": 412, "Ahmadyar Developments": 375, "Sankari Properties": 310, "Alta Real Estate Development": 491,
-                "Sama Ezdan": 205, "Stamn Development": 440, "Kamdar developments": 470, "BT Properties": 507, "IGO": 259,
-                "Orra Real Estate": 204, "Five Holdings": 56, "Karma": 62, "Almarwan Developments": 458,
-                "Khamas Group Of Investment Co's": 363, "Imkan": 371, "LAPIS Properties": 419, "Liv Developers": 64,
-                "S&S Real Estate": 499, "Fakhruddin Properties": 55, "Saba Property Developers": 416, "Majid Developments": 401,
-                "HVM Living": 484, "Golden Wood": 407, "EL Prime Properties": 431, "Wellcube.life": 395,
-                "Mubarak Al Beshara Real Estate Development": 420, "Dar Alkarama": 43, "Palma Holding": 340,
-                "Vantage Properties": 469, "Shurooq Development": 435, "Vakson Real Estate": 358, "Tasmeer Indigo Properties": 352,
-                "Acube Developments": 309, "Mada'in": 154, "Anax Developments": 301, "API": 455, "Alhamra": 351,
-                "AB Developers": 367, "Tarrad Real Estate": 451, "Esnaad": 302, "4 Direction Developers": 508,
-                "Alzarooni Development": 444, "Alma Developments": 500, "Reef Luxury Development": 424,
-                "Blanco Thornton Properties": 402, "Amaal": 498, "Wahat Al Zaweya": 397, "Alef Group": 273,
-                "One Yard": 200, "AAA Development": 441, "Ohana Developments": 369, "Forum Real Estate": 387,
-                "Nine Development": 411, "Nine Yards Development": 494, "Mira Developments": 282, "MAK Developers": 415,
-                "MS Homes": 376, "Crystal Bay Development": 377, "Galaxy": 379, "Advanced Properties": 268,
-                "City View Developments": 391, "Svarn": 368, "Centurion Developers": 464, "Union Properties": 364,
-                "Wellington Developments": 497, "Seven Mayfair Real Estate": 515, "DV8 Developers": 423, "Zenith Group": 513,
-                "AlMadar Investment L.L.C": 428, "Abou Eid Real Estate": 252, "Asak Real Estate": 485,
-                "Alhabtoor Group": 28, "Mill Hill Developer": 488, "Alaia Developments": 505, "True Future Development": 495,
-                "ARTE Development": 432, "Time Properties": 104, "GFS Builders & Developers": 471, "Zoya Developments": 386,
-                "Evera Real Estate Development": 467, "77 Shades of Green": 448, "BNH Real Estate Developer": 429,
-                "Oksa Developer": 475, "Alhelal Al zahaby": 452, "Kingdom Properties": 456, "Aark Developers": 26,
-                "Januss Developers": 447, "Grovy Real Estate": 210, "Range Developments": 479, "Matrix developments": 483,
-                "Shoumous": 261, "Lucky Aeon": 66, "Meydan": 422, "Pantheon Development": 78, "DMCC": 388,
-                "Arista Properties": 321, "DHG Properties": 295, "World Of Wonders": 291, "PMR Property": 450,
-                "Major Development’s": 292, "Takmeel Real Estate": 314, "Urban Properties": 385, "Emerald Palace Group": 51,
-                "Metac Properties L.L.C": 23, "Skyline Builders": 285, "Prescott": 357, "Vantage Ventures": 490,
-                "Zane Development": 481, "Yas Developers": 463, "Amirah Developments": 482, "Elysian Properties": 454,
-                "Nexus Developer": 449, "Hayaat Developments": 512, "Lincoln Star Real Estate": 466, "Arsenal East": 473,
-                "Laraix Developers": 511, "Aqaar": 305, "Baraka Development": 304, "Keymavens development": 345,
-                "The 100": 359, "Manam Real Estate Development": 438, "Almarina Holding": 474, "Dia Properties": 518,
-                "Iraz Developments": 335, "Seven Tides": 89, "Albait Alduwaliy Real Estate": 355,
-                "Palladium Development": 356, "Tabeer Developments": 98, "Lacasa Living": 477, "Wow Resorts": 405,
-                "Revolution": 342, "ABA Group": 336, "Cirrera Development": 516, "SOHO Development": 344,
-                "Signature Developers": 426, "Pinnacle Developers": 437, "BAMX Development": 519, "Mered": 288,
-                "AiZN Development": 404, "Octa Properties": 277, "Premier Choice": 520
-            }
-
             if isinstance(developer_list, list):  # بررسی اینکه ورودی یک لیست باشد
                 mapped_developers = []
 
                 for developer in developer_list:
-                    best_match, score = process.extractOne(developer.strip(), developer_mapping.keys())
+                    best_match, score = DEVELOPERS.extract_one(developer.strip())
 
                     if score > 70:  # **فقط اگر دقت بالای ۷۰٪ بود، مقدار را قبول کن**
-                        mapped_developers.append(developer_mapping[best_match])
+                        mapped_developers.append(DEVELOPERS[best_match])
 
                 if mapped_developers:  # **اگر شرکت‌هایی پیدا شدند، به `filters` اضافه شود**
                     filters["developer_company_id"] = mapped_developers
@@ -2905,111 +2391,14 @@ async def real_estate_chatbot(user_message: str) -> str:
                 # facilities_list = [facilities_list]  # تبدیل رشته به لیست تک‌عضوی
                 facilities_list = [x.strip() for x in facilities_list.split(",") if x.strip()]
             
-            facilities_mapping = {
-                "24 hour security": "408",
-                "24/7 Security and Maintenance Services": "399",
-                "Access Control System": "314",
-                "Air Fitness zones": "570",
-                "Art Garden": "510",
-                "BBQ Area": "21",
-                "Baby Care Centre": "163",
-                "Badminton Court": "100",
-                "Balcony": "76",
-                "Basketball Court": "427",
-                "Basketball Playground": "10",
-                "Beach": "387",
-                "Beach Club": "595",
-                "Beauty Saloon": "106",
-                "Bicycle parking": "348",
-                "Bike Paths": "52",
-                "Bike tracks": "458",
-                "Bocce Play Area": "525",
-                "Broadband Internet": "46",
-                "Building Management System": "325",
-                "Business Centre": "175",
-                "CCTV Surveillance": "313",
-                "Cabana Seating": "88",
-                "Cafe": "184",
-                "Central A/C & Heating": "47",
-                "Changing Room and Locker": "533",
-                "Chess Board": "97",
-                "Children's Play Area": "6",
-                "Children's Swimming Pool": "7",
-                "Cinema": "19",
-                "Clinic": "279",
-                "Close Circuit TV System": "323",
-                "Club House": "226",
-                "Co-Working Spaces": "221",
-                "Community hubs": "460",
-                "Concierge Service": "37",
-                "Covered Parking": "31",
-                "Cricket Pitch": "95",
-                "Cycling Track": "276",
-                "Direct Beach Access": "96",
-                "Dog Park": "363",
-                "Electric Vehicle Charging Stations": "229",
-                "Fitness Area": "424",
-                "Fitness Club": "50",
-                "Fitness studio": "397",
-                "Football Playground": "9",
-                "Games Lounge Room": "269",
-                "Garden": "11",
-                "Gym": "334",
-                "Gymnasium": "454",
-                "Health Club": "102",
-                "Hospital": "368",
-                "Jogging Track": "105",
-                "Kids Pool": "381",
-                "Kids Swimming Pool": "452",
-                "Laundry Room": "107",
-                "Library": "87",
-                "Mall": "111",
-                "Meeting Rooms": "369",
-                "Mini Golf": "96",
-                "Mosque": "204",
-                "Music Room": "268",
-                "Nursery": "217",
-                "Outdoor Gym": "26",
-                "Padel Tennis": "467",
-                "Park": "54",
-                "Parking": "405",
-                "Pet Shop": "281",
-                "Pharmacy": "57",
-                "Play Area": "425",
-                "Playground": "319",
-                "Pool Deck": "415",
-                "Private Cinema For Each Unit": "364",
-                "Private Parking for Each unit": "484",
-                "Security": "40",
-                "SPA": "43",
-                "Sauna": "13",
-                "Sauna & Steam Room": "144",
-                "School": "49",
-                "Shared Outdoor Swimming Pool": "20",
-                "Skate Park": "428",
-                "Smart Homes": "378",
-                "Squash Courts": "209",
-                "Supermarket": "56",
-                "Swimming Pool": "74",
-                "Tennis Playground": "8",
-                "Theater": "19",
-                "VR Game Room": "382",
-                "Water Fountain": "356",
-                "Veterinary Clinic": "280",
-                "Yoga": "167",
-                "Zen Garden": "511",
-                "Kids Club": "331",
-                "Safe & Secure": "529"
-            }
-
             if isinstance(facilities_list, list):  # بررسی اینکه ورودی یک لیست باشد
                 mapped_facilities = []
 
                 for facility in facilities_list:
-                    best_match, score = process.extractOne(facility.strip(), facilities_mapping.keys())
+                    best_match, score = FACILITIES.extract_one(facility.strip())
 
                     if score > 70:  # **فقط اگر دقت بالای ۷۰٪ بود، مقدار را قبول کن**
-                        mapped_facilities.append(facilities_mapping[best_match])
+                        mapped_facilities.append(FACILITIES[best_match])
 
                 if mapped_facilities:  # **اگر امکاناتی پیدا شد، به `filters` اضافه شود**
                     filters["facilities"] = mapped_facilities
@@ -3027,7 +2416,7 @@ async def real_estate_chatbot(user_message: str) -> str:
         print("🔹 فیلترهای اصلاح‌شده و ارسال‌شده به API:", filters)
         # logging.info(f"extracted filters: {filters}")
 
-        memory_state = filters.copy()
+        memory_state = state.memory_state = filters.copy()
 
         if "delivery_date" in memory_state:
             del memory_state["delivery_date"]
@@ -3038,20 +2427,16 @@ async def real_estate_chatbot(user_message: str) -> str:
         if "min_area" in memory_state:
             del memory_state["min_area"]
 
-        properties = filter_properties(memory_state)
-
-        # ✅ فیلتر `delivery_date` (تحویل ملک) فقط بر اساس سال
-        if filters_date.get("delivery_date"):
-            target_year = filters_date["delivery_date"]  # سال موردنظر کاربر
-            start_of_year = int(datetime(target_year, 1, 1).timestamp())  # تبدیل به یونیکس (ژانویه)
-            end_of_year = int(datetime(target_year, 12, 31, 23, 59, 59).timestamp())  # تبدیل به یونیکس (دسامبر)
-
-            properties = [
-                prop for prop in properties
-                if "delivery_date" in prop and prop["delivery_date"].isdigit() and 
-                start_of_year <= int(prop["delivery_date"]) <= end_of_year
-            ]
+        # ✅ فیلتر `delivery_date` (تحویل ملک) فقط بر اساس سال و فیلتر مساحت، همراه با بقیه فیلترها روی ستون‌های NumPy
+        target_year = filters_date.get("delivery_date")  # سال موردنظر کاربر
+        properties = await search_properties(
+            memory_state,
+            delivery_year=target_year or None,
+            min_area=filters_area.get("min_area"),
+            max_area=filters_area.get("max_area"),
+        )
 
+        if target_year:
             print(f"🔍 بعد از فیلتر بر اساس سال تحویل ({target_year}): {len(properties)}")
 
         if "delivery_date" in filters_date:
@@ -3063,14 +2448,7 @@ async def real_estate_chatbot(user_message: str) -> str:
         if filters_area.get("min_area") is not None or filters_area.get("max_area") is not None:
             min_area = filters_area.get("min_area", 0)
             max_area = filters_area.get("max_area", float("inf"))
-
-            properties = [
-                prop for prop in properties
-                if "min_area" in prop and prop["min_area"] is not None and isinstance(prop["min_area"], (int, float)) and
-                (min_area * 10.7639) <= float(prop["min_area"]) <= (max_area * 10.7639)
-            ]
-
-            print(f"📐 بعد از فیلتر بر اساس مساحت پروژه (sqft) بین {min_area * 10.7639} تا {max_area * 10.7639}: {len(properties)}")
+            print(f"📐 بعد از فیلتر بر اساس مساحت پروژه (sqft) بین {min_area * SQM_TO_SQFT} تا {max_area * SQM_TO_SQFT}: {len(properties)}")
 
 
         if "max_area" in filters_area:
@@ -3098,7 +2476,6 @@ async def real_estate_chatbot(user_message: str) -> str:
 
 
         print(f"🔹 تعداد املاک نهایی دریافت‌شده از API: {len(properties)}")
-        properties = sort_properties_by_developer_popularity(properties)
 
         # if len(properties) > 0:
         #     message = f"🔎 بله، {len(properties)} مورد با این مشخصات پیدا شد که الان جندتاشو معرفی میکنم."
@@ -3109,8 +2486,6 @@ async def real_estate_chatbot(user_message: str) -> str:
         
 
         if len(properties) > 0:
-            response = await generate_ai_summary(properties)
-
             if len(properties) > 1:
                 message_html = f"""
                 <div style="text-align: right; direction: rtl; padding: 10px; width: 100%;">
@@ -3130,7 +2505,8 @@ async def real_estate_chatbot(user_message: str) -> str:
             # </div>
             # """
 
-            return message_html + response
+            # ✅ پیام بالای کارت‌ها اول ارسال می‌شود تا در حالت استریم هم بالای کارت‌ها بماند
+            return await generate_ai_summary(state, properties, header=message_html)
         else:
             return """
             <div style="text-align: right; direction: rtl; padding: 10px; width: 100%;">
@@ -3144,11 +2520,11 @@ async def real_estate_chatbot(user_message: str) -> str:
 
     
     if "property_price" in response_type.lower():
-        extracted_data = extract_filters(user_message, memory_state)
+        extracted_data = await extract_filters(user_message, memory_state, prefetched=prefetched_filters)
 
         if extracted_data.get("questions_needed"):
             memory_state["asked_questions"] = extracted_data["questions_needed"] 
-        just_answered_questions = memory_state.get("asked_questions") and not extracted_data.get("questions_needed")
+        just_answered_questions = state.just_answered_questions = memory_state.get("asked_questions") and not extracted_data.get("questions_needed")
         if just_answered_questions:
             memory_state.pop("asked_questions", None)
 
@@ -3165,7 +2541,7 @@ async def real_estate_chatbot(user_message: str) -> str:
         min_area = extracted_data.get("min_area")
 
 
-        return find_price(
+        return await find_price(
         min_area=min_area,
         max_area=max_area,
         district=district, 
@@ -3185,7 +2561,7 @@ async def real_estate_chatbot(user_message: str) -> str:
         print("✅ تابع extract_filters در حال اجرا است...")
         print("🔹 memory", memory_state)
 
-        extracted_data = extract_filters(user_message, memory_state)
+        extracted_data = await extract_filters(user_message, memory_state, prefetched=prefetched_filters)
 
 
         if "questions_needed" in extracted_data and len(extracted_data["questions_needed"]) > 0:
@@ -3214,7 +2590,7 @@ async def real_estate_chatbot(user_message: str) -> str:
 
         if extracted_data.get("questions_needed"):
             memory_state["asked_questions"] = extracted_data["questions_needed"] 
-        just_answered_questions = memory_state.get("asked_questions") and not extracted_data.get("questions_needed")
+        just_answered_questions = state.just_answered_questions = memory_state.get("asked_questions") and not extracted_data.get("questions_needed")
         if just_answered_questions:
             memory_state.pop("asked_questions", None)
         
@@ -3237,54 +2613,12 @@ async def real_estate_chatbot(user_message: str) -> str:
         if extracted_data.get("city") is not None:
             city_id = extracted_data["city"]  # مقدار را به رشته تبدیل کن
 
-            city_mapping = {
-            "Dubai": 6,
-            "Abu Dhabi": 9
-        }
-
-            filters["city_id"] = [city_mapping.get(city_id, city_id)]
+            filters["city_id"] = [CITIES.get(city_id, city_id)]
 
         if extracted_data.get("district"):
             district_i = str(extracted_data["district"]).strip().title()  # مقدار را به رشته تبدیل کن
 
-            district_mapping = {
-            'Masdar City': 340, 'Meydan': 133, 'Wadi AlSafa 2': 146, 'Wadi AlSafa 5': 246, 'Alamerah': 279,
-            'JVC': 243, 'Remraam': 284, 'Aljadaf': 122, 'Liwan': 294, 'Arjan': 201, 'Dubai Creek Harbour': 152,
-            'Damac Lagoons': 259, 'Dubai Downtown': 143, 'Muwaileh': 304, 'Palm Jumeirah': 134, 'Business Bay': 252,
-            'City Walk': 228, 'Emaar South': 354, 'Dubai Production City': 217, 'Nadd Al Shiba': 355, 'Dubai Hills': 241,
-            'Jabal Ali Industrial Second': 131, 'AlYelayiss 2': 162, 'Town Square Dubai': 275, 'Majan': 231, 'Ramhan Island': 315,
-            'AlKifaf': 167, 'Alyasmeen': 310, 'Sports City': 203, 'Mbr District One': 319, 'Alraha': 352, 'Damac Hills 2': 213,
-            'Wadi AlSafa 4': 189, 'Expo City': 292, 'Almarjan Island': 297, 'Zaabeel Second': 120, 'Yas Island': 303,
-            'Zayed City': 295, 'Port Rashid': 378, 'Alhamra Island': 278, 'Jabal Ali First': 130, 'Dubai Land Residence Complex': 307,
-            'Reem Island': 298, 'Dubai Investment Park': 156, 'The Oasis': 363, 'Alheliow1': 311, 'Dubai South': 328, 'The Valley': 361,
-            'JVT': 244, 'Rashid Yachts and Marina': 383, 'Golf City': 266, 'Jebel Ali Village': 345, 'Alhudayriyat Island': 365,
-            'Damac Hills': 210, 'Alzorah': 364, 'Alfurjan': 346, 'Discovery Gardens': 235, 'Dubai Islands': 233, 'Alsatwa': 273,
-            'Dubai Motor City': 124, 'Palm Jabal Ali': 161, 'Saadiyat Island': 296, 'Dubai Marina': 239, 'Dubai Industrial City': 308,
-            'Mina Alarab': 293, 'Sobha Hartland': 332, 'Alwasl': 141, 'Bluewaters Bay': 286, 'JLT': 212, 'World Islands': 247,
-            'Mirdif': 163, 'Jumeirah Island One': 150, 'City Of Arabia': 236, 'Alreem Island': 264, 'Almaryah': 337,
-            'Albarsha South': 341, 'Aljada': 327, 'International City Phase (2)': 309, 'Alshamkha': 362, 'Ghaf Woods': 389,
-            'Hamriya West': 353, 'Al Yelayiss 1': 397, 'Al Tay': 343, 'Studio City': 316, 'Maryam Island': 314, 'Rukan Community': 414,
-            'Madinat Jumeirah Living': 285, 'Dubai Maritime City': 216, 'Wadi Al Safa 7': 261, 'Alzahya': 312, 'Jumeirah Park': 317,
-            'Bukadra': 349, 'Alsafouh Second': 407, 'Dubai Sports City': 342, 'Al Barsha South Second': 409, 'Mohammed Bin Rashid City': 318,
-            'Jumeirah 2': 334, 'Uptown, AlThanyah Fifth': 220, 'Wadi AlSafa 3': 187, 'Jumeirah Heights': 402, 'Dubai Silicon Oasis': 245,
-            'Dubai Design District': 230, 'Tilal AlGhaf': 199, 'Albelaida': 280, 'Jumeirah Beach Residence': 375, 'Dubai International Financial Centre (DIFC)': 333,
-            'Dubai Water Canal': 387, 'Al Barsha 1': 400, 'Alwadi Desert': 406, 'Jumeirah Golf Estates': 291, 'Warsan Fourth': 249,
-            'Meydan D11': 404, 'Nad Alsheba 1': 413, 'Aljurf': 359, 'MBR City D11': 368, 'International City': 248,
-            'Alrashidiya 1': 386, 'Free Zone': 367, 'Dubai Internet City': 398, 'Khalifa City': 357, 'Ghantoot': 358,
-            'Alnuaimia 1': 392, 'Alhamriyah': 415, 'Barsha Heights': 385, 'Ajmal Makan City': 276, 'Motor City': 326,
-            'Legends': 412, 'Sharm': 374, 'AlSafouh First': 125, 'Barashi': 305, 'Al Maryah Island': 399, 'Jumeirah Garden City': 356,
-            'Dubai Investment Park 2': 366, 'Sheikh Zayed Road, Alsafa': 263, 'Dubai Land': 417, 'Madinat Almataar': 250,
-            'Emaar Beachfront': 391, 'Dubai Harbour': 242, 'Alheliow2': 313, 'Alsuyoh Suburb': 324, 'Tilal': 325,
-            'Almuntazah': 339, 'Alrashidiya 3': 321, 'Alsafa': 268, 'Almamzar': 306, 'Sobha Hartland 2': 408, 'Siniya Island': 360,
-            'Ras AlKhor Ind. First': 257, 'Albarari': 418, 'Alwaha': 416, 'Dubai Science Park': 351, 'Ain Al Fayda': 369,
-            'Marina': 336, 'Dubai Healthcare City': 238, 'Trade Center First': 148, 'Damac Islands': 394,
-            'The Heights Country Club': 396, 'Al Yelayiss 5': 411, 'Hayat Islands': 283, 'Mina AlArab, Hayat Islands': 282,
-            'Dubai Media City': 258, 'Al Khalidiya': 382, 'AlBarsha South Fourth': 301, 'Alrahmaniya': 390, 'AlBarsha South Fifth': 123,
-            "AlFaqa'": 329, 'Raha Island': 347
-            
-        }
-
-            best_match, score = process.extractOne(district_i, district_mapping.keys())
+            best_match, score = DISTRICTS.extract_one(district_i)
             print(f"📌 بهترین تطابق fuzzy: {best_match} (امتیاز: {score})")  # نمایش اطلاعات برای دیباگ
             
             if score > 70:  # **اگر دقت بالای ۷۰٪ بود، مقدار را قبول کن**
@@ -3293,7 +2627,7 @@ async def real_estate_chatbot(user_message: str) -> str:
             #     filters["district"] = district_i  # اگر تطابق نداشت، همان مقدار ورودی کاربر را نگه دار
 
             # if score > 70:  # اگر دقت بالای ۷۰٪ بود، مقدار را قبول کن
-            #     filters["district"] = [district_mapping[best_match]]
+            #     filters["district"] = [DISTRICTS[best_match]]
             # else:
             #     print(f"⚠️ نام منطقه '{district_i}' به هیچ منطقه‌ای تطابق نداشت!")
 
@@ -3301,39 +2635,8 @@ async def real_estate_chatbot(user_message: str) -> str:
         if extracted_data.get("bedrooms") is not None:
             bedrooms_count = str(extracted_data["bedrooms"]).strip().title()  # مقدار را به رشته تبدیل کن
 
-            bedrooms_mapping = {
-            "1": 10,
-            "1.5": 23,
-            "2": 11,
-            "2.5": 24,
-            "3": 12,
-            "3.5": 25,
-            "4": 13,
-            "4.5": 26,
-            "5": 14,
-            "5.5": 27,
-            "6": 15,
-            "6.5": 28,
-            "7": 16,
-            "7.5": 29,
-            "8": 17,
-            "9": 18,
-            "10": 19,
-            "11": 22,
-            "Studio": 9,       
-            "Penthouse": 34,   
-            "Retail": 31,      
-            "Office": 20,      
-            "Showroom": 35,    
-            "Store": 30,       
-            "Suite": 32,       
-            "Hotel Room": 33,   
-            "Full Floor": 36,  
-            "Land / Plot": 21  
-        }
-
             # مقدار `property_type` را به `id` تغییر بده
-            filters["apartments"] = [bedrooms_mapping.get(bedrooms_count, bedrooms_count)]
+            filters["apartments"] = [BEDROOMS.get(bedrooms_count, bedrooms_count)]
 
         if extracted_data.get("max_price") is not None:
             filters["max_price"] = extracted_data.get("max_price")
@@ -3356,45 +2659,16 @@ async def real_estate_chatbot(user_message: str) -> str:
             if isinstance(property_type_name, dict):
                 property_type_name = property_type_name.get("name", "")
 
-            # تبدیل نام انگلیسی به ID
-            property_type_mapping = {
-                "Residential": {"id": 20, "name": "Residential"},
-                "Commercial": {"id": 3, "name": "Commercial"}
-            }
-
             # مقدار `property_type` را به `id` تغییر بده
-            filters["property_type"] = property_type_mapping.get(property_type_name, property_type_name)
+            filters["property_type"] = PROPERTY_TYPES.get(property_type_name, property_type_name)
 
         # if extracted_data.get("property_type"):
         #     filters["property_type"] = extracted_data.get("property_type")
 
         if extracted_data.get("apartmentType") is not None:
             apartment_type = str(extracted_data["apartmentType"]).strip().title()  # تبدیل به فرمت استاندارد
-            # ✅ دیکشنری نگاشت نوع آپارتمان به `id`
-            apartment_type_mapping = {
-                "Apartment": 1,
-                "Building": 31,
-                "Duplex": 27,
-                "Full Floor": 4,
-                "Hotel": 32,
-                "Hotel Apartment": 8,
-                "Land / Plot": 6,
-                "Loft": 34,
-                "Office": 7,
-                "Penthouse": 10,
-                "Retail": 33,
-                "Shop": 29,
-                "Show Room": 30,
-                "Store": 25,
-                "Suite": 35,
-                "Townhouse": 9,
-                "Triplex": 28,
-                "Villa": 3,
-                "Warehouse": 26
-            }
-
             # ✅ تبدیل مقدار `property_type` به `id` معادل آن
-            filters["apartmentType"] = [apartment_type_mapping.get(apartment_type, apartment_type)]
+            filters["apartmentType"] = [APARTMENT_TYPES.get(apartment_type, apartment_type)]
 
 
 
@@ -3453,84 +2727,14 @@ async def real_estate_chatbot(user_message: str) -> str:
             if isinstance(developer_list, str):
                 developer_list = [developer_list]  # تبدیل رشته به لیست تک‌عضوی
 
-            developer_mapping = {
-                "Burtville Developments": 330, "Sobha": 3, "Tiger Properties": 103, "Azizi": 37, "Meraas": 70,
-                "Dubai Properties": 258, "Confident Group": 308, "Iman Developers": 61, "EMAAR": 2, "Shapoorji Pallonji": 91,
-                "Arada Properties": 35, "Ellington Properties": 50, "Select Group": 85, "Nshama": 76, "Arenco Real Estate": 398,
-                "Rijas Aces Property": 233, "Wasl": 109, "London Gate": 264, "Nakheel": 74, "GFH": 60,
-                "Expo City": 54, "AYS Developments": 36, "Imtiaz": 87, "Park Group": 366, "Prestige One": 80,
-                "Almazaya Holding": 68, "Samana Developers": 83, "Aldar": 32, "Bloom Holding": 270, "AG Properties": 317,
-                "Swank Development": 393, "Binghatti": 38, "Divine One Group": 311, "Emirates properties": 267,
-                "Dubai South": 323, "Pearlshire Developments": 329, "Gulf Land": 239, "Radiant": 269, "Modon Properties": 394,
-                "Oro24": 241, "Alzorah Development": 383, "Algouta Properties": 380, "Naseeb Group": 265, "GJ Properties": 326,
-                "Amwaj Development": 348, "Grid properties": 296, "Aqua Properties": 34, "SRG Holding": 95,
-                "Roya Lifestyle Developments": 338, "Omniyat": 77, "Aqasa Developers": 333, "Zimaya Properties": 392,
-                "Amali Properties": 341, "Credo": 324, "AAF Development": 409, "Dalands Developer": 427,
-                "The Heart of Europe": 101, "HRE Development": 399, "Lootah": 65, "AJ Gargash Real Estate": 465, "Damac": 318,
-                "Townx Real Estate": 105, "Symbolic": 97, "Nabni developments": 294, "Deyaar": 45, "Citi Developers": 283,
-                "Mashriq Elite": 332, "IFA Hotels & Resorts": 486, "Q Properties": 408, "ARAS Real Estate": 293,
-                "East & West Properties": 49, "H&H": 315, "Laya": 238, "Leos": 240, "Reportage": 232, "Empire Development": 52,
-                "Object 1": 237, "KASCO Development": 433, "Esnad Management": 421, "Majid Al Futtaim Group": 111,
-                "Signature D T": 203, "Sol Properties": 94, "Luxe Developer": 327, "Dugasta": 276, "Avelon Developments": 287,
-                "Rokane": 417, "LMD Real Estate": 227, "Source of Fate": 434, "Vision developments": 390,
-                "Peace Homes Development": 250, "JRP Development": 410, "MAG": 242, "Riviera Group": 298, "Durar": 320,
-                "Meraki Developers": 71, "Uniestate Properties": 107, "Eagle Hills": 299, "IRTH": 372,
-                "Amaya Properties LLC": 413, "Ajmal Makan": 260, "Siroya Ventures Realty L.L.C": 445, "HMB": 247,
-                "Enso Development": 403, "Marquis Point": 274, "Meteora": 278, "Vincitore": 108, "Taraf": 100,
-                "ADE Properties": 446, "Baccarat": 370, "Condor Group": 41, "Rabdan": 289, "Pure Gold": 256,
-                "Saas Properties": 300, "Dubai Invesment": 254, "Swiss Properties": 96, "Beyond": 443, "Green Group": 346,
-                "Mubadala": 468, "Main Realty": 334, "Danube Properties": 42, "Ambs Real Estate": 360, "MeDoRe": 255,
-                "Heilbronn Properties": 339, "Maaia Developments": 517, "Ginco Properties": 374, "Qube Development": 354,
-                "Orange": 303, "Alseeb Real Estate Development": 442, "Peak Summit Real Estate Development": 350,
-                "Regent Developers": 501, "Mr. Eight Development": 430, "BnW Developments": 382, "Tuscany Real Estate Development": 396,
-                "RAK Properties": 245, "Siadah International Real Estate": 406, "One Development": 425, "AHS Properties": 319,
-                "ARIB Developments": 389, "Segrex": 284, "DIFC": 502, "DarGlobal": 44, "Fortune 5": 58,
-                "Green Yard Properties": 412, "Ahmadyar Developments": 375, "Sankari Properties": 310, "Alta Real Estate Development": 491,
-                "Sama Ezdan": 205, "Stamn Development": 440, "Kamdar developments": 470, "BT Properties": 507, "IGO": 259,
-                "Orra Real Estate": 204, "Five Holdings": 56, "Karma": 62, "Almarwan Developments": 458,
-                "Khamas Group Of Investment Co's": 363, "Imkan": 371, "LAPIS Properties": 419, "Liv Developers": 64,
-                "S&S Real Estate": 499, "Fakhruddin Properties": 55, "Saba Property Developers": 416, "Majid Developments": 401,
-                "HVM Living": 484, "Golden Wood": 407, "EL Prime Properties": 431, "Wellcube.life": 395,
-                "Mubarak Al Beshara Real Estate Development": 420, "Dar Alkarama": 43, "Palma Holding": 340,
-                "Vantage Properties": 469, "Shurooq Development": 435, "Vakson Real Estate": 358, "Tasmeer Indigo Properties": 352,
-                "Acube Developments": 309, "Mada'in": 154, "Anax Developments": 301, "API": 455, "Alhamra": 351,
-                "AB Developers": 367, "Tarrad Real Estate": 451, "Esnaad": 302, "4 Direction Developers": 508,
-                "Alzarooni Development": 444, "Alma Developments": 500, "Reef Luxury Development": 424,
-                "Blanco Thornton Properties": 402, "Amaal": 498, "Wahat Al Zaweya": 397, "Alef Group": 273,
-                "One Yard": 200, "AAA Development": 441, "Ohana Developments": 369, "Forum Real Estate": 387,
-                "Nine Development": 411, "Nine Yards Development": 494, "Mira Developments": 282, "MAK Developers": 415,
-                "MS Homes": 376, "Crystal Bay Development": 377, "Galaxy": 379, "Advanced Properties": 268,
-                "City View Developments": 391, "Svarn": 368, "Centurion Developers": 464, "Union Properties": 364,
-                "Wellington Developments": 497, "Seven Mayfair Real Estate": 515, "DV8 Developers": 423, "Zenith Group": 513,
-                "AlMadar Investment L.L.C": 428, "Abou Eid Real Estate": 252, "Asak Real Estate": 485,
-                "Alhabtoor Group": 28, "Mill Hill Developer": 488, "Alaia Developments": 505, "True Future Development": 495,
-                "ARTE Development": 432, "Time Properties": 104, "GFS Builders & Developers": 471, "Zoya Developments": 386,
-                "Evera Real Estate Development": 467, "77 Shades of Green": 448, "BNH Real Estate Developer": 429,
-                "Oksa Developer": 475, "Alhelal Al zahaby": 452, "Kingdom Properties": 456, "Aark Developers": 26,
-                "Januss Developers": 447, "Grovy Real Estate": 210, "Range Developments": 479, "Matrix developments": 483,
-                "Shoumous": 261, "Lucky Aeon": 66, "Meydan": 422, "Pantheon Development": 78, "DMCC": 388,
-                "Arista Properties": 321, "DHG Properties": 295, "World Of Wonders": 291, "PMR Property": 450,
-                "Major Development’s": 292, "Takmeel Real Estate": 314, "Urban Properties": 385, "Emerald Palace Group": 51,
-                "Metac Properties L.L.C": 23, "Skyline Builders": 285, "Prescott": 357, "Vantage Ventures": 490,
-                "Zane Development": 481, "Yas Developers": 463, "Amirah Developments": 482, "Elysian Properties": 454,
-                "Nexus Developer": 449, "Hayaat Developments": 512, "Lincoln Star Real Estate": 466, "Arsenal East": 473,
-                "Laraix Developers": 511, "Aqaar": 305, "Baraka Development": 304, "Keymavens development": 345,
-                "The 100": 359, "Manam Real Estate Development": 438, "Almarina Holding": 474, "Dia Properties": 518,
-                "Iraz Developments": 335, "Seven Tides": 89, "Albait Alduwaliy Real Estate": 355,
-                "Palladium Development": 356, "Tabeer Developments": 98, "Lacasa Living": 477, "Wow Resorts": 405,
-                "Revolution": 342, "ABA Group": 336, "Cirrera Development": 516, "SOHO Development": 344,
-                "Signature Developers": 426, "Pinnacle Developers": 437, "BAMX Development": 519, "Mered": 288,
-                "AiZN Development": 404, "Octa Properties": 277, "Premier Choice": 520
-            }
-
             if isinstance(developer_list, list):  # بررسی اینکه ورودی یک لیست باشد
                 mapped_developers = []
 
                 for developer in developer_list:
-                    best_match, score = process.extractOne(developer.strip(), developer_mapping.keys())
+                    best_match, score = DEVELOPERS.extract_one(developer.strip())
 
                     if score > 70:  # **فقط اگر دقت بالای ۷۰٪ بود، مقدار را قبول کن**
-                        mapped_developers.append(developer_mapping[best_match])
+                        mapped_developers.append(DEVELOPERS[best_match])
 
                 if mapped_developers:  # **اگر شرکت‌هایی پیدا شدند، به `filters` اضافه شود**
                     filters["developer_company_id"] = mapped_developers
@@ -3546,111 +2750,14 @@ async def real_estate_chatbot(user_message: str) -> str:
                 # facilities_list = [facilities_list]  # تبدیل رشته به لیست تک‌عضوی
                 facilities_list = [x.strip() for x in facilities_list.split(",") if x.strip()]
             
-            facilities_mapping = {
-                "24 hour security": "408",
-                "24/7 Security and Maintenance Services": "399",
-                "Access Control System": "314",
-                "Air Fitness zones": "570",
-                "Art Garden": "510",
-                "BBQ Area": "21",
-                "Baby Care Centre": "163",
-                "Badminton Court": "100",
-                "Balcony": "76",
-                "Basketball Court": "427",
-                "Basketball Playground": "10",
-                "Beach": "387",
-                "Beach Club": "595",
-                "Beauty Saloon": "106",
-                "Bicycle parking": "348",
-                "Bike Paths": "52",
-                "Bike tracks": "458",
-                "Bocce Play Area": "525",
-                "Broadband Internet": "46",
-                "Building Management System": "325",
-                "Business Centre": "175",
-                "CCTV Surveillance": "313",
-                "Cabana Seating": "88",
-                "Cafe": "184",
-                "Central A/C & Heating": "47",
-                "Changing Room and Locker": "533",
-                "Chess Board": "97",
-                "Children's Play Area": "6",
-                "Children's Swimming Pool": "7",
-                "Cinema": "19",
-                "Clinic": "279",
-                "Close Circuit TV System": "323",
-                "Club House": "226",
-                "Co-Working Spaces": "221",
-                "Community hubs": "460",
-                "Concierge Service": "37",
-                "Covered Parking": "31",
-                "Cricket Pitch": "95",
-                "Cycling Track": "276",
-                "Direct Beach Access": "96",
-                "Dog Park": "363",
-                "Electric Vehicle Charging Stations": "229",
-                "Fitness Area": "424",
-                "Fitness Club": "50",
-                "Fitness studio": "397",
-                "Football Playground": "9",
-                "Games Lounge Room": "269",
-                "Garden": "11",
-                "Gym": "334",
-                "Gymnasium": "454",
-                "Health Club": "102",
-                "Hospital": "368",
-                "Jogging Track": "105",
-                "Kids Pool": "381",
-                "Kids Swimming Pool": "452",
-                "Laundry Room": "107",
-                "Library": "87",
-                "Mall": "111",
-                "Meeting Rooms": "369",
-                "Mini Golf": "96",
-                "Mosque": "204",
-                "Music Room": "268",
-                "Nursery": "217",
-                "Outdoor Gym": "26",
-                "Padel Tennis": "467",
-                "Park": "54",
-                "Parking": "405",
-                "Pet Shop": "281",
-                "Pharmacy": "57",
-                "Play Area": "425",
-                "Playground": "319",
-                "Pool Deck": "415",
-                "Private Cinema For Each Unit": "364",
-                "Private Parking for Each unit": "484",
-                "Security": "40",
-                "SPA": "43",
-                "Sauna": "13",
-                "Sauna & Steam Room": "144",
-                "School": "49",
-                "Shared Outdoor Swimming Pool": "20",
-                "Skate Park": "428",
-                "Smart Homes": "378",
-                "Squash Courts": "209",
-                "Supermarket": "56",
-                "Swimming Pool": "74",
-                "Tennis Playground": "8",
-                "Theater": "19",
-                "VR Game Room": "382",
-                "Water Fountain": "356",
-                "Veterinary Clinic": "280",
-                "Yoga": "167",
-                "Zen Garden": "511",
-                "Kids Club": "331",
-                "Safe & Secure": "529"
-            }
-
             if isinstance(facilities_list, list):  # بررسی اینکه ورودی یک لیست باشد
                 mapped_facilities = []
 
                 for facility in facilities_list:
-                    best_match, score = process.extractOne(facility.strip(), facilities_mapping.keys())
+                    best_match, score = FACILITIES.extract_one(facility.strip())
 
                     if score > 70:  # **فقط اگر دقت بالای ۷۰٪ بود، مقدار را قبول کن**
-                        mapped_facilities.append(facilities_mapping[best_match])
+                        mapped_facilities.append(FACILITIES[best_match])
 
                 if mapped_facilities:  # **اگر امکاناتی پیدا شد، به `filters` اضافه شود**
                     filters["facilities"] = mapped_facilities
@@ -3668,7 +2775,7 @@ async def real_estate_chatbot(user_message: str) -> str:
         print("🔹 فیلترهای اصلاح‌شده و ارسال‌شده به API:", filters)
         # logging.info(f"extracted filters: {filters}")
 
-        memory_state = filters.copy()
+        memory_state = state.memory_state = filters.copy()
 
         if "delivery_date" in memory_state:
             del memory_state["delivery_date"]
@@ -3680,20 +2787,16 @@ async def real_estate_chatbot(user_message: str) -> str:
         if "min_area" in memory_state:
             del memory_state["min_area"]
 
-        properties = filter_properties(memory_state)
-
-        # ✅ فیلتر `delivery_date` (تحویل ملک) فقط بر اساس سال
-        if filters_date.get("delivery_date"):
-            target_year = filters_date["delivery_date"]  # سال موردنظر کاربر
-            start_of_year = int(datetime(target_year, 1, 1).timestamp())  # تبدیل به یونیکس (ژانویه)
-            end_of_year = int(datetime(target_year, 12, 31, 23, 59, 59).timestamp())  # تبدیل به یونیکس (دسامبر)
-
-            properties = [
-                prop for prop in properties
-                if "delivery_date" in prop and prop["delivery_date"].isdigit() and 
-                start_of_year <= int(prop["delivery_date"]) <= end_of_year
-            ]
+        # ✅ فیلتر `delivery_date` (تحویل ملک) فقط بر اساس سال و فیلتر مساحت، همراه با بقیه فیلترها روی ستون‌های NumPy
+        target_year = filters_date.get("delivery_date")  # سال موردنظر کاربر
+        properties = await search_properties(
+            memory_state,
+            delivery_year=target_year or None,
+            min_area=filters_area.get("min_area"),
+            max_area=filters_area.get("max_area"),
+        )
 
+        if target_year:
             print(f"🔍 بعد از فیلتر بر اساس سال تحویل ({target_year}): {len(properties)}")
 
         if "delivery_date" in filters_date:
@@ -3705,14 +2808,7 @@ async def real_estate_chatbot(user_message: str) -> str:
         if filters_area.get("min_area") is not None or filters_area.get("max_area") is not None:
             min_area = filters_area.get("min_area", 0)
             max_area = filters_area.get("max_area", float("inf"))
-
-            properties = [
-                prop for prop in properties
-                if "min_area" in prop and prop["min_area"] is not None and isinstance(prop["min_area"], (int, float)) and
-                (min_area * 10.7639) <= float(prop["min_area"]) <= (max_area * 10.7639)
-            ]
-
-            print(f"📐 بعد از فیلتر بر اساس مساحت پروژه (sqft) بین {min_area * 10.7639} تا {max_area * 10.7639}: {len(properties)}")
+            print(f"📐 بعد از فیلتر بر اساس مساحت پروژه (sqft) بین {min_area * SQM_TO_SQFT} تا {max_area * SQM_TO_SQFT}: {len(properties)}")
 
 
         if "max_area" in filters_area:
@@ -3741,10 +2837,8 @@ async def real_estate_chatbot(user_message: str) -> str:
         print(f"🔹 تعداد املاک نهایی دریافت‌شده از API: {len(properties)}")
         # print(properties[:3])
 
-        properties = sort_properties_by_developer_popularity(properties)
-
         # response = generate_ai_summary(properties)
-        response = await generate_ai_summary(properties)
+        response = await generate_ai_summary(state, properties)
 
 
         return response
@@ -3755,15 +2849,8 @@ async def real_estate_chatbot(user_message: str) -> str:
 
 
 
-# ✅ مسیر API برای چت‌بات
-@app.post("/chat")
-async def chat(request: ChatRequest):
-
-    user_message = request.message.strip()
-
-    # ✅ **۱. اگر چت‌بات برای اولین بار باز شود، پیام خوش‌آمدگویی ارسال کند**
-    if not user_message:
-        welcome_message = """
+# ✅ پیام خوش‌آمدگویی (برای /chat و /chat/stream)
+WELCOME_MESSAGE = """
             <div style="text-align: right; direction: rtl; background-color: #e6f7ff; padding: 12px; border-radius: 10px; border: 1px solid #b3d8ff;">
                 <p style="margin-top: 0; font-weight: bold; font-size: 16px;">👋 به چت‌بات مشاور املاک <span style="color: #000000;">شرکت ترونست</span> خوش آمدید!</p>
                 <p style="margin: 6px 0;">من اینجا هستم تا به شما در پیدا کردن <b>بهترین املاک در دبی</b> کمک کنم. 🏡✨</p>
@@ -3771,19 +2858,122 @@ async def chat(request: ChatRequest):
                 <p style="margin-bottom: 0;"><b>چطور می‌توانم کمکتان کنم؟</b></p>
             </div>
             """
-        # welcome_message = """
-        # 👋 **به چت‌بات مشاور املاک شرکت ترونست خوش آمدید!**  
-        # من اینجا هستم تا به شما در پیدا کردن **بهترین املاک در دبی** کمک کنم. 🏡✨  
 
-        # **چطور می‌توانم کمکتان کنم؟**  
-        # """
-        return {"response": welcome_message}
+
+# ✅ مسیر API برای چت‌بات
+@app.post("/chat")
+async def chat(request: ChatRequest):
+
+    user_message = request.message.strip()
+    session_id = request.session_id or sessions.new_session_id()
+
+    # ✅ **۱. اگر چت‌بات برای اولین بار باز شود، پیام خوش‌آمدگویی ارسال کند**
+    if not user_message:
+        return {"response": WELCOME_MESSAGE, "session_id": session_id}
 
 
     """ دریافت پیام کاربر و ارسال پاسخ از طریق هوش مصنوعی """
-    bot_response = await real_estate_chatbot(request.message)
+    state = sessions.get(session_id)
+    async with state.lock:
+        bot_response = await real_estate_chatbot(state, request.message)
+    sessions.commit(state)
     # logging.info(f"bot_response: {bot_response}")
-    return {"response": bot_response}
+    return {"response": bot_response, "session_id": session_id}
+
+
+# پاسخ جایگزین وقتی پردازش پیام استریم با خطا تمام شود
+STREAM_ERROR_MESSAGE = "⚠️ متأسفانه در پردازش پیام شما خطایی رخ داد. لطفاً چند لحظه بعد دوباره امتحان کنید."
+
+
+def sse_event(event, data):
+    """ قالب یک رویداد Server-Sent Events با داده JSON """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# ✅ نسخه استریم چت: متن بالای لیست، کارت‌های هر صفحه و متن پایانی به صورت تکه‌های جدا ارسال می‌شوند
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+
+    user_message = request.message.strip()
+    session_id = request.session_id or sessions.new_session_id()
+
+    async def events():
+        if not user_message:
+            yield sse_event("done", {"response": WELCOME_MESSAGE, "session_id": session_id})
+            return
+
+        state = sessions.get(session_id)
+        streamed = False
+        async with state.lock:
+            queue = state.stream = asyncio.Queue()
+            turn = asyncio.create_task(real_estate_chatbot(state, request.message))
+            try:
+                while not turn.done():
+                    next_chunk = asyncio.ensure_future(queue.get())
+                    await asyncio.wait({next_chunk, turn}, return_when=asyncio.FIRST_COMPLETED)
+                    if next_chunk.done():
+                        streamed = True
+                        yield sse_event("chunk", next_chunk.result())
+                    else:
+                        next_chunk.cancel()
+
+                # تکه‌هایی که همزمان با پایان پاسخ در صف مانده‌اند
+                while not queue.empty():
+                    streamed = True
+                    yield sse_event("chunk", queue.get_nowait())
+
+                bot_response = turn.result()
+                failure = None
+            except Exception as e:
+                # ✅ خطای پردازش (مثل HTTPException مسیر بازار) نباید استریم را بدون رویداد پایانی ببندد
+                print(f"❌ خطا در پردازش پیام استریم: {e!r}")
+                failure = e.detail if isinstance(e, HTTPException) else "internal_error"
+            finally:
+                state.stream = None
+                # اگر کلاینت وسط کار قطع شود، پردازش هم متوقف می‌شود
+                if not turn.done():
+                    turn.cancel()
+        sessions.commit(state)
+
+        if failure is not None:
+            yield sse_event("error", {"message": failure, "session_id": session_id})
+            yield sse_event("done", {"response": STREAM_ERROR_MESSAGE, "session_id": session_id})
+            return
+
+        # اگر پاسخ تکه‌تکه ارسال شده، متن کامل دوباره فرستاده نمی‌شود
+        yield sse_event("done", {"response": None if streamed else bot_response, "session_id": session_id})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ✅ آمار داخلی سرویس برای پایش
+@app.get("/stats")
+async def service_stats():
+    return {
+        "sessions": sessions.stats(),
+        "llm": llm.stats(),
+        "llm_timeout_replies": dict(timeout_replies),
+        "intent_router": intent_router.stats(),
+        "intent_cache": intent_cache.stats() if intent_cache is not None else None,
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+        "web_search": web_search.stats(),
+        "knowledge_base": knowledge_base.stats() if knowledge_base is not None else None,
+        "inventory": inventory.stats(),
+        "estaty": estaty.stats(),
+        "cards": card_renderer.stats(),
+        "prompt_projection": prompt_projector.stats(),
+        "result_sets": result_sets.stats() if result_sets is not None else None,
+        "page_prefetch": page_prefetcher.stats(),
+        "fuzzy_match": {
+            "districts": DISTRICTS.match_stats(),
+            "developers": DEVELOPERS.match_stats(),
+            "facilities": FACILITIES.match_stats(),
+        },
+    }
 
 
 from fastapi.responses import FileResponse
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import time
+
+
+class PagePrefetcher:
+    """ آماده‌سازی پس‌زمینه صفحه بعدی نتایج هر مکالمه؛ با سقف سراسری تسک‌ها و لغو وقتی مکالمه جلو رفته است """
+
+    def __init__(self, max_tasks=16, ttl=600):
+        self.max_tasks = max_tasks
+        self.ttl = ttl
+        # session_id ← (توکن صفحه، تسک، زمان ساخت)
+        self._pages = {}
+
+        self.scheduled = 0
+        self.skipped = 0
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+        self.errors = 0
+
+    def running(self):
+        return sum(1 for _, task, _ in self._pages.values() if not task.done())
+
+    def schedule(self, session_id, token, build):
+        """ شروع ساخت صفحه بعد (build یک coroutine است)؛ توکن مشخص می‌کند صفحه برای کدام وضعیت ساخته شده """
+        self.cancel(session_id)
+        self._expire()
+        if self.max_tasks <= 0 or self.running() >= self.max_tasks:
+            # ✅ زیر بار، صفحه بعد مثل قبل هنگام درخواست ساخته می‌شود
+            build.close()
+            self.skipped += 1
+            return
+
+        task = asyncio.create_task(build)
+        task.add_done_callback(self._log_error)
+        self._pages[session_id] = (token, task, time.monotonic())
+        self.scheduled += 1
+
+    async def take(self, session_id, token):
+        """ صفحه آماده‌شده برای همین وضعیت (منتظر می‌ماند اگر هنوز در حال ساخت است) یا None """
+        entry = self._pages.pop(session_id, None)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        prepared_token, task, _ = entry
+        if prepared_token != token:
+            # مکالمه جلو رفته (جستجوی جدید یا صفحه دیگر)؛ صفحه آماده‌شده به درد نمی‌خورد
+            self._cancel_task(task)
+            self.misses += 1
+            return None
+
+        try:
+            # shield: اگر خود درخواست لغو شود، تسک ساخت صفحه لغو نمی‌شود
+            page = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+            self.misses += 1
+            return None
+        except Exception:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return page
+
+    def cancel(self, session_id):
+        entry = self._pages.pop(session_id, None)
+        if entry is not None:
+            self._cancel_task(entry[1])
+
+    def _cancel_task(self, task):
+        if not task.done():
+            task.cancel()
+            self.cancelled += 1
+
+    def _expire(self):
+        # صفحه‌های مکالمه‌هایی که دیگر «بیشتر» نخواستند (یا حذف شده‌اند) بعد از ttl دور ریخته می‌شوند
+        now = time.monotonic()
+        for session_id, (_, _, created_at) in list(self._pages.items()):
+            if now - created_at > self.ttl:
+                self.cancel(session_id)
+
+    def _log_error(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+            print(f"⚠️ خطا در آماده‌سازی پس‌زمینه صفحه بعد: {task.exception()}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "prepared": len(self._pages),
+            "running": self.running(),
+            "scheduled": self.scheduled,
+            "skipped_over_budget": self.skipped,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "cancelled": self.cancelled,
+            "errors": self.errors,
+        }
+
+
+def page_prefetcher_from_env():
+    """ ساخت PagePrefetcher با تنظیمات متغیرهای محیطی (PAGE_PREFETCH_MAX_TASKS=0 غیرفعالش می‌کند) """
+    return PagePrefetcher(
+        max_tasks=int(os.getenv("PAGE_PREFETCH_MAX_TASKS", "16")),
+        ttl=int(os.getenv("PAGE_PREFETCH_TTL", "600")),
+    )
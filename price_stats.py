@@ -0,0 +1,137 @@
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from property_index import _ref_id
+
+
+# ✅ ابعاد بخش‌بندی؛ ANY یعنی «همه» در آن بُعد (برای سوال بدون منطقه، اتاق‌خواب یا نوع واحد)
+ANY = -1
+PARTITION_FILTERS = ("district", "apartments", "apartmentType")
+
+PriceSummary = namedtuple(
+    "PriceSummary", ["count", "min", "p25", "median", "p75", "max", "per_sqft_median", "per_sqft_count"]
+)
+
+
+def quantile(sorted_values, q):
+    """ چندک q از آرایه مرتب با درون‌یابی خطی (همان روش پیش‌فرض np.percentile) بدون مرتب‌سازی دوباره """
+    position = q * (len(sorted_values) - 1)
+    low = math.floor(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return float(sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low))
+
+
+def summarize(prices, per_sqft):
+    """ خلاصه آماری از آرایه‌های مرتب قیمت و قیمت هر فوت مربع؛ None اگر قیمتی نیست """
+    if not len(prices):
+        return None
+    return PriceSummary(
+        count=len(prices),
+        min=float(prices[0]),
+        p25=quantile(prices, 0.25),
+        median=quantile(prices, 0.5),
+        p75=quantile(prices, 0.75),
+        max=float(prices[-1]),
+        per_sqft_median=quantile(per_sqft, 0.5) if len(per_sqft) else None,
+        per_sqft_count=len(per_sqft),
+    )
+
+
+def summarize_properties(properties):
+    """ همان خلاصه برای لیست املاکی که از جستجوی عادی آمده‌اند """
+    prices = []
+    per_sqft = []
+    for prop in properties:
+        price = prop.get("low_price")
+        if not isinstance(price, (int, float)) or isinstance(price, bool):
+            continue
+        prices.append(price)
+        area = prop.get("min_area")
+        if isinstance(area, (int, float)) and not isinstance(area, bool) and area > 0:
+            per_sqft.append(price / area)
+    return summarize(np.sort(np.asarray(prices, dtype=np.float64)), np.sort(np.asarray(per_sqft, dtype=np.float64)))
+
+
+def _type_ids(value):
+    if not isinstance(value, list):
+        value = [value] if value is not None else []
+    return {_ref_id(item) for item in value} - {-1}
+
+
+class PriceStatistics:
+    """ آرایه‌های مرتب قیمت (low_price) و قیمت هر فوت مربع املاک قابل فروش به تفکیک (منطقه، اتاق‌خواب، نوع واحد)
+
+    بعد از هر همگام‌سازی یک بار ساخته می‌شود؛ هر سوال قیمت یک جستجوی دیکشنری و چند خواندن با ایندکس است.
+    """
+
+    def __init__(self, index):
+        self.district_codes = dict(index.district_codes)
+        prices = {}
+        per_sqft = {}
+        for i, prop in enumerate(index.properties):
+            price = index.price[i]
+            if not index.available[i] or np.isnan(price):
+                continue
+            area = index.area[i]
+            districts = (int(index.district[i]), ANY) if index.district[i] >= 0 else (ANY,)
+            mask = int(index.bedrooms[i])
+            bedrooms = [bit for bit in range(64) if mask >> bit & 1] + [ANY]
+            types = sorted(_type_ids(prop.get("apartmentType"))) + [ANY]
+            for district in districts:
+                for bedroom in bedrooms:
+                    for apartment_type in types:
+                        key = (district, bedroom, apartment_type)
+                        prices.setdefault(key, []).append(price)
+                        if area > 0:
+                            per_sqft.setdefault(key, []).append(price / area)
+
+        self._prices = {key: np.sort(np.asarray(values)) for key, values in prices.items()}
+        self._per_sqft = {key: np.sort(np.asarray(per_sqft.get(key, []), dtype=np.float64)) for key in prices}
+        self.properties = len(index)
+
+    def __len__(self):
+        return len(self._prices)
+
+    def supports(self, filters, delivery_year=None, min_area=None, max_area=None):
+        """ آیا این فیلترها فقط ابعاد بخش‌بندی را دارند؟ (سال تحویل، مساحت، امکانات و ... به جستجوی عادی می‌روند) """
+        if delivery_year is not None or min_area is not None or max_area is not None:
+            return False
+        if any(value is not None for key, value in filters.items() if key not in PARTITION_FILTERS):
+            return False
+        for key in ("apartments", "apartmentType"):
+            values = filters.get(key)
+            if values is not None and (not isinstance(values, list) or len(values) != 1 or _ref_id(values[0]) < 0):
+                return False
+        if filters.get("apartments") is not None and _ref_id(filters["apartments"][0]) >= 64:
+            return False
+        return True
+
+    def partition(self, filters):
+        """ کلید بخش برای فیلترها؛ None اگر منطقه در فهرست نیست """
+        district = ANY
+        if filters.get("district"):
+            district = self.district_codes.get(str(filters["district"]).lower())
+            if district is None:
+                return None
+        apartments = filters.get("apartments")
+        apartment_type = filters.get("apartmentType")
+        return (
+            district,
+            _ref_id(apartments[0]) if apartments else ANY,
+            _ref_id(apartment_type[0]) if apartment_type else ANY,
+        )
+
+    def summary(self, filters):
+        """ خلاصه قیمت بخش این فیلترها؛ None اگر ملکی با قیمت نیست """
+        key = self.partition(filters)
+        if key not in self._prices:
+            return None
+        return summarize(self._prices[key], self._per_sqft[key])
+
+    def stats(self):
+        return {
+            "partitions": len(self),
+            "properties": self.properties,
+        }
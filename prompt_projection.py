@@ -0,0 +1,200 @@
+import json
+import os
+import re
+
+from property_cards import delivery_datetime
+
+
+# ✅ بودجه پیش‌فرض توکن داده ملک در هر پرامپت (برای compare به ازای هر ملک)
+DEFAULT_BUDGETS = {
+    "details": 1500,
+    "details_price": 700,
+    "details_features": 700,
+    "details_location": 600,
+    "details_payment": 700,
+    "compare": 900,
+    "purchase": 1100,
+}
+
+# فیلدهایی که همیشه (در صورت وجود) اول می‌آیند
+COMMON_FIELDS = ("id", "title", "property_url")
+
+# ✅ فیلدهای لازم هر پرامپت به صورت الگوی نام کلید، به ترتیب اولویت؛ True یعنی بقیه فیلدها هم (با اولویت کمتر) می‌مانند
+INTENT_FIELDS = {
+    "details": (
+        ("district", "city", "location", "address", "status", "delivery", "area", "price", "apartment",
+         "bedroom", "facilit", "amenit", "payment", "developer", "property_type", "description", "about", "overview"),
+        True,
+    ),
+    "details_price": (("price", "apartment", "bedroom", "unit", "area", "payment"), False),
+    "details_features": (("facilit", "amenit", "feature", "description", "about", "property_type", "apartment"), False),
+    "details_location": (("district", "city", "location", "address", "community", "nearby", "landmark", "description"), False),
+    "details_payment": (("payment", "post_delivery", "installment", "down", "price", "delivery", "guarantee"), False),
+    "compare": (
+        ("price", "area", "apartment", "bedroom", "district", "city", "location", "status", "delivery",
+         "facilit", "amenit", "developer", "payment", "property_type"),
+        False,
+    ),
+    "purchase": (
+        ("price", "payment", "post_delivery", "installment", "down", "discount", "offer", "guarantee",
+         "status", "delivery", "developer", "district", "apartment"),
+        False,
+    ),
+}
+
+# کلیدهایی که برای مدل ارزشی ندارند (تصاویر، مختصات، شناسه‌های داخلی، زمان‌های سیستمی)
+DROP_KEYS = {"lat", "lng", "latitude", "longitude", "slug", "created_at", "updated_at", "deleted_at", "pivot", "cover"}
+DROP_KEY_PARTS = ("image", "photo", "video", "gallery", "logo", "icon", "thumbnail", "media", "brochure")
+
+HTML_TAG = re.compile(r"<[^>]+>")
+WHITESPACE = re.compile(r"\s+")
+
+
+def estimate_tokens(text):
+    """ تخمین محلی تعداد توکن: متن انگلیسی/JSON حدود ۴ کاراکتر، متن فارسی حدود ۲ کاراکتر به ازای هر توکن """
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars + 1) // 2 + 1
+
+
+def compact_json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _dropped(key, top_level):
+    key = str(key).lower()
+    if key in DROP_KEYS or any(part in key for part in DROP_KEY_PARTS):
+        return True
+    # شناسه‌های تو در تو (مثل developer_company.id) فقط حجم اضافه‌اند
+    return not top_level and (key == "id" or key.endswith("_id"))
+
+
+class PromptProjector:
+    """ انتخاب فیلدهای لازم هر پرامپت از رکورد ملک، فشرده‌سازی و رعایت بودجه توکن """
+
+    def __init__(self, budgets=None, max_text_chars=600, max_list_items=12):
+        self.budgets = dict(DEFAULT_BUDGETS, **(budgets or {}))
+        self.max_text_chars = max_text_chars
+        self.max_list_items = max_list_items
+
+        self.calls = {}
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.truncated = 0
+
+    def project(self, prop, intent):
+        """ JSON فشرده فیلدهای لازم این intent در حد بودجه توکن """
+        budget = self.budgets.get(intent, self.budgets["details"])
+        fields = self._select(prop or {}, intent)
+
+        projected = {}
+        used = estimate_tokens("{}")
+        for key, value in fields:
+            cost = estimate_tokens(compact_json({key: value})) - 1
+            if used + cost > budget:
+                self.truncated += 1
+                value = self._fit(key, value, budget - used)
+                if value is None:
+                    continue
+                cost = estimate_tokens(compact_json({key: value})) - 1
+            projected[key] = value
+            used += cost
+
+        text = compact_json(projected)
+        self.calls[intent] = self.calls.get(intent, 0) + 1
+        self.tokens_before += estimate_tokens(json.dumps(prop, ensure_ascii=False, indent=2, default=str))
+        self.tokens_after += estimate_tokens(text)
+        return text
+
+    def _select(self, prop, intent):
+        """ فیلدهای فشرده‌شده به ترتیب اولویت """
+        patterns, keep_rest = INTENT_FIELDS.get(intent, INTENT_FIELDS["details"])
+
+        def priority(key):
+            if key in COMMON_FIELDS:
+                return COMMON_FIELDS.index(key)
+            lowered = key.lower()
+            for i, pattern in enumerate(patterns):
+                if pattern in lowered:
+                    return len(COMMON_FIELDS) + i
+            return None if not keep_rest else len(COMMON_FIELDS) + len(patterns)
+
+        ranked = []
+        for key, value in prop.items():
+            rank = priority(str(key))
+            if rank is None or (key not in COMMON_FIELDS and _dropped(key, top_level=True)):
+                continue
+            value = self._compact(key, value)
+            if value is None:
+                continue
+            ranked.append((rank, key, value))
+
+        ranked.sort(key=lambda item: item[0])  # مرتب‌سازی پایدار: ترتیب اصلی در هر اولویت حفظ می‌شود
+        return [(key, value) for _, key, value in ranked]
+
+    def _compact(self, key, value):
+        """ حذف مقادیر خالی، تبدیل {id, name} به name، تاریخ یونیکس به تاریخ، حذف HTML و کوتاه کردن متن‌ها """
+        if value is None or value == "" or value == [] or value == {}:
+            return None
+
+        if isinstance(value, dict):
+            # مرجع‌هایی مثل {"id": 5, "name": "Dubai Marina"} فقط با نام می‌مانند
+            if "name" in value and all(k == "name" or _dropped(k, top_level=False) for k in value):
+                return self._compact(key, value["name"])
+            compacted = {}
+            for k, v in value.items():
+                if _dropped(k, top_level=False):
+                    continue
+                v = self._compact(k, v)
+                if v is not None:
+                    compacted[k] = v
+            return compacted or None
+
+        if isinstance(value, list):
+            items = [self._compact(key, v) for v in value[:self.max_list_items]]
+            items = [v for v in items if v is not None]
+            return items or None
+
+        if isinstance(value, str):
+            if str(key).lower().endswith("date") and value.isdigit():
+                date = delivery_datetime(value)
+                return date.date().isoformat() if date else value
+            text = WHITESPACE.sub(" ", HTML_TAG.sub(" ", value)).strip()
+            if len(text) > self.max_text_chars:
+                text = text[:self.max_text_chars].rstrip() + "…"
+            return text or None
+
+        return value
+
+    def _fit(self, key, value, remaining):
+        """ کوتاه کردن یک فیلد تا در باقی‌مانده بودجه جا شود (متن کوتاه‌تر یا لیست کوتاه‌تر) """
+        if remaining < 16:
+            return None
+        if isinstance(value, str):
+            ratio = estimate_tokens(value) / max(len(value), 1)
+            chars = int((remaining - estimate_tokens(compact_json({key: ""}))) / ratio)
+            return value[:chars].rstrip() + "…" if chars >= 40 else None
+        if isinstance(value, list):
+            items = []
+            for item in value:
+                if estimate_tokens(compact_json({key: items + [item]})) > remaining:
+                    break
+                items.append(item)
+            return items or None
+        return None
+
+    def stats(self):
+        return {
+            "calls": dict(self.calls),
+            "estimated_tokens_before": self.tokens_before,
+            "estimated_tokens_after": self.tokens_after,
+            "saved_ratio": round(1 - self.tokens_after / self.tokens_before, 3) if self.tokens_before else 0.0,
+            "truncated_fields": self.truncated,
+        }
+
+
+def prompt_projector_from_env():
+    """ ساخت PromptProjector با تنظیمات متغیرهای محیطی """
+    return PromptProjector(
+        max_text_chars=int(os.getenv("PROMPT_MAX_TEXT_CHARS", "600")),
+        max_list_items=int(os.getenv("PROMPT_MAX_LIST_ITEMS", "12")),
+    )
@@ -0,0 +1,242 @@
+import html
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+from openai import LengthFinishReasonError, ContentFilterFinishReasonError
+from pydantic import BaseModel, ValidationError
+
+from llm_gateway import LLMTimeoutError
+from summary_cache import SummaryCache
+
+
+# ✅ نام ماه‌های میلادی به فارسی
+MONTH_NAMES = [
+    "ژانویه", "فوریه", "مارس", "آوریل", "مه", "ژوئن",
+    "ژوئیه", "اوت", "سپتامبر", "اکتبر", "نوامبر", "دسامبر",
+]
+
+PLACEHOLDER_IMAGE = "https://via.placeholder.com/150"
+PROPERTY_URL = "https://www.trunest.ae/property/{}"
+
+# ✅ با تغییر پرامپت معرفی کوتاه این عدد را بالا ببرید تا متن‌های کش‌شده قبلی استفاده نشوند
+BLURB_PROMPT_VERSION = 1
+
+
+def delivery_datetime(value):
+    """ تاریخ تحویل Estaty (یونیکس به صورت عدد/رشته یا رشته YYYY-MM-DD) به datetime با منطقه UTC """
+    if isinstance(value, int) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    if isinstance(value, str):
+        if value.isdigit():
+            return datetime.fromtimestamp(int(value), tz=timezone.utc)
+        try:
+            return datetime.strptime(value[:10], "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        except ValueError:
+            return None
+    return None
+
+
+def round_to_month(date):
+    """ گرد کردن تاریخ به نزدیک‌ترین ماه (مثلاً آخر فوریه ۲۰۲۷ ← مارس ۲۰۲۷) """
+    if date.day > 15:
+        date = date.replace(day=1) + timedelta(days=32)
+    return date.year, date.month
+
+
+def format_delivery(value, now=None):
+    """ وضعیت و ماه تحویل، مثل «در حال ساخت – تحویل مارس 2027» """
+    date = delivery_datetime(value)
+    if date is None:
+        return "نامشخص"
+    now = now or datetime.now(timezone.utc)
+    if date <= now:
+        return "آماده تحویل"
+    year, month = round_to_month(date)
+    return f"در حال ساخت – تحویل {MONTH_NAMES[month - 1]} {year}"
+
+
+def format_aed(value):
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or value <= 0:
+        return "تماس بگیرید"
+    return f"{value:,.0f} درهم"
+
+
+def format_area(value):
+    # مساحت در Estaty به فوت مربع است
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or value <= 0:
+        return "نامشخص"
+    return f"{value:,.0f} فوت مربع"
+
+
+def _name(value):
+    if isinstance(value, dict):
+        value = value.get("name")
+    return str(value).strip() if value else ""
+
+
+def format_location(prop):
+    parts = [_name(prop.get("district")), _name(prop.get("city"))]
+    return "، ".join(p for p in parts if p) or "دبی"
+
+
+def render_card(prop, index, blurb=None):
+    """ کارت HTML یک ملک فقط از روی فیلدهای لیست (بدون فراخوانی مدل) """
+    property_id = prop.get("id")
+    image_url = html.escape(prop.get("cover") or PLACEHOLDER_IMAGE, quote=True)
+    title = html.escape(str(prop.get("title", "")).strip())
+    link = PROPERTY_URL.format(property_id)
+
+    intro = f"<p>{html.escape(blurb)}</p>" if blurb else ""
+
+    return f"""
+        <div style="display: flex; flex-direction: column; align-items: center; padding: 10px;">
+            <img src="{image_url}" alt="تصویر ملک" style="width: 250px; height: 180px; border-radius: 8px; object-fit: cover;">
+            <div style="flex-grow: 1; text-align: right;">
+                <h3>🏡 {index}. {title}</h3>
+                {intro}
+                <p><b>📍 موقعیت:</b> {html.escape(format_location(prop))}</p>
+                <p><b>🏗️ زمان تحویل:</b> {format_delivery(prop.get("delivery_date"))}</p>
+                <p><b>💲 شروع قیمت:</b> {format_aed(prop.get("low_price"))}</p>
+                <p><b>📏 حداقل مساحت:</b> {format_area(prop.get("min_area"))}</p>
+                <p><a href="{link}">🔗 مشاهده اطلاعات کامل در سایت Trunest</a></p>
+            </div>
+        </div>
+        """
+
+
+def blurb_fields(prop):
+    """ فیلدهایی که به پرامپت معرفی داده می‌شوند """
+    return {
+        "title": prop.get("title"),
+        "district": _name(prop.get("district")),
+        "developer": _name(prop.get("developer_company")),
+        "property_type": _name(prop.get("property_type")),
+    }
+
+
+def blurb_version(prop):
+    """ هش نسخه ملک برای کش معرفی: فیلدهای پرامپت + قیمت، وضعیت فروش و تاریخ تحویل """
+    delivery = delivery_datetime(prop.get("delivery_date"))
+    return SummaryCache.content_hash({
+        "prompt_version": BLURB_PROMPT_VERSION,
+        **blurb_fields(prop),
+        "low_price": prop.get("low_price"),
+        "sales_status": _name(prop.get("sales_status")),
+        "delivery_date": delivery.date().isoformat() if delivery else None,
+    })
+
+
+# ✅ خروجی ساخت‌یافته معرفی کوتاه املاک یک صفحه (یک فراخوانی برای همه کارت‌ها)
+class CardBlurb(BaseModel):
+    index: int
+    blurb: str
+
+
+class CardBlurbs(BaseModel):
+    blurbs: list[CardBlurb]
+
+
+class CardRenderer:
+    """ ساخت کارت‌های یک صفحه از نتایج؛ معرفی کوتاه با یک فراخوانی مدل و قابل خاموش شدن زیر بار """
+
+    def __init__(self, llm, blurbs=True, blurb_max_in_flight=8, summary_cache=None):
+        self.llm = llm
+        self.summary_cache = summary_cache
+        self.blurbs = blurbs
+        self.blurb_max_in_flight = blurb_max_in_flight
+
+        self.pages = 0
+        self.cards = 0
+        self.blurb_calls = 0
+        self.blurbs_skipped = 0
+        self.blurb_errors = 0
+
+    async def render(self, properties, start_index):
+        """ لیست (شماره، HTML) کارت‌ها به ترتیب """
+        numbered = list(enumerate(properties, start=start_index))
+        blurbs = await self.page_blurbs(numbered)
+
+        self.pages += 1
+        self.cards += len(numbered)
+        return [(index, render_card(prop, index, blurbs.get(index))) for index, prop in numbered]
+
+    async def page_blurbs(self, numbered):
+        if not self.blurbs or not numbered:
+            return {}
+
+        # ✅ معرفی‌های قبلی همین نسخه از ملک از کش ماندگار خوانده می‌شوند
+        keys = {index: (prop.get("id"), blurb_version(prop)) for index, prop in numbered}
+        cached = {}
+        if self.summary_cache is not None:
+            cached = await self.summary_cache.get_many(list(keys.values()))
+        blurbs = {index: cached[key] for index, key in keys.items() if key in cached}
+
+        missing = [(index, prop) for index, prop in numbered if index not in blurbs]
+        if not missing:
+            return blurbs
+
+        # زیر بار، کارت‌های بدون کش بدون معرفی و بدون انتظار برای مدل ارسال می‌شوند
+        if self.llm.in_flight >= self.blurb_max_in_flight:
+            self.blurbs_skipped += 1
+            return blurbs
+
+        generated = await self.generate_blurbs(missing)
+        if generated and self.summary_cache is not None:
+            await self.summary_cache.put_many({keys[index]: blurb for index, blurb in generated.items()})
+        return {**blurbs, **generated}
+
+    async def generate_blurbs(self, numbered):
+        projected = [{"index": index, **blurb_fields(prop)} for index, prop in numbered]
+        prompt = f"""
+        شما یک مشاور املاک در دبی هستید. برای هر پروژه زیر یک معرفی کوتاه، جذاب و حرفه‌ای به زبان فارسی بنویسید (حداکثر دو جمله).
+        قیمت، متراژ، تاریخ تحویل و لینک را ننویسید؛ این‌ها جداگانه نمایش داده می‌شوند.
+        برای هر پروژه همان `index` را برگردانید.
+
+        {json.dumps(projected, ensure_ascii=False, indent=2)}
+        """
+
+        self.blurb_calls += 1
+        try:
+            completion = await self.llm.parse(
+                "card_blurbs",
+                messages=[{"role": "system", "content": prompt}],
+                response_format=CardBlurbs,
+                max_tokens=120 * len(numbered),
+            )
+            parsed = completion.choices[0].message.parsed
+        except (LLMTimeoutError, ValidationError, LengthFinishReasonError, ContentFilterFinishReasonError) as e:
+            self.blurb_errors += 1
+            print(f"⚠️ معرفی کوتاه کارت‌ها ساخته نشد، کارت‌ها بدون آن نمایش داده می‌شوند: {e}")
+            return {}
+
+        if parsed is None:
+            self.blurb_errors += 1
+            return {}
+        wanted = {index for index, _ in numbered}
+        return {
+            item.index: item.blurb.strip()
+            for item in parsed.blurbs
+            if item.index in wanted and item.blurb.strip()
+        }
+
+    def stats(self):
+        return {
+            "blurbs_enabled": self.blurbs,
+            "pages": self.pages,
+            "cards": self.cards,
+            "blurb_calls": self.blurb_calls,
+            "blurbs_skipped_under_load": self.blurbs_skipped,
+            "blurb_errors": self.blurb_errors,
+            "summary_cache": self.summary_cache.stats() if self.summary_cache is not None else None,
+        }
+
+
+def card_renderer_from_env(llm, summary_cache=None):
+    """ ساخت CardRenderer با تنظیمات متغیرهای محیطی """
+    return CardRenderer(
+        llm,
+        blurbs=os.getenv("CARD_BLURBS", "on").lower() not in ("0", "off", "false", "no"),
+        blurb_max_in_flight=int(os.getenv("CARD_BLURB_MAX_IN_FLIGHT", "8")),
+        summary_cache=summary_cache,
+    )
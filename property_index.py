@@ -0,0 +1,231 @@
+import operator
+from datetime import datetime
+
+import numpy as np
+
+
+# ✅ ضریب تبدیل متر مربع (ورودی کاربر) به فوت مربع (مساحت ذخیره‌شده در Estaty)
+SQM_TO_SQFT = 10.7639
+
+# رتبه توسعه‌دهنده‌هایی که در جدول محبوبیت نیستند (ته لیست)
+UNRANKED = np.iinfo(np.int32).max
+
+FLAG_COLUMNS = ("payment_plan", "post_delivery", "guarantee_rental_guarantee")
+
+# حداقل تعداد املاکی که در هر مرحله مرتب می‌شوند (چند صفحه سه‌تایی)
+MIN_RANKED_BATCH = 12
+
+
+def year_bounds(year):
+    """ بازه یونیکس یک سال کامل (همان محاسبه قبلی بر اساس ساعت محلی سرور) """
+    start_of_year = int(datetime(year, 1, 1).timestamp())
+    end_of_year = int(datetime(year, 12, 31, 23, 59, 59).timestamp())
+    return start_of_year, end_of_year
+
+
+def _number(value):
+    # مثل فیلترهای قبلی فقط مقدار عددی واقعی پذیرفته می‌شود
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return np.nan
+
+
+def _epoch(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return -1
+
+
+def _ref_id(value):
+    if isinstance(value, dict):
+        value = value.get("id")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+def extend_order(keys, order, count):
+    """ مرتب کردن حداقل count مورد اول keys (شماره‌ها در order)؛ هر بار که صفحه‌ها جلو می‌روند اندازه دو برابر می‌شود """
+    n = len(keys)
+    if count <= len(order) or len(order) == n:
+        return order
+    k = min(n, max(count, 2 * len(order), MIN_RANKED_BATCH))
+    if k < n:
+        top = np.argpartition(keys, k - 1)[:k]
+    else:
+        top = np.arange(n)
+    return top[np.argsort(keys[top])]
+
+
+def _bitmask(items):
+    """ تبدیل لیست نوع واحدها (apartments) به بیت‌ماسک؛ شناسه‌های بالای ۶۳ جداگانه بررسی می‌شوند """
+    mask = 0
+    for item in items or []:
+        bit = _ref_id(item)
+        if 0 <= bit < 64:
+            mask |= 1 << bit
+    return mask
+
+
+class PropertyIndex:
+    """ ذخیره ستونی املاک با NumPy تا فیلترها به صورت ماسک بولی و بدون حلقه پایتون اجرا شوند """
+
+    def __init__(self, properties, developer_rank=None):
+        self.properties = list(properties)
+        developer_rank = developer_rank or {}
+        self.district_codes = {}
+
+        n = len(self.properties)
+        self.ids = np.empty(n, dtype=np.int64)
+        self.price = np.empty(n, dtype=np.float64)
+        self.area = np.empty(n, dtype=np.float64)
+        self.delivery = np.empty(n, dtype=np.int64)
+        self.district = np.empty(n, dtype=np.int32)
+        self.developer = np.empty(n, dtype=np.int64)
+        self.rank = np.empty(n, dtype=np.int32)
+        self.bedrooms = np.zeros(n, dtype=np.uint64)
+        self.available = np.zeros(n, dtype=bool)
+        self.flags = {key: np.full(n, -1, dtype=np.int8) for key in FLAG_COLUMNS}
+
+        for i, prop in enumerate(self.properties):
+            self.ids[i] = _ref_id(prop.get("id"))
+            self.price[i] = _number(prop.get("low_price"))
+            self.area[i] = _number(prop.get("min_area"))
+            self.delivery[i] = _epoch(prop.get("delivery_date"))
+
+            district = prop.get("district")
+            district_name = district.get("name") if isinstance(district, dict) else None
+            if district_name:
+                code = self.district_codes.setdefault(str(district_name).lower(), len(self.district_codes))
+                self.district[i] = code
+            else:
+                self.district[i] = -1
+
+            developer = prop.get("developer_company")
+            self.developer[i] = _ref_id(developer)
+            developer_name = developer.get("name", "") if isinstance(developer, dict) else ""
+            self.rank[i] = developer_rank.get(str(developer_name).lower(), UNRANKED)
+
+            self.bedrooms[i] = _bitmask(prop.get("apartments"))
+
+            sales_status = prop.get("sales_status")
+            if isinstance(sales_status, dict):
+                self.available[i] = str(sales_status.get("name", "")).lower() == "available"
+
+            for key in FLAG_COLUMNS:
+                if prop.get(key) is not None:
+                    self.flags[key][i] = int(bool(prop[key]))
+
+    def __len__(self):
+        return len(self.properties)
+
+    def mask(self, district=None, min_price=None, max_price=None, available_only=False,
+             delivery_year=None, min_area=None, max_area=None,
+             developer_ids=None, apartment_ids=None, flags=None):
+        """ ساخت ماسک بولی برای فیلترهای داده‌شده (مساحت به متر مربع، مثل ورودی کاربر) """
+        mask = np.ones(len(self.properties), dtype=bool)
+
+        if available_only:
+            mask &= self.available
+
+        if district:
+            code = self.district_codes.get(str(district).lower())
+            if code is None:
+                return np.zeros(len(self.properties), dtype=bool)
+            mask &= self.district == code
+
+        # مقایسه با NaN همیشه False است، پس املاک بدون قیمت یا مساحت حذف می‌شوند
+        if max_price is not None:
+            mask &= self.price <= max_price
+        if min_price is not None:
+            mask &= self.price >= min_price
+
+        if delivery_year is not None:
+            start_of_year, end_of_year = year_bounds(delivery_year)
+            mask &= (self.delivery >= start_of_year) & (self.delivery <= end_of_year)
+
+        if min_area is not None or max_area is not None:
+            low = (min_area if min_area is not None else 0) * SQM_TO_SQFT
+            high = (max_area if max_area is not None else float("inf")) * SQM_TO_SQFT
+            mask &= (self.area >= low) & (self.area <= high)
+
+        if developer_ids:
+            mask &= np.isin(self.developer, [_ref_id(d) for d in developer_ids])
+
+        if apartment_ids:
+            wanted = _bitmask(apartment_ids)
+            mask &= (self.bedrooms & np.uint64(wanted)) != 0
+
+        for key, value in (flags or {}).items():
+            mask &= self.flags[key] == int(value)
+
+        return mask
+
+    def take(self, mask):
+        """ املاک انتخاب‌شده به ترتیب اصلی لیست """
+        return [self.properties[i] for i in np.flatnonzero(mask)]
+
+    def ranked(self, selection, copy=False):
+        """ املاک انتخاب‌شده (ماسک یا لیست شماره‌ها) به ترتیب محبوبیت توسعه‌دهنده، به صورت تنبل """
+        positions = np.flatnonzero(selection) if isinstance(selection, np.ndarray) and selection.dtype == bool \
+            else np.asarray(selection, dtype=np.intp)
+        # کلید یکتا: رتبه و سپس ترتیب اصلی (مثل sorted پایدار روی رتبه)
+        keys = self.rank[positions].astype(np.int64) * max(len(self.properties), 1) + positions
+        return RankedResults(self.properties, positions, keys, copy=copy, ids=self.ids[positions])
+
+
+class RankedResults:
+    """ نتایج جستجو به ترتیب رتبه توسعه‌دهنده؛ فقط بخشی که خوانده می‌شود با top-k (argpartition) مرتب می‌شود """
+
+    def __init__(self, properties, positions, keys, copy=False, ids=None):
+        self._properties = properties
+        self._positions = positions
+        self._keys = keys
+        self._ids = ids
+        self._copy = copy
+        self._order = np.empty(0, dtype=np.intp)
+        self._copies = {}
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _ensure(self, count):
+        self._order = extend_order(self._keys, self._order, count)
+
+    def id_keys(self):
+        """ (شناسه‌ها، کلیدهای رتبه) به ترتیب اصلی؛ برای نگه‌داری فشرده نتیجه بدون خود املاک """
+        return self._ids, self._keys
+
+    def _item(self, i):
+        position = int(self._positions[self._order[i]])
+        if not self._copy:
+            return self._properties[position]
+        # کپی سطحی فقط برای مواردی که واقعاً خوانده می‌شوند (و همان کپی در دفعات بعد)
+        item = self._copies.get(position)
+        if item is None:
+            item = self._copies[position] = dict(self._properties[position])
+        return item
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            self._ensure(max(start, stop) if step > 0 else len(self))
+            return [self._item(i) for i in range(start, stop, step)]
+
+        index = operator.index(key)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("RankedResults index out of range")
+        self._ensure(index + 1)
+        return self._item(index)
+
+    def __iter__(self):
+        self._ensure(len(self))
+        return (self._item(i) for i in range(len(self)))
+
+    def __repr__(self):
+        return f"<RankedResults {len(self)} properties, {len(self._order)} ranked>"
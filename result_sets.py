@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from property_index import extend_order
+
+
+class ResultSet:
+    """ نتیجه یک جستجو در مکالمه: آرایه فشرده شناسه‌ها و کلیدهای رتبه، مکان فعلی صفحه‌بندی و جستجوی سازنده آن
+
+    خود املاک نگه داشته نمی‌شوند؛ هر صفحه هنگام نمایش از روی شناسه‌ها ساخته می‌شود.
+    """
+
+    def __init__(self, query, ids, keys, cursor=0):
+        self.query = query
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.keys = np.asarray(keys, dtype=np.int64)
+        self.cursor = cursor
+        self.stored = False
+        self._order = np.empty(0, dtype=np.intp)
+
+    @property
+    def query_key(self):
+        return json.dumps(self.query, sort_keys=True, ensure_ascii=False, default=str)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def remaining(self):
+        return len(self.ids) - self.cursor
+
+    def peek(self, count, start=None):
+        """ شناسه‌های صفحه بعد (از مکان فعلی یا start) به ترتیب رتبه؛ مکان جلو نمی‌رود """
+        start = self.cursor if start is None else start
+        stop = min(start + count, len(self.ids))
+        self._order = extend_order(self.keys, self._order, stop)
+        return [int(i) for i in self.ids[self._order[start:stop]]]
+
+    def advance(self, count):
+        self.cursor = min(self.cursor + count, len(self.ids))
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.keys.nbytes + self._order.nbytes
+
+    def __repr__(self):
+        return f"<ResultSet {len(self)} ids, cursor {self.cursor}>"
+
+
+class ResultSetStore:
+    """ نگه‌داری ماندگار (SQLite) آخرین نتیجه جستجوی هر مکالمه تا «املاک بیشتر» بعد از ری‌استارت سرور هم کار کند """
+
+    def __init__(self, path, ttl=86400):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS result_sets (
+                session_id TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                ids BLOB NOT NULL,
+                keys BLOB NOT NULL,
+                cursor INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._db.commit()
+
+        self.saves = 0
+        self.loads = 0
+        self.restored = 0
+
+    async def save(self, session_id, result_set):
+        """ بار اول کل نتیجه ذخیره می‌شود و بعد از آن فقط مکان صفحه‌بندی """
+        await asyncio.to_thread(self._save, session_id, result_set)
+        result_set.stored = True
+        self.saves += 1
+
+    async def load(self, session_id):
+        """ نتیجه ذخیره‌شده این مکالمه (اگر منقضی نشده باشد) یا None """
+        self.loads += 1
+        result_set = await asyncio.to_thread(self._load, session_id)
+        if result_set is not None:
+            self.restored += 1
+        return result_set
+
+    def _save(self, session_id, result_set):
+        now = time.time()
+        with self._lock:
+            if result_set.stored:
+                self._db.execute(
+                    "UPDATE result_sets SET cursor = ?, updated_at = ? WHERE session_id = ?",
+                    (result_set.cursor, now, session_id),
+                )
+            else:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO result_sets (session_id, query, ids, keys, cursor, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (session_id, result_set.query_key, result_set.ids.tobytes(), result_set.keys.tobytes(),
+                     result_set.cursor, now),
+                )
+                self._db.execute("DELETE FROM result_sets WHERE updated_at < ?", (now - self.ttl,))
+            self._db.commit()
+
+    def _load(self, session_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT query, ids, keys, cursor FROM result_sets WHERE session_id = ? AND updated_at >= ?",
+                (session_id, time.time() - self.ttl),
+            ).fetchone()
+        if row is None:
+            return None
+        query, ids, keys, cursor = row
+        result_set = ResultSet(
+            json.loads(query), np.frombuffer(ids, dtype=np.int64), np.frombuffer(keys, dtype=np.int64), cursor
+        )
+        result_set.stored = True
+        return result_set
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM result_sets").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "rows": len(self),
+            "saves": self.saves,
+            "loads": self.loads,
+            "restored": self.restored,
+        }
+
+
+def result_set_store_from_env():
+    """ ساخت ResultSetStore با تنظیمات متغیرهای محیطی (RESULT_SET_PATH خالی یعنی فقط در حافظه) """
+    path = os.getenv("RESULT_SET_PATH", "result_sets.sqlite3")
+    if not path:
+        return None
+    return ResultSetStore(path, ttl=int(os.getenv("RESULT_SET_TTL", "86400")))
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+
+# ✅ تخمین تقریبی حجم هر ملک ذخیره‌شده در حافظه (بایت)
+PROPERTY_SIZE_ESTIMATE = 2048
+
+
+class ConversationState:
+    """ وضعیت مکالمه یک کاربر (جایگزین متغیرهای سراسری قبلی) """
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.memory_state = {}
+        self.types = {}
+        self.memory_district = {}
+        self.last_property_id = None
+        # ✅ آخرین نتیجه جستجو (شناسه‌ها + مکان صفحه‌بندی)؛ املاک هر صفحه هنگام نمایش ساخته می‌شوند
+        self.result_set = None
+        self.selected_properties = []
+        self.property_name_to_id = {}
+        # شماره نمایش‌داده‌شده روی کارت ← (نام، شناسه) برای مقایسه با شماره
+        self.numbered_properties = {}
+        self.just_answered_questions = True
+
+        # ✅ قفل برای جلوگیری از اجرای همزمان دو پیام از یک کاربر
+        self.lock = asyncio.Lock()
+        self.last_access = time.monotonic()
+        self.size_bytes = 0
+
+        # ✅ صف تکه‌های پاسخ برای /chat/stream (None یعنی پاسخ یکجا برگردانده می‌شود)
+        self.stream = None
+
+    def approx_size(self):
+        """ تخمین حجم حافظه مصرفی این مکالمه """
+        size = 1024
+        size += len(json.dumps(self.memory_state, ensure_ascii=False, default=str))
+        size += len(json.dumps(self.memory_district, ensure_ascii=False, default=str))
+        if self.result_set is not None:
+            size += self.result_set.nbytes
+        size += PROPERTY_SIZE_ESTIMATE * len(self.selected_properties)
+        size += 64 * (len(self.property_name_to_id) + len(self.numbered_properties))
+        return size
+
+
+class SessionStore:
+    """ نگه‌داری مکالمه‌ها بر اساس session_id با حذف LRU، انقضای زمان بیکاری و سقف حافظه """
+
+    def __init__(self, max_sessions=1000, idle_ttl=1800, max_bytes=256 * 1024 * 1024):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()
+        self._total_bytes = 0
+        self.evictions = 0
+
+    @staticmethod
+    def new_session_id():
+        return uuid.uuid4().hex
+
+    def get(self, session_id):
+        """ دریافت (یا ساخت) وضعیت مکالمه و علامت‌گذاری به عنوان آخرین استفاده """
+        self._expire_idle()
+
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = ConversationState(session_id)
+            state.size_bytes = state.approx_size()
+            self._sessions[session_id] = state
+            self._total_bytes += state.size_bytes
+        else:
+            self._sessions.move_to_end(session_id)
+
+        state.last_access = time.monotonic()
+        self._enforce_limits(keep=session_id)
+        return state
+
+    def commit(self, state):
+        """ بعد از هر پیام، حجم مکالمه دوباره محاسبه و سقف‌ها اعمال می‌شوند """
+        if self._sessions.get(state.session_id) is not state:
+            return
+
+        new_size = state.approx_size()
+        self._total_bytes += new_size - state.size_bytes
+        state.size_bytes = new_size
+        state.last_access = time.monotonic()
+        self._enforce_limits(keep=state.session_id)
+
+    def _drop(self, session_id):
+        state = self._sessions.pop(session_id)
+        self._total_bytes -= state.size_bytes
+        self.evictions += 1
+
+    def _expire_idle(self):
+        # قدیمی‌ترین مکالمه‌ها اول OrderedDict هستند
+        now = time.monotonic()
+        while self._sessions:
+            session_id, state = next(iter(self._sessions.items()))
+            if now - state.last_access < self.idle_ttl or state.lock.locked():
+                break
+            self._drop(session_id)
+
+    def _enforce_limits(self, keep=None):
+        for session_id in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions and self._total_bytes <= self.max_bytes:
+                break
+            if session_id == keep or self._sessions[session_id].lock.locked():
+                continue
+            self._drop(session_id)
+
+    def stats(self):
+        return {
+            "sessions": len(self._sessions),
+            "approx_bytes": self._total_bytes,
+            "evictions": self.evictions,
+        }
+
+
+def session_store_from_env():
+    """ ساخت SessionStore با تنظیمات متغیرهای محیطی """
+    return SessionStore(
+        max_sessions=int(os.getenv("SESSION_MAX_COUNT", "1000")),
+        idle_ttl=int(os.getenv("SESSION_IDLE_TTL", "1800")),
+        max_bytes=int(os.getenv("SESSION_MAX_MEMORY_MB", "256")) * 1024 * 1024,
+    )
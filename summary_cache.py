@@ -0,0 +1,115 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class SummaryCache:
+    """ کش ماندگار (SQLite) متن‌های تولیدشده برای هر ملک؛ کلید = شناسه ملک + هش فیلدهای ورودی پرامپت """
+
+    def __init__(self, path, max_rows=50000):
+        self.path = path
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS summaries (
+                property_id TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (property_id, content_hash)
+            )
+            """
+        )
+        self._db.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    @staticmethod
+    def content_hash(fields):
+        """ هش محتوای ورودی؛ با تغییر قیمت، وضعیت یا تاریخ تحویل کلید عوض می‌شود """
+        payload = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+    async def get_many(self, keys):
+        """ keys: لیست (property_id, content_hash) ← دیکشنری کلید به متن برای موارد موجود """
+        if not keys:
+            return {}
+        found = await asyncio.to_thread(self._get_many, keys)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    async def put_many(self, items):
+        """ items: دیکشنری (property_id, content_hash) به متن """
+        if not items:
+            return
+        await asyncio.to_thread(self._put_many, items)
+        self.writes += len(items)
+
+    def _get_many(self, keys):
+        found = {}
+        with self._lock:
+            for property_id, content_hash in keys:
+                row = self._db.execute(
+                    "SELECT summary FROM summaries WHERE property_id = ? AND content_hash = ?",
+                    (str(property_id), content_hash),
+                ).fetchone()
+                if row is not None:
+                    found[(property_id, content_hash)] = row[0]
+        return found
+
+    def _put_many(self, items):
+        now = time.time()
+        with self._lock:
+            for (property_id, content_hash), summary in items.items():
+                # نسخه‌های قدیمی همین ملک دیگر استفاده نمی‌شوند
+                self._db.execute(
+                    "DELETE FROM summaries WHERE property_id = ? AND content_hash != ?",
+                    (str(property_id), content_hash),
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO summaries (property_id, content_hash, summary, created_at) VALUES (?, ?, ?, ?)",
+                    (str(property_id), content_hash, summary, now),
+                )
+            self._db.execute(
+                "DELETE FROM summaries WHERE rowid IN "
+                "(SELECT rowid FROM summaries ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_rows,),
+            )
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "rows": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "writes": self.writes,
+        }
+
+
+def summary_cache_from_env():
+    """ ساخت SummaryCache با تنظیمات متغیرهای محیطی (SUMMARY_CACHE_PATH خالی یعنی بدون کش) """
+    path = os.getenv("SUMMARY_CACHE_PATH", "summary_cache.sqlite3")
+    if not path:
+        return None
+    return SummaryCache(path, max_rows=int(os.getenv("SUMMARY_CACHE_MAX_ROWS", "50000")))
@@ -0,0 +1,31 @@
+from answer_cache import SemanticAnswerCache, entities_in
+from intent_router import normalize_text
+
+
+def cached_answer(namespace, stored, asked):
+    cache = SemanticAnswerCache(max_entries=10)
+    cache.put(namespace, stored, "answer")
+    answer, _ = cache.get(namespace, asked)
+    return answer
+
+
+def test_different_entities_miss():
+    pairs = [
+        ("قیمت آپارتمان سه خوابه در دبی مارینا چقدره؟", "قیمت آپارتمان دو خوابه در دبی مارینا چقدره؟"),
+        ("average price of a 3BR in Dubai Marina", "average price of a 2BR in Dubai Marina"),
+        ("میانگین قیمت ملک در جمیرا چقدره؟", "میانگین قیمت ملک در دبی مارینا چقدره؟"),
+        ("قیمت ویلا در دبی هیلز چقدره؟", "قیمت آپارتمان در دبی هیلز چقدره؟"),
+    ]
+    for stored, asked in pairs:
+        assert cached_answer("market", stored, asked) is None, asked
+
+
+def test_same_question_hits():
+    question = "شرایط گرفتن گلدن ویزا چیه؟"
+    assert cached_answer("buying_guide", question, "شرایط گرفتن گلدن ویزا چیست؟") == "answer"
+    assert cached_answer("market", "قیمت ویلا در دبی هیلز چقدره؟", "قیمت ویلا در دبی هیلز چقدره") == "answer"
+
+
+def test_entities_in():
+    text = normalize_text("قیمت ویلا سه‌خوابه تو پالم جمیرا")
+    assert entities_in(text) == ("bedrooms:3", "district:palm jumeirah", "type:villa")
@@ -0,0 +1,74 @@
+import asyncio
+
+from catalog import BASE_FILTERS, InventoryMirror
+
+
+class FakeEstaty:
+    """ کلاینت جعلی Estaty با یک لیست ثابت املاک """
+
+    def __init__(self, properties):
+        self.properties = properties
+
+    async def filter(self, filters, timeout=None, use_cache=True):
+        return [dict(prop) for prop in self.properties]
+
+    def invalidate_property(self, property_id):
+        pass
+
+
+def make_property(property_id, property_type_id, facilities=(74,)):
+    return {
+        "id": property_id,
+        "title": f"Project {property_id}",
+        "district": {"id": 1, "name": "JVC"},
+        "developer_company": {"id": 2, "name": "EMAAR"},
+        "sales_status": {"id": 1, "name": "Available"},
+        "property_type": {"id": property_type_id, "name": "Residential" if property_type_id == 20 else "Commercial"},
+        "apartments": [{"id": 11}],
+        "facilities": [{"id": facility} for facility in facilities],
+        "low_price": 1_500_000,
+        "min_area": 800,
+    }
+
+
+def synced_mirror(properties):
+    mirror = InventoryMirror(FakeEstaty(properties))
+    asyncio.run(mirror.sync())
+    return mirror
+
+
+def test_query_filters_property_type_given_as_dict():
+    mirror = synced_mirror([make_property(1, 20), make_property(2, 21), make_property(3, 20)])
+
+    # main.py فیلتر property_type را همان دیکشنری PROPERTY_TYPES می‌فرستد
+    filters = {**BASE_FILTERS, "property_type": {"id": 20, "name": "Residential"}}
+    found = mirror.query(filters)
+
+    assert found is not None
+    assert sorted(prop["id"] for prop in found) == [1, 3]
+
+
+def test_query_filters_property_type_given_as_id():
+    mirror = synced_mirror([make_property(1, 20), make_property(2, 21)])
+
+    found = mirror.query({**BASE_FILTERS, "property_type": [21]})
+
+    assert [prop["id"] for prop in found] == [2]
+
+
+def test_single_facility_is_answered_locally():
+    mirror = synced_mirror([make_property(1, 20, facilities=(74,)), make_property(2, 20, facilities=(75,))])
+
+    found = mirror.query({**BASE_FILTERS, "facilities": [74]})
+
+    assert [prop["id"] for prop in found] == [1]
+
+
+def test_multiple_facilities_go_to_the_api():
+    # استخر + باشگاه: ملکی که فقط یکی را دارد نباید به اشتباه از نسخه محلی برگردد
+    mirror = synced_mirror([make_property(1, 20, facilities=(74,)), make_property(2, 20, facilities=(74, 75))])
+
+    filters = {**BASE_FILTERS, "facilities": [74, 75]}
+
+    assert not mirror.can_answer(filters)
+    assert mirror.query(filters) is None
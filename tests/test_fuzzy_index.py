@@ -0,0 +1,55 @@
+import random
+
+from fuzzywuzzy import process
+
+from fuzzy_index import FULL_SCAN_SCORE, FuzzyIndex
+from gazetteer import DEVELOPERS, DISTRICTS, FACILITIES
+
+
+WORDS = "I want in the near please show me apartment villa with a view Dubai Oasis cheap".split()
+
+
+def typo(rng, text):
+    chars = list(text)
+    for _ in range(rng.randint(0, 3)):
+        if not chars:
+            break
+        j = rng.randrange(len(chars))
+        op = rng.random()
+        if op < 0.4:
+            chars[j] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+        elif op < 0.7:
+            del chars[j]
+        else:
+            chars.insert(j, rng.choice("abcdefghijklmnopqrstuvwxyz"))
+    return "".join(chars)
+
+
+def queries(rng, names, count):
+    for _ in range(count):
+        r = rng.random()
+        name = rng.choice(names)
+        if r < 0.4:
+            yield typo(rng, name)
+        elif r < 0.7:
+            yield f"{rng.choice(WORDS)} {typo(rng, name)} {rng.choice(WORDS)}"
+        else:
+            yield " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 5)))
+
+
+def test_tie_resolves_like_extract_one():
+    names = list(DISTRICTS.names)
+    query = "I want Dubai Silscvn Oasis please"
+    assert FuzzyIndex(names).extract_one(query) == process.extractOne(query, names)
+
+
+def test_matches_extract_one_above_threshold():
+    rng = random.Random(3)
+    for lookup in (DEVELOPERS, DISTRICTS, FACILITIES):
+        names = list(lookup.names)
+        index = FuzzyIndex(names, cache_size=0)
+        for query in queries(rng, names, 200):
+            expected = process.extractOne(query, names)
+            result = index.extract_one(query)
+            if max(expected[1], result[1]) >= FULL_SCAN_SCORE:
+                assert result == expected, query
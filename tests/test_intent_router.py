@@ -0,0 +1,33 @@
+from intent_router import IntentRouter
+
+
+LISTED = {1: ("Project 1", 1), 2: ("Project 2", 2), 3: ("Project 3", 3), 4: ("Project 4", 4)}
+
+
+def routed_type(message, listed=LISTED):
+    decision = IntentRouter().route(message, {}, listed)
+    return decision["type"] if decision else None
+
+
+def test_compare_two_cards():
+    assert routed_type("ملک ۲ و ۳ رو مقایسه کن") == "compare"
+    assert routed_type("مقایسه پروژه 1 با پروژه 4") == "compare"
+    assert routed_type("مقایسه ۲ و ۳") == "compare"
+
+
+def test_compare_needs_exactly_two_card_numbers():
+    assert routed_type("مقایسه قیمت ۲ خوابه با ۳ خوابه در مارینا") is None
+    assert routed_type("مقایسه ملک ۱ و ۲ و ۳") is None
+    # شماره‌ای که کارتش نشان داده نشده
+    assert routed_type("ملک ۲ و ۹ رو مقایسه کن") is None
+    assert routed_type("ملک ۲ و ۳ رو مقایسه کن", listed={}) is None
+    assert routed_type("مقایسه 2 و 3 میلیونی ها") is None
+
+
+def test_filter_intent_likely():
+    router = IntentRouter()
+    assert router.filter_intent_likely("یه آپارتمان دو خوابه در بیزینس بی میخوام", {})
+    assert router.filter_intent_likely("سه تا", {})
+    assert router.filter_intent_likely("فرقی نداره", {"previous_type": "search"})
+    assert not router.filter_intent_likely("گلدن ویزا چطوری میگیرم؟", {})
+    assert not router.filter_intent_likely("ممنون از راهنماییت", {"previous_type": "buying_guide"})
@@ -0,0 +1,36 @@
+import os
+import time
+
+from knowledge_base import KnowledgeBase, build_index, index_outdated
+
+
+DOCS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "knowledge_base")
+
+
+def test_retrieves_buying_guide_topics(tmp_path):
+    build_index(DOCS_DIR, tmp_path)
+    kb = KnowledgeBase(tmp_path)
+    questions = {
+        "شرایط گلدن ویزا دبی چیه؟": "golden_visa.md",
+        "golden visa": "golden_visa.md",
+        "هزینه ثبت DLD چقدره؟": "dld_fees.md",
+        "مالیات بر اجاره در دبی": "taxes.md",
+    }
+    for question, source in questions.items():
+        hits = kb.relevant(question)
+        assert hits and hits[0].passage["source"] == source, question
+    assert kb.relevant("بهترین رستوران دبی") == []
+
+
+def test_index_outdated(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    doc = docs / "guide.md"
+    doc.write_text("# راهنما\n\nمتن", encoding="utf-8")
+    index_dir = tmp_path / "index"
+    assert index_outdated(docs, index_dir)
+    build_index(docs, index_dir)
+    assert not index_outdated(docs, index_dir)
+    later = time.time() + 10
+    os.utime(doc, (later, later))
+    assert index_outdated(docs, index_dir)
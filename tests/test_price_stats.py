@@ -0,0 +1,51 @@
+import asyncio
+import random
+
+from catalog import BASE_FILTERS, InventoryMirror
+from price_stats import summarize_properties
+from test_catalog import FakeEstaty
+
+DISTRICTS = ["JVC", "Dubai Marina", "Arjan"]
+
+
+def make_listing(count=200, seed=7):
+    rng = random.Random(seed)
+    properties = []
+    for property_id in range(1, count + 1):
+        properties.append({
+            "id": property_id,
+            "district": {"id": property_id % 3, "name": DISTRICTS[property_id % 3]},
+            "sales_status": {"id": 1, "name": "Available" if property_id % 7 else "Sold Out"},
+            "apartments": [{"id": 10 + b} for b in rng.sample(range(4), rng.randint(1, 2))],
+            "apartmentType": [{"id": rng.choice([1, 3])}],
+            # چند ملک بدون قیمت یا مساحت تا هر دو مسیر آن‌ها را یکسان کنار بگذارند
+            "low_price": None if property_id % 23 == 0 else rng.randint(400_000, 9_000_000),
+            "min_area": None if property_id % 17 == 0 else rng.randint(350, 3000),
+        })
+    return properties
+
+
+def test_summary_matches_summarize_properties_over_mirror_rows():
+    mirror = InventoryMirror(FakeEstaty(make_listing()))
+    asyncio.run(mirror.sync())
+
+    cases = [{}]
+    cases += [{"district": name} for name in DISTRICTS + ["jvc"]]
+    cases += [{"apartments": [10 + b]} for b in range(4)]
+    cases += [{"district": name, "apartments": [11], "apartmentType": [t]} for name in DISTRICTS for t in (1, 3)]
+
+    for case in cases:
+        filters = {**BASE_FILTERS, **case}
+        answered, summary = mirror.price_summary(filters)
+        assert answered, case
+        # همان ردیف‌هایی که جستجوی عادی (filter_properties) از نسخه محلی می‌گیرد
+        expected = summarize_properties(mirror.query(filters, available_only=True))
+        assert summary == expected, case
+
+
+def test_summary_declines_filters_outside_partitions():
+    mirror = InventoryMirror(FakeEstaty(make_listing(20)))
+    asyncio.run(mirror.sync())
+
+    assert mirror.price_summary({**BASE_FILTERS, "payment_plan": 1}) == (False, None)
+    assert mirror.price_summary(dict(BASE_FILTERS), delivery_year=2027) == (False, None)
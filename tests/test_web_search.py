@@ -0,0 +1,37 @@
+import asyncio
+
+from web_search import WebSearch
+
+
+class CountingSearch(WebSearch):
+    """ WebSearch با نتیجه‌های از پیش تعیین‌شده به جای DDGS """
+
+    def __init__(self, results):
+        super().__init__(deadline=2.0)
+        self.results = list(results)
+        self.calls = 0
+
+    def _search(self, query):
+        self.calls += 1
+        return self.results.pop(0)
+
+
+def test_empty_result_is_not_cached():
+    search = CountingSearch(["", "Golden Visa: ten-year residency"])
+
+    async def ask_twice():
+        first = await search.summary("golden visa dubai")
+        second = await search.summary("golden visa dubai")
+        third = await search.summary("golden visa dubai")
+        return first, second, third
+
+    try:
+        first, second, third = asyncio.run(ask_twice())
+    finally:
+        search.close()
+
+    assert first == ""
+    assert second == third == "Golden Visa: ten-year residency"
+    # جستجوی دوم دوباره انجام شد، سومی از کش آمد
+    assert search.calls == 2
+    assert search.stats()["empty_results"] == 1
@@ -0,0 +1,103 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from cachetools import TTLCache
+from duckduckgo_search import DDGS
+
+from intent_router import normalize_text
+
+
+class WebSearch:
+    """ جستجوی DDGS بیرون از event loop با مهلت سخت، کش TTL و سقف جستجوهای همزمان """
+
+    def __init__(self, deadline=4.0, max_concurrency=4, max_results=5, cache_size=512, cache_ttl=3600):
+        self.deadline = deadline
+        self.max_results = max_results
+        # ✅ تعداد thread ها همان سقف جستجوهای همزمان است؛ بقیه در صف می‌مانند (و مهلتشان می‌گذرد)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="ddgs")
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._inflight = {}
+
+        self.searches = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.empty_results = 0
+
+    async def summary(self, query):
+        """ خلاصه نتایج (عنوان: متن) یا رشته خالی اگر جستجو به مهلت نرسید یا خطا داد (پاسخ فقط با مدل) """
+        key = normalize_text(query)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, self._search, query)
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._finish(key, done))
+            self.searches += 1
+        else:
+            self.coalesced += 1
+
+        try:
+            # shield: با گذشتن مهلت فقط انتظار ما تمام می‌شود؛ نتیجه دیرتر رسیده هم برای دفعه بعد کش می‌شود
+            return await asyncio.wait_for(asyncio.shield(future), self.deadline)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            print(f"⏱️ جستجوی اینترنتی بیشتر از {self.deadline} ثانیه طول کشید. ادامه فقط با اطلاعات GPT.")
+            return ""
+        except Exception as e:
+            print(f"⚠️ خطا در جستجو با DDGS: {str(e)}. ادامه فقط با اطلاعات GPT.")
+            return ""
+
+    def _search(self, query):
+        # داخل thread اجرا می‌شود
+        with DDGS() as ddgs:
+            results = list(ddgs.text(query, max_results=self.max_results))
+        if not results:
+            print("⚠️ هیچ نتیجه‌ای از DDGS دریافت نشد.")
+        return "\n".join([f"{r['title']}: {r['body']}" for r in results if 'body' in r])
+
+    def _finish(self, key, future):
+        self._inflight.pop(key, None)
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            # خطا فقط شمرده می‌شود (به منتظرها رسیده) و کش نمی‌شود تا دفعه بعد دوباره امتحان شود
+            self.errors += 1
+            return
+        result = future.result()
+        if not result:
+            # ✅ جواب خالی (مثلاً محدودیت موقت DDGS) کش نمی‌شود تا همان سوال دفعه بعد دوباره جستجو شود
+            self.empty_results += 1
+            return
+        self._cache[key] = result
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "searches": self.searches,
+            "cache_entries": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "empty_results": self.empty_results,
+        }
+
+
+def web_search_from_env():
+    """ ساخت WebSearch با تنظیمات متغیرهای محیطی """
+    return WebSearch(
+        deadline=float(os.getenv("WEB_SEARCH_DEADLINE", "4")),
+        max_concurrency=int(os.getenv("WEB_SEARCH_MAX_CONCURRENCY", "4")),
+        cache_size=int(os.getenv("WEB_SEARCH_CACHE_SIZE", "512")),
+        cache_ttl=int(os.getenv("WEB_SEARCH_CACHE_TTL", "3600")),
+    )